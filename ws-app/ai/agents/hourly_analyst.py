@@ -154,7 +154,7 @@ async def agent_analysis():
             macro = await fetch_macro_news()
 
             for symbol in symbols:
-                tech = get_market_technical_context(symbol)
+                tech = await get_market_technical_context(symbol)
                 print(tech)
                 if "error" in tech:
                     continue
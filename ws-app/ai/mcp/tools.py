@@ -1,12 +1,10 @@
-import requests
+import asyncio
+from services.binance_http import binance_request
+from services.order_flow import flow_snapshot, flow_window
 
-BINANCE_API_URL = "https://api.binance.com/api/v3/klines"
+KLINES_PATH = "/api/v3/klines"
 
-import requests
-
-BINANCE_API_URL = "https://api.binance.com/api/v3/klines"
-
-def fetch_binance_klines(symbol: str, interval: str, limit: int):
+async def fetch_binance_klines(symbol: str, interval: str, limit: int):
     params = {
         "symbol": symbol.upper(),
         "interval": interval,
@@ -14,7 +12,7 @@ def fetch_binance_klines(symbol: str, interval: str, limit: int):
     }
 
     try:
-        response = requests.get(BINANCE_API_URL, params=params)
+        response = await binance_request("GET", KLINES_PATH, params=params)
         response.raise_for_status()
         result = response.json()
 
@@ -46,13 +44,14 @@ def fetch_binance_klines(symbol: str, interval: str, limit: int):
         return []
 
 
-def get_market_technical_context(symbol: str):
+async def get_market_technical_context(symbol: str):
     symbol_upper = symbol.upper()
 
-    daily = fetch_binance_klines(symbol_upper, "1d", 10)
-    hourly = fetch_binance_klines(symbol_upper, "1h", 20)
-
-    m15 = fetch_binance_klines(symbol_upper, "15m", 32)
+    daily, hourly, m15 = await asyncio.gather(
+        fetch_binance_klines(symbol_upper, "1d", 10),
+        fetch_binance_klines(symbol_upper, "1h", 20),
+        fetch_binance_klines(symbol_upper, "15m", 32),
+    )
 
     if not m15:
         return {"error": "No data"}
@@ -65,9 +64,14 @@ def get_market_technical_context(symbol: str):
     rvol = round(m15[-1]["v"] / avg_vol, 2) if avg_vol > 0 else 0
 
     # --- CVD 15m (bloque completo) ---
-    cvd_start = m15[0]["cvd"]
-    cvd_end = m15[-1]["cvd"]
-    cvd_delta = round(cvd_end - cvd_start, 4)
+    # Preferir el order flow en vivo (aggTrade) si cubre toda la ventana
+    live_window = flow_window(symbol_upper, "15m", len(m15))
+    if live_window is not None:
+        cvd_delta = round(live_window["cvd_delta"], 4)
+        flow_source = "aggTrade"
+    else:
+        cvd_delta = round(m15[-1]["cvd"] - m15[0]["cvd"], 4)
+        flow_source = "klines"
 
     price_start = m15[0]["c"]
     price_end = m15[-1]["c"]
@@ -94,8 +98,10 @@ def get_market_technical_context(symbol: str):
         "order_flow_15m": {
             "cvd_delta": cvd_delta,
             "price_delta": price_delta,
-            "state": flow_state
+            "state": flow_state,
+            "source": flow_source
         },
+        "order_flow_live": flow_snapshot(symbol_upper, 4),
         "data_macro": {
             "d10": summarize(daily),
             "h20": summarize(hourly),
@@ -0,0 +1,119 @@
+# bench/candle_export.py
+#
+# Exportación masiva de velas de 1m (services.candle_export.stream_export) como
+# Arrow IPC y Parquet: tiempo, filas/s, tamaño y RSS pico del servidor durante
+# la exportación (el archivo se escribe a disco como lo haría el cliente), y
+# carga del resultado en pandas/NumPy como lo haría un notebook.
+#
+# Usa la base configurada en .env (POSTGRES_*). Con --seed inserta --rows velas
+# sintéticas para --symbol y las borra al terminar.
+#
+#   python bench/candle_export.py --seed --rows 2000000
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MINUTE_MS = 60_000
+
+
+def seed(conn, symbol: str, start_ms: int, rows: int):
+    import numpy as np
+
+    ts = np.arange(start_ms, start_ms + rows * MINUTE_MS, MINUTE_MS, dtype=np.int64)
+    close = 30_000 + np.cumsum(np.random.default_rng(7).normal(0, 5, rows))
+    buf = io.StringIO()
+    for t, c in zip(ts.tolist(), close.tolist()):
+        buf.write(f"{symbol}\t{c}\t{c + 3}\t{c - 3}\t{c + 1}\t1.5\t{t}\t42\t45000\n")
+    buf.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(
+            "COPY candlesticks (symbol, open, high, low, close, volume, timestamp, number_of_trades, "
+            "taker_buy_quote_asset_volume) FROM STDIN", buf,
+        )
+    conn.commit()
+    print(f"sembradas {rows} velas de 1m para {symbol}")
+
+
+def rss_mib() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def export(symbol: str, start_ms: int, end_ms: int, fmt: str, path: str) -> tuple:
+    from services.candle_export import stream_export
+
+    size, baseline, peak = 0, rss_mib(), 0.0
+    started = time.perf_counter()
+    # El cliente escribe a disco: el RSS del proceso mide solo la memoria del servidor
+    with open(path, "wb") as out:
+        async for chunk in stream_export(symbol, "1m", start_ms, end_ms, fmt):
+            out.write(chunk)
+            size += len(chunk)
+            peak = max(peak, rss_mib() - baseline)
+    return time.perf_counter() - started, size, peak
+
+
+def load(fmt: str, path: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.read_table(path)
+    # IPC mapeado en memoria: las columnas apuntan al archivo, sin copia
+    return pa.ipc.open_stream(pa.memory_map(path)).read_all()
+
+
+async def run(args):
+    from database import close_db_pool, get_db_connection, open_db_pool
+
+    symbol = args.symbol.upper()
+    start_ms = 1_600_000_000_000 // MINUTE_MS * MINUTE_MS
+    end_ms = start_ms + args.rows * MINUTE_MS
+    conn = get_db_connection()
+    await open_db_pool()
+    try:
+        if args.seed:
+            seed(conn, symbol, start_ms, args.rows)
+        with tempfile.TemporaryDirectory() as tmp:
+            for fmt in ("arrow", "parquet"):
+                path = os.path.join(tmp, f"export.{fmt}")
+                elapsed, size, peak = await export(symbol, start_ms, end_ms, fmt, path)
+                started = time.perf_counter()
+                table = load(fmt, path)
+                close = table.column("close").chunk(0).to_numpy(zero_copy_only=True)
+                df = table.to_pandas()
+                load_ms = (time.perf_counter() - started) * 1000
+                print(f"  {fmt:<8} {elapsed:6.2f} s  {table.num_rows / elapsed:9.0f} filas/s  {size / 2**20:7.1f} MiB  "
+                      f"RSS pico del servidor +{peak:5.1f} MiB  | notebook: {len(df)} filas en pandas en "
+                      f"{load_ms:.0f} ms (close[0]={close[0]:.2f})")
+                del table, df, close
+    finally:
+        if args.seed:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM candlesticks WHERE symbol = %s", (symbol,))
+            conn.commit()
+        conn.close()
+        await close_db_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación Arrow IPC / Parquet de velas")
+    parser.add_argument("--symbol", default="BENCHUSDT")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--seed", action="store_true", help="insertar (y luego borrar) --rows velas sintéticas")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
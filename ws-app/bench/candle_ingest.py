@@ -0,0 +1,109 @@
+# bench/candle_ingest.py
+#
+# Importación de un mes de velas de 1m (~43k filas) en candlesticks:
+#   • por fila  → un INSERT ... ON CONFLICT DO NOTHING por vela (versión anterior)
+#   • copy      → services.candle_ingest: COPY a staging UNLOGGED + INSERT ... SELECT
+#                 en lotes de --batch velas
+# Cada variante se mide dos veces: sobre la tabla vacía y reimportando el mismo
+# rango (todo duplicado). Usa la base configurada en .env (POSTGRES_*) y borra
+# las filas del símbolo de prueba al terminar.
+#
+#   python bench/candle_ingest.py --batch 5000
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MINUTE_MS = 60_000
+MONTH_MINUTES = 30 * 24 * 60
+PAGE = 1000
+
+_ROW_SQL = """
+    INSERT INTO candlesticks (symbol, open, high, low, close, volume, timestamp, number_of_trades, taker_buy_quote_asset_volume)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (symbol, timestamp) DO NOTHING;
+"""
+
+
+def make_klines(start_ms: int, n: int) -> list:
+    price = 30_000.0
+    klines = []
+    for i in range(n):
+        price += (i % 7 - 3) * 0.5
+        klines.append({"open": price, "high": price + 3, "low": price - 3, "close": price + 1, "volume": 1.5,
+                       "timestamp": start_ms + i * MINUTE_MS, "number_of_trades": 42,
+                       "taker_buy_quote_asset_volume": 45_000.0})
+    return klines
+
+
+async def per_row(symbol: str, klines: list) -> int:
+    from database import get_db_pool
+
+    inserted = 0
+    async with get_db_pool().connection() as conn:
+        async with conn.cursor() as cursor:
+            for k in klines:
+                await cursor.execute(_ROW_SQL, (symbol, k["open"], k["high"], k["low"], k["close"], k["volume"],
+                                                k["timestamp"], k["number_of_trades"],
+                                                k["taker_buy_quote_asset_volume"]))
+                inserted += cursor.rowcount
+    return inserted
+
+
+async def copy(symbol: str, klines: list, batch: int) -> int:
+    from services.candle_ingest import ingest_candles
+
+    async def pages():
+        # Páginas de 1000 velas, como llegan de /api/v3/klines
+        for start in range(0, len(klines), PAGE):
+            yield klines[start:start + PAGE]
+
+    return (await ingest_candles(symbol, pages(), batch))["inserted"]
+
+
+async def cleanup(symbol: str):
+    from database import get_db_pool
+    from services.candles import ROLLUP_TABLES
+
+    async with get_db_pool().connection() as conn:
+        for table in ("candlesticks", *ROLLUP_TABLES.values()):
+            await conn.execute(f"DELETE FROM {table} WHERE symbol = %s", (symbol,))
+
+
+async def run(args):
+    from database import close_db_pool, open_db_pool
+
+    await open_db_pool()
+    symbol = args.symbol.upper()
+    end_ms = (int(time.time() * 1000) // 86_400_000) * 86_400_000
+    klines = make_klines(end_ms - MONTH_MINUTES * MINUTE_MS, MONTH_MINUTES)
+    variants = [("por fila", lambda: per_row(symbol, klines)), ("copy", lambda: copy(symbol, klines, args.batch))]
+    try:
+        for label, fn in variants:
+            await cleanup(symbol)
+            for phase in ("vacía", "duplicados"):
+                started = time.perf_counter()
+                inserted = await fn()
+                elapsed = time.perf_counter() - started
+                print(f"  {label:<9} {phase:<10} {elapsed * 1000:9.0f} ms  {len(klines) / elapsed:9.0f} filas/s  "
+                      f"insertadas {inserted}")
+    finally:
+        await cleanup(symbol)
+        await close_db_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INSERT por fila vs COPY a staging")
+    parser.add_argument("--symbol", default="BENCHUSDT")
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+    print(f"{MONTH_MINUTES} velas de 1m, lotes de {args.batch}")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench/candle_json.py
+#
+# Serialización de respuestas de velas a 500, 10k y 100k barras:
+#   • iterrows  → DataFrame.iterrows() + dict + float() por fila (versión anterior)
+#   • dicts     → dict por fila + json.dumps
+#   • template  → services.candles.candles_json sin orjson (plantilla %)
+#   • orjson    → services.candles.candles_json con orjson (si está instalado)
+# y memoria pico (tracemalloc) de la respuesta completa frente al streaming por
+# tramos de CANDLE_STREAM_CHUNK barras.
+#
+#   python bench/candle_json.py --runs 5
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = (500, 10_000, 100_000)
+
+
+def make_rows(n: int) -> list:
+    rng = random.Random(7)
+    price = 30_000.0
+    rows = []
+    for i in range(n):
+        price += rng.gauss(0, 5)
+        rows.append((1_700_000_000 + i * 60, price, price + rng.random() * 10, price - rng.random() * 10,
+                     price + rng.gauss(0, 2), rng.random() * 50, rng.randint(1, 500)))
+    return rows
+
+
+def iterrows_json(rows: list) -> bytes:
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=["time", "open", "high", "low", "close", "volume", "trades"])
+    return json.dumps([
+        {"time": int(row["time"]), "open": float(row["open"]), "high": float(row["high"]),
+         "low": float(row["low"]), "close": float(row["close"]), "volume": float(row["volume"]),
+         "trades": int(row["trades"])}
+        for _, row in df.iterrows()
+    ]).encode()
+
+
+def dicts_json(rows: list) -> bytes:
+    from services.candles import BAR_FIELDS
+
+    return json.dumps([dict(zip(BAR_FIELDS, row)) for row in rows], separators=(",", ":")).encode()
+
+
+def best_ms(fn, rows: list, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def peak_kib(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialización JSON de velas")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from services import candles
+
+    def template_json(rows):
+        saved, candles.orjson = candles.orjson, None
+        try:
+            return candles.candles_json(rows)
+        finally:
+            candles.orjson = saved
+
+    serializers = [("iterrows", iterrows_json), ("dicts", dicts_json), ("template", template_json)]
+    if candles.orjson is not None:
+        serializers.append(("orjson", candles.candles_json))
+
+    for n in SIZES:
+        rows = make_rows(n)
+        reference = json.loads(dicts_json(rows))
+        print(f"{n} barras")
+        for label, fn in serializers:
+            assert json.loads(fn(rows)) == reference, label
+            runs = 1 if label == "iterrows" and n > 10_000 else args.runs
+            print(f"  {label:<9} {best_ms(fn, rows, runs):9.1f} ms")
+
+        chunk = candles.CANDLE_STREAM_CHUNK
+
+        def full():
+            candles.candles_json(make_rows(n))
+
+        def streamed():
+            # Filas generadas por tramos, como las entrega el cursor de servidor
+            for start in range(0, n, chunk):
+                candles.candles_json(make_rows(min(chunk, n - start)))
+
+        print(f"  memoria pico: completa {peak_kib(full):9.0f} KiB | streaming {peak_kib(streamed):7.0f} KiB "
+              f"(tramos de {chunk})")
+
+
+if __name__ == "__main__":
+    main()
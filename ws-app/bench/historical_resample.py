@@ -0,0 +1,149 @@
+# bench/historical_resample.py
+#
+# Latencia y tamaño de respuesta de /historical-data para 1h y 1d sobre un año
+# de velas de 1m: remuestreo anterior (filas 1m → pandas.resample), agregación
+# al vuelo en PostgreSQL y lectura del roll-up (services/candles.fetch_candles).
+#
+# Usa la base configurada en .env (POSTGRES_*). Con --seed inserta un año de
+# velas sintéticas para --symbol, reconstruye sus roll-ups y borra todo al
+# terminar.
+#
+#   python bench/historical_resample.py --seed --runs 5
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MINUTE_MS = 60_000
+YEAR_MINUTES = 365 * 24 * 60
+PANDAS_RULES = {"1h": "1h", "1d": "1D"}
+BARS = {"1h": 365 * 24, "1d": 365}
+
+
+def seed(conn, symbol: str, end_ms: int):
+    import numpy as np
+
+    start = end_ms - YEAR_MINUTES * MINUTE_MS
+    ts = np.arange(start, end_ms, MINUTE_MS, dtype=np.int64)
+    close = 30_000 + np.cumsum(np.random.default_rng(7).normal(0, 5, len(ts)))
+    buf = io.StringIO()
+    for t, c in zip(ts.tolist(), close.tolist()):
+        buf.write(f"{symbol}\t{c}\t{c + 3}\t{c - 3}\t{c + 1}\t1.5\t{t}\t42\t45000\n")
+    buf.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(
+            "COPY candlesticks (symbol, open, high, low, close, volume, timestamp, number_of_trades, "
+            "taker_buy_quote_asset_volume) FROM STDIN", buf,
+        )
+    conn.commit()
+    print(f"sembradas {len(ts)} velas de 1m para {symbol}")
+
+
+def legacy(conn, symbol: str, interval: str, start_ms: int) -> list:
+    """Remuestreo anterior, leyendo todas las filas de 1m del rango."""
+    import pandas as pd
+
+    warnings.filterwarnings("ignore", message="pandas only supports SQLAlchemy")
+    df = pd.read_sql_query(
+        "SELECT timestamp, open, high, low, close, volume, number_of_trades FROM candlesticks "
+        "WHERE symbol = %s AND timestamp >= %s ORDER BY timestamp",
+        conn, params=(symbol, start_ms),
+    )
+    df["ts"] = pd.to_datetime(df["timestamp"], unit="ms")
+    df.set_index("ts", inplace=True)
+    resampled = df.resample(PANDAS_RULES[interval]).agg({
+        "open": "first", "high": "max", "low": "min", "close": "last",
+        "volume": "sum", "number_of_trades": "sum",
+    }).dropna().reset_index()
+    return [
+        {"time": int(row["ts"].timestamp()) - 6 * 3600, "open": float(row["open"]), "high": float(row["high"]),
+         "low": float(row["low"]), "close": float(row["close"]), "volume": float(row["volume"]),
+         "trades": int(row["number_of_trades"])}
+        for _, row in resampled.iterrows()
+    ]
+
+
+def on_the_fly(symbol: str, interval: str) -> list:
+    """Agregación por buckets sobre las velas de 1m (sin roll-up)."""
+    from database import get_db_connection
+    from services.candles import _BUCKET_SQL, _params
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(_BUCKET_SQL, _params(symbol, interval, None, BARS[interval]))
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def timed(fn, runs: int):
+    samples, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, samples
+
+
+def report(label: str, bars: list, samples: list, rows_read: int):
+    from services.candles import candles_json
+
+    payload = len(json.dumps(bars).encode() if bars and isinstance(bars[0], dict) else candles_json(bars))
+    print(f"  {label:<8} p50 {statistics.median(samples):8.1f} ms  max {max(samples):8.1f} ms  "
+          f"filas transferidas {rows_read:>7}  barras {len(bars):>5}  JSON {payload / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remuestreo en pandas vs agregación en SQL")
+    parser.add_argument("--symbol", default="BENCHUSDT")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", action="store_true", help="insertar (y luego borrar) un año de velas sintéticas")
+    args = parser.parse_args()
+
+    from database import close_db_pool, get_db_connection, open_db_pool
+    from services.candle_rollups import rebuild_rollups
+    from services.candles import ROLLUP_TABLES, fetch_candles
+
+    symbol = args.symbol.upper()
+    end_ms = (int(time.time() * 1000) // 86_400_000) * 86_400_000
+    start_ms = end_ms - YEAR_MINUTES * MINUTE_MS
+    conn = get_db_connection()
+    # fetch_candles usa el pool asíncrono de la app
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(open_db_pool())
+    try:
+        if args.seed:
+            seed(conn, symbol, end_ms)
+            rebuild_rollups(symbol)
+        for interval in ("1h", "1d"):
+            print(f"{interval} ({BARS[interval]} barras, un año de 1m)")
+            bars, samples = timed(lambda: legacy(conn, symbol, interval, start_ms), args.runs)
+            report("pandas", bars, samples, YEAR_MINUTES)
+            bars, samples = timed(lambda: on_the_fly(symbol, interval), args.runs)
+            report("sql", bars, samples, len(bars))
+            bars, samples = timed(
+                lambda: loop.run_until_complete(fetch_candles(symbol, interval, None, BARS[interval])), args.runs,
+            )
+            report("rollup", bars, samples, len(bars))
+    finally:
+        if args.seed:
+            with conn.cursor() as cursor:
+                for table in ("candlesticks", *ROLLUP_TABLES.values()):
+                    cursor.execute(f"DELETE FROM {table} WHERE symbol = %s", (symbol,))
+            conn.commit()
+        conn.close()
+        loop.run_until_complete(close_db_pool())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# bench/order_roundtrip.py
+#
+# Benchmark de extremo a extremo del camino de órdenes contra mock_exchange.py:
+# N ciclos compra → venta con place_market_order / close_market_order,
+# reportando percentiles del round trip y de cada etapa (utils/metrics).
+#
+#   MOCK_BALANCES="USDT=100000,BTC=100000" python mock_exchange.py --latency-ms 5 &
+#   python bench/order_roundtrip.py --orders 200 --transport ws
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Round trip de órdenes contra el exchange simulado")
+    parser.add_argument("--url", default="http://127.0.0.1:8900", help="URL REST del mock")
+    parser.add_argument("--orders", type=int, default=100, help="ciclos compra+venta")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--transport", choices=["rest", "ws"], default="rest", help="transporte de órdenes")
+    return parser.parse_args()
+
+
+async def run(args):
+    from services.binance_api import close_market_order, place_market_order
+    from services.binance_http import close_binance_client, start_binance_client
+    from services.order_transport import close_order_transport, get_ws_session, start_order_transport
+    from utils.metrics import LatencyHistogram, finish_order_trace, order_path_summary, start_order_trace
+
+    await start_binance_client()
+    await start_order_transport()
+    if args.transport == "ws":
+        while not get_ws_session().ready:
+            await asyncio.sleep(0.05)
+    buy, sell = LatencyHistogram(), LatencyHistogram()
+    errors = 0
+    try:
+        for _ in range(args.orders):
+            for hist, side, send in ((buy, "buy", place_market_order), (sell, "sell", close_market_order)):
+                start = time.perf_counter()
+                start_order_trace(side, args.symbol)
+                result = await send(args.symbol)
+                hist.observe(time.perf_counter() - start)
+                ok = result.get("status") == "FILLED"
+                finish_order_trace(record=ok)
+                errors += not ok
+    finally:
+        await close_order_transport()
+        await close_binance_client()
+
+    print(f"Órdenes: {args.orders * 2}  errores: {errors}")
+    print("round trip BUY ", buy.summary())
+    print("round trip SELL", sell.summary())
+    for side, stages in order_path_summary().items():
+        print(f"\nEtapas {side} (ms)")
+        for stage, summary in stages.items():
+            print(f"  {stage:<10} p50={summary['p50_ms']:<8} p95={summary['p95_ms']:<8} p99={summary['p99_ms']}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Antes de importar la app: las URLs y credenciales se leen al importar
+    os.environ["BINANCE_REST_URL"] = args.url
+    os.environ["BINANCE_WS_API_URL"] = args.url.replace("http", "ws", 1) + "/ws-api/v3"
+    os.environ["ORDER_TRANSPORT"] = args.transport
+    os.environ.setdefault("BINANCE_API_KEY", "bench")
+    os.environ.setdefault("BINANCE_SECRET", "bench")
+    asyncio.run(run(args))
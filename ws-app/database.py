@@ -1,16 +1,84 @@
 import os
+import logging
+from typing import Optional
+
 import psycopg2
 from dotenv import load_dotenv
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
 
 # Cargar variables de entorno
 load_dotenv(dotenv_path=".env")
 
-# Conexión global a PostgreSQL
+logger = logging.getLogger("binance_ws")
+
+# Pool asíncrono (psycopg 3) de la app
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+# Ejecuciones de una misma consulta antes de prepararla en el servidor
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", 1))
+# Conexiones inactivas más tiempo que esto se cierran (por encima de DB_POOL_MIN)
+DB_POOL_MAX_IDLE_SECS = float(os.getenv("DB_POOL_MAX_IDLE_SECS", 300))
+# Las conexiones se renuevan pasado este tiempo
+DB_POOL_MAX_LIFETIME_SECS = float(os.getenv("DB_POOL_MAX_LIFETIME_SECS", 3600))
+# Espera máxima por una conexión libre
+DB_POOL_TIMEOUT_SECS = float(os.getenv("DB_POOL_TIMEOUT_SECS", 10))
+
+_pool: Optional[AsyncConnectionPool] = None
+
+
+def _db_params() -> dict:
+    return {
+        "dbname": os.getenv("POSTGRES_DB"),
+        "user": os.getenv("POSTGRES_USER"),
+        "password": os.getenv("POSTGRES_PASSWORD"),
+        "host": os.getenv("POSTGRES_HOST"),
+        "port": os.getenv("POSTGRES_PORT"),
+    }
+
+
+# Conexión síncrona (scripts: redis_migrator, roll-ups por CLI, benchmarks)
 def get_db_connection():
-    return psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-        host=os.getenv("POSTGRES_HOST"),
-        port=os.getenv("POSTGRES_PORT")
-    )
+    return psycopg2.connect(**_db_params())
+
+
+async def open_db_pool() -> AsyncConnectionPool:
+    """
+    Lifespan: abre el pool sin esperar a que la base responda (las conexiones
+    se crean en segundo plano). Cada conexión se verifica al prestarla.
+    """
+    global _pool
+    if _pool is None:
+        params = {key: value for key, value in _db_params().items() if value}
+        _pool = AsyncConnectionPool(
+            make_conninfo(**params),
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            kwargs={"prepare_threshold": DB_PREPARE_THRESHOLD},
+            check=AsyncConnectionPool.check_connection,
+            max_idle=DB_POOL_MAX_IDLE_SECS,
+            max_lifetime=DB_POOL_MAX_LIFETIME_SECS,
+            timeout=DB_POOL_TIMEOUT_SECS,
+            name="ws-app",
+            open=False,
+        )
+        await _pool.open(wait=False)
+        logger.info(f"✅ Pool de PostgreSQL abierto ({DB_POOL_MIN}-{DB_POOL_MAX} conexiones)")
+    return _pool
+
+
+def get_db_pool() -> AsyncConnectionPool:
+    if _pool is None:
+        raise RuntimeError("Pool de PostgreSQL no inicializado (open_db_pool en el lifespan)")
+    return _pool
+
+
+async def close_db_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def db_pool_stats() -> dict:
+    return _pool.get_stats() if _pool is not None else {}
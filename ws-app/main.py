@@ -11,14 +11,31 @@ from starlette.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
 
 # Imports de tu proyecto
-from utils.redis_utils import evaluation_tasks
+from services.positions import detach_observer
 from shared.socket_context import sio, connected_users
 from routes.historical_data import router as historical_router
 from routes.historical_data_binance import router as historical_binance
 from routes.operation_config import router as operation_config
+from routes.metrics import router as metrics_router
 from services import binance_ws
 from services.telegram_bot import start_telegram_receiver, bot # Asegúrate que el nombre coincida
 from ai.agents.hourly_analyst import agent_analysis
+from utils.telegram_utils import telegram_sender
+from utils.metrics import order_latency_logger, thread_pool_sampler
+from services.scheduler import scheduler
+from utils.config_events import config_event_listener
+from services.binance_http import start_binance_client, close_binance_client
+from services.symbol_rules import symbol_rules_refresher
+from services.balance_book import user_data_stream, balance_reconciler
+from services.binance_auth import time_sync_loop
+from services.order_transport import start_order_transport, close_order_transport
+from services.order_book import start_order_books, close_order_books
+from services.market_streams import close_market_streams
+from services.order_flow import start_order_flow
+from services.symbol_rules import TRADED_SYMBOLS
+from services.binance_api import IS_DEV
+from database import open_db_pool, close_db_pool
+from services.candle_freshness import freshness_service
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -28,6 +45,7 @@ fastapi_app = FastAPI()
 fastapi_app.include_router(historical_router)
 fastapi_app.include_router(historical_binance)
 fastapi_app.include_router(operation_config)
+fastapi_app.include_router(metrics_router)
 
 @fastapi_app.get("/")
 async def root():
@@ -35,9 +53,39 @@ async def root():
 
 @asynccontextmanager
 async def lifespan(app: Starlette):
+    # Pool asíncrono de PostgreSQL compartido por las rutas
+    await open_db_pool()
+    # Cliente HTTP persistente para la API REST de Binance (conexiones calientes)
+    await start_binance_client()
+    # Offset de reloj con Binance para las peticiones firmadas
+    time_sync_task = asyncio.create_task(time_sync_loop())
+    # Sesión WS-API de órdenes (solo con ORDER_TRANSPORT=ws)
+    await start_order_transport()
+    # Libros L2 locales de los símbolos operados (estimación de deslizamiento)
+    await start_order_books()
+    # CVD/delta en vivo (aggTrade) para los símbolos operados
+    for traded_symbol in TRADED_SYMBOLS:
+        start_order_flow(traded_symbol)
+    # Reglas de símbolos (LOT_SIZE, PRICE_FILTER, MIN_NOTIONAL) en memoria
+    symbol_rules_task = asyncio.create_task(symbol_rules_refresher())
     # Arrancar Telegram
     telegram_task = asyncio.create_task(start_telegram_receiver())
     agent_task = asyncio.create_task(agent_analysis())
+    # Envío de Telegram encolado (no bloquea el stream) y muestreo del thread pool
+    telegram_sender_task = asyncio.create_task(telegram_sender())
+    sampler_task = asyncio.create_task(thread_pool_sampler())
+    # Percentiles por etapa del camino de órdenes al log
+    order_latency_task = asyncio.create_task(order_latency_logger())
+    # Scheduler central del trabajo periódico por posición
+    scheduler_task = asyncio.create_task(scheduler.run())
+    # Eventos de cambio de configuración (push) → caché local de configs
+    config_events_task = asyncio.create_task(config_event_listener())
+    # Libro de balances (solo producción: en desarrollo las cantidades son fijas)
+    balance_tasks = []
+    if not IS_DEV:
+        balance_tasks = [asyncio.create_task(user_data_stream()), asyncio.create_task(balance_reconciler())]
+    # Velas de los símbolos activos al día con Binance, fuera del camino de la gráfica
+    freshness_task = asyncio.create_task(freshness_service())
     yield  # La aplicación está funcionando
     
     # --- PROCESO DE CIERRE ---
@@ -46,6 +94,21 @@ async def lifespan(app: Starlette):
     # 1. Cancelamos la tarea de fondo
     telegram_task.cancel()
     agent_task.cancel()
+    telegram_sender_task.cancel()
+    sampler_task.cancel()
+    order_latency_task.cancel()
+    scheduler_task.cancel()
+    config_events_task.cancel()
+    freshness_task.cancel()
+    symbol_rules_task.cancel()
+    time_sync_task.cancel()
+    for task in balance_tasks:
+        task.cancel()
+    await close_order_books()
+    await close_market_streams()
+    await close_order_transport()
+    await close_binance_client()
+    await close_db_pool()
     # 2. Cierre forzado de la conexión de red de Telegram
     # Esto rompe el "bloqueo" que impide cerrar el servidor
     await bot.session.close() 
@@ -79,6 +142,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Legibles desde el frontend (otro origen)
+    expose_headers=["ETag", "X-Candles-Stale-Secs"],
 )
 # Eventos de conexión Socket.IO
 @sio.event
@@ -139,12 +204,10 @@ async def disconnect(sid):
         task_stream.cancel()
         del binance_ws.client_tasks[sid]
 
-    # 3. Cancelar la Tarea de Evaluación (El bucle de 10 segundos del Script 1)
-    # Esto evita que el bot siga calculando ventas para alguien desconectado
-    if sid in evaluation_tasks:
-        print(f"  🛑 Deteniendo bucle de evaluación para {sid}")
-        task_eval = evaluation_tasks.pop(sid) 
-        task_eval.cancel()
+    # 3. Soltar las posiciones que observaba este socket. El actor de evaluación
+    # (uno por user_id + symbol) solo se detiene si ya no queda ninguna pestaña
+    # observándolo, para no seguir calculando ventas para alguien desconectado
+    await detach_observer(sid)
 
 
 @sio.event
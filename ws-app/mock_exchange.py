@@ -0,0 +1,637 @@
+# mock_exchange.py
+#
+# Exchange Binance simulado para pruebas y benchmarks de extremo a extremo sin
+# la API real. Sirve en un solo proceso:
+#   • WS   /ws/<symbol>@kline_<interval>  → klines sintéticas (random walk) o
+#                                           reproducidas de un archivo grabado
+#   • WS   /ws/<symbol>@depth@100ms       → diffs de profundidad (+ /api/v3/depth)
+#   • WS   /ws/<symbol>@aggTrade          → trades agregados sintéticos
+#   • WS   /ws/<listenKey>                → user-data stream (balances/ejecuciones)
+#   • REST /api/v3/ping, /time, /order, /account, /exchangeInfo,
+#          /ticker/price, /klines, /userDataStream
+#   • WS   /ws-api/v3                     → WebSocket API (order.place, order.status)
+#   • REST /mock/config, /mock/deposit    → escenarios (latencia, fill_mode, depósitos)
+# con latencia, resultado de las órdenes y límite de peso por minuto
+# (X-MBX-USED-WEIGHT-1M, 429) configurables.
+#
+# Uso:
+#   MOCK_BALANCES="USDT=10000,BTC=1000" python mock_exchange.py --port 8900 --latency-ms 20 --speed 10
+#   BINANCE_REST_URL=http://127.0.0.1:8900 BINANCE_WS_URL=ws://127.0.0.1:8900 \
+#   BINANCE_WS_API_URL=ws://127.0.0.1:8900/ws-api/v3 ORDER_TRANSPORT=ws uvicorn main:app
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, List, Optional, Set
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+# Configuración (variables de entorno; el CLI las sobreescribe)
+MOCK_CONFIG = {
+    "latency_ms": float(os.getenv("MOCK_LATENCY_MS", 0)),      # latencia fija de cada respuesta REST
+    "jitter_ms": float(os.getenv("MOCK_JITTER_MS", 0)),        # + uniforme [0, jitter]
+    "fill_mode": os.getenv("MOCK_FILL_MODE", "FILLED"),        # FILLED | PARTIALLY_FILLED | EXPIRED | REJECT
+    "slippage_bps": float(os.getenv("MOCK_SLIPPAGE_BPS", 0)),  # deslizamiento del precio de ejecución
+    "speed": float(os.getenv("MOCK_SPEED", 1)),                # ticks de kline por segundo
+    "ticks_per_candle": int(os.getenv("MOCK_TICKS_PER_CANDLE", 10)),
+    "replay_file": os.getenv("MOCK_REPLAY_FILE"),              # JSON con klines REST [[t, o, h, l, c, v, ...], ...]
+    "start_price": float(os.getenv("MOCK_START_PRICE", 100)),
+    "volatility": float(os.getenv("MOCK_VOLATILITY", 0.001)),  # desviación relativa por tick
+    "weight_limit": int(os.getenv("MOCK_WEIGHT_LIMIT", 6000)),  # peso REST por minuto antes de responder 429
+}
+
+# Peso de cada endpoint REST (el resto pesa 1)
+REQUEST_WEIGHTS = {"/api/v3/klines": 2, "/api/v3/exchangeInfo": 20, "/api/v3/account": 20, "/api/v3/depth": 5}
+
+INTERVAL_MS = {"1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+               "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+
+app = FastAPI()
+
+# Estado del exchange
+# MOCK_BALANCES="USDT=10000,BTC=50" → balances iniciales
+balances: Dict[str, Dict[str, Decimal]] = {
+    asset.strip().upper(): {"free": Decimal(amount), "locked": Decimal("0")}
+    for asset, _, amount in (item.partition("=") for item in os.getenv("MOCK_BALANCES", "USDT=10000").split(",") if item.strip())
+}
+prices: Dict[str, float] = {}
+orders: Dict[str, dict] = {}          # origClientOrderId → orden
+candles: Dict[str, List[list]] = {}   # "SYMBOL:interval" → klines cerradas (formato REST)
+user_streams: Dict[str, Set[asyncio.Queue]] = {}
+_order_id = 0
+_weight = {"minute": 0, "used": 0}
+
+
+def _price(symbol: str) -> float:
+    return prices.setdefault(symbol, MOCK_CONFIG["start_price"])
+
+
+def _fmt(value) -> str:
+    return format(Decimal(str(value)).quantize(Decimal("0.00000001")), "f")
+
+
+async def _latency():
+    delay = MOCK_CONFIG["latency_ms"] + random.uniform(0, MOCK_CONFIG["jitter_ms"])
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+
+def _symbol_assets(symbol: str):
+    return symbol[:-4], "USDT"  # solo pares *USDT
+
+
+def _symbol_info(symbol: str) -> dict:
+    base, quote = _symbol_assets(symbol)
+    return {
+        "symbol": symbol,
+        "status": "TRADING",
+        "baseAsset": base,
+        "quoteAsset": quote,
+        "baseAssetPrecision": 8,
+        "quoteAssetPrecision": 8,
+        "filters": [
+            {"filterType": "PRICE_FILTER", "minPrice": "0.00010000", "maxPrice": "1000000.00000000", "tickSize": "0.00010000"},
+            {"filterType": "LOT_SIZE", "minQty": "0.00100000", "maxQty": "9000000.00000000", "stepSize": "0.00100000"},
+            {"filterType": "NOTIONAL", "minNotional": "5.00000000", "applyMinToMarket": True,
+             "maxNotional": "9000000.00000000", "applyMaxToMarket": False, "avgPriceMins": 5},
+        ],
+    }
+
+
+def _error(code: int, msg: str, status: int = 400) -> JSONResponse:
+    return JSONResponse({"code": code, "msg": msg}, status_code=status)
+
+
+# ------------------------------------------------------------------
+# Feeds de klines (uno por símbolo/intervalo, compartido por los suscriptores)
+# ------------------------------------------------------------------
+class KlineFeed:
+    def __init__(self, symbol: str, interval: str):
+        self.symbol = symbol
+        self.interval = interval
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def _load_replay(self) -> List[list]:
+        with open(MOCK_CONFIG["replay_file"]) as f:
+            return json.load(f)
+
+    def _synthetic(self):
+        """Random walk; cada `ticks_per_candle` ticks se cierra la vela."""
+        interval_ms = INTERVAL_MS.get(self.interval, 60_000)
+        open_time = int(time.time() * 1000) // interval_ms * interval_ms
+        while True:
+            o = h = l = c = _price(self.symbol)
+            volume = 0.0
+            for tick in range(MOCK_CONFIG["ticks_per_candle"]):
+                c = max(c * (1 + random.gauss(0, MOCK_CONFIG["volatility"])), 0.0001)
+                h, l = max(h, c), min(l, c)
+                volume += random.uniform(0.1, 5)
+                yield [open_time, o, h, l, c, volume, open_time + interval_ms - 1], tick == MOCK_CONFIG["ticks_per_candle"] - 1
+            open_time += interval_ms
+
+    def _replay(self):
+        for row in self._load_replay():
+            row = [row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]), row[6]]
+            # Un tick abierto al precio de apertura y luego la vela cerrada
+            yield [row[0], row[1], row[1], row[1], row[1], 0.0, row[6]], False
+            yield row, True
+
+    def _message(self, row: list, closed: bool) -> dict:
+        open_time, o, h, l, c, v, close_time = row
+        return {
+            "e": "kline",
+            "E": int(time.time() * 1000),
+            "s": self.symbol,
+            "k": {
+                "t": open_time, "T": close_time, "s": self.symbol, "i": self.interval,
+                "o": _fmt(o), "h": _fmt(h), "l": _fmt(l), "c": _fmt(c), "v": _fmt(v),
+                "n": random.randint(10, 500), "x": closed,
+                "q": _fmt(v * c), "V": _fmt(v / 2), "Q": _fmt(v * c / 2),
+            },
+        }
+
+    async def run(self):
+        source = self._replay() if MOCK_CONFIG["replay_file"] else self._synthetic()
+        key = f"{self.symbol}:{self.interval}"
+        for row, closed in source:
+            prices[self.symbol] = row[4]
+            message = json.dumps(self._message(row, closed))
+            if closed:
+                history = candles.setdefault(key, [])
+                history.append([row[0], _fmt(row[1]), _fmt(row[2]), _fmt(row[3]), _fmt(row[4]), _fmt(row[5]), row[6],
+                                _fmt(row[5] * row[4]), 100, _fmt(row[5] / 2), _fmt(row[5] * row[4] / 2), "0"])
+                del history[:-1000]
+            for queue in list(self.subscribers):
+                if queue.qsize() < 1000:
+                    queue.put_nowait(message)
+            await asyncio.sleep(1 / MOCK_CONFIG["speed"])
+
+
+kline_feeds: Dict[str, KlineFeed] = {}
+
+
+def _subscribe_kline(symbol: str, interval: str) -> asyncio.Queue:
+    key = f"{symbol}:{interval}"
+    feed = kline_feeds.get(key)
+    if feed is None:
+        feed = kline_feeds[key] = KlineFeed(symbol, interval)
+    if feed.task is None or feed.task.done():
+        feed.task = asyncio.create_task(feed.run())
+    queue = asyncio.Queue()
+    feed.subscribers.add(queue)
+    return queue
+
+
+def _unsubscribe_kline(symbol: str, interval: str, queue: asyncio.Queue):
+    feed = kline_feeds.get(f"{symbol}:{interval}")
+    if feed is None:
+        return
+    feed.subscribers.discard(queue)
+    if not feed.subscribers and feed.task:
+        feed.task.cancel()
+        feed.task = None
+
+
+# ------------------------------------------------------------------
+# WebSocket
+# ------------------------------------------------------------------
+# ------------------------------------------------------------------
+# Libro de órdenes sintético (depth diff stream + snapshot REST)
+# ------------------------------------------------------------------
+class DepthFeed:
+    """Libro alrededor del precio actual; cada 100 ms publica un diff con U/u consecutivos."""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.update_id = 1000
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.tick = 0.01
+        self._rebuild()
+
+    def _rebuild(self):
+        mid = _price(self.symbol)
+        for i in range(1, 200):
+            self.bids[round(mid - i * self.tick, 8)] = round(random.uniform(0.1, 20), 3)
+            self.asks[round(mid + i * self.tick, 8)] = round(random.uniform(0.1, 20), 3)
+
+    def step(self) -> dict:
+        mid = _price(self.symbol)
+        changed_b, changed_a = {}, {}
+        # Niveles que cruzarían el precio actual desaparecen
+        for p in [p for p in self.bids if p >= mid]:
+            del self.bids[p]
+            changed_b[p] = 0.0
+        for p in [p for p in self.asks if p <= mid]:
+            del self.asks[p]
+            changed_a[p] = 0.0
+        for _ in range(5):
+            p = round(mid - random.randint(1, 200) * self.tick, 8)
+            q = 0.0 if random.random() < 0.2 else round(random.uniform(0.1, 20), 3)
+            changed_b[p] = q
+            self.bids.pop(p, None) if q == 0 else self.bids.__setitem__(p, q)
+            p = round(mid + random.randint(1, 200) * self.tick, 8)
+            q = 0.0 if random.random() < 0.2 else round(random.uniform(0.1, 20), 3)
+            changed_a[p] = q
+            self.asks.pop(p, None) if q == 0 else self.asks.__setitem__(p, q)
+        first = self.update_id + 1
+        self.update_id += random.randint(1, 3)
+        return {
+            "e": "depthUpdate", "E": int(time.time() * 1000), "s": self.symbol,
+            "U": first, "u": self.update_id,
+            "b": [[_fmt(p), _fmt(q)] for p, q in changed_b.items()],
+            "a": [[_fmt(p), _fmt(q)] for p, q in changed_a.items()],
+        }
+
+    def snapshot(self, limit: int) -> dict:
+        return {
+            "lastUpdateId": self.update_id,
+            "bids": [[_fmt(p), _fmt(q)] for p, q in sorted(self.bids.items(), reverse=True)[:limit]],
+            "asks": [[_fmt(p), _fmt(q)] for p, q in sorted(self.asks.items())[:limit]],
+        }
+
+    async def run(self):
+        while True:
+            message = json.dumps(self.step())
+            for queue in list(self.subscribers):
+                queue.put_nowait(message)
+            await asyncio.sleep(0.1)
+
+
+depth_feeds: Dict[str, DepthFeed] = {}
+
+
+def _depth_feed(symbol: str) -> DepthFeed:
+    feed = depth_feeds.get(symbol)
+    if feed is None:
+        feed = depth_feeds[symbol] = DepthFeed(symbol)
+    if feed.task is None or feed.task.done():
+        feed.task = asyncio.create_task(feed.run())
+    return feed
+
+
+@app.websocket("/ws/{stream}")
+async def ws_stream(websocket: WebSocket, stream: str):
+    await websocket.accept()
+    if "@aggTrade" in stream:
+        # Trades sintéticos al precio actual (~20/s), agresor aleatorio
+        symbol = stream.partition("@")[0].upper()
+        agg_id = 0
+        try:
+            while True:
+                agg_id += 1
+                now = int(time.time() * 1000)
+                await websocket.send_text(json.dumps({
+                    "e": "aggTrade", "E": now, "s": symbol, "a": agg_id,
+                    "p": _fmt(_price(symbol)), "q": _fmt(round(random.expovariate(1.0), 4)),
+                    "f": agg_id, "l": agg_id, "T": now, "m": random.random() < 0.5, "M": True,
+                }))
+                await asyncio.sleep(0.05)
+        except WebSocketDisconnect:
+            pass
+        return
+
+    if "@depth" in stream:
+        feed = _depth_feed(stream.partition("@")[0].upper())
+        queue = asyncio.Queue()
+        feed.subscribers.add(queue)
+        try:
+            while True:
+                await websocket.send_text(await queue.get())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            feed.subscribers.discard(queue)
+        return
+
+    if "@kline_" in stream:
+        symbol, _, interval = stream.partition("@kline_")
+        symbol = symbol.upper()
+        queue = _subscribe_kline(symbol, interval)
+        try:
+            while True:
+                await websocket.send_text(await queue.get())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            _unsubscribe_kline(symbol, interval, queue)
+        return
+
+    # Cualquier otro nombre se trata como listenKey del user-data stream
+    queue = asyncio.Queue()
+    user_streams.setdefault(stream, set()).add(queue)
+    try:
+        while True:
+            await websocket.send_text(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        user_streams.get(stream, set()).discard(queue)
+
+
+def _push_user_event(event: dict):
+    message = json.dumps(event)
+    for queues in user_streams.values():
+        for queue in queues:
+            queue.put_nowait(message)
+
+
+# ------------------------------------------------------------------
+# REST
+# ------------------------------------------------------------------
+@app.middleware("http")
+async def request_weight(request: Request, call_next):
+    """Peso por minuto como en Binance: cabecera X-MBX-USED-WEIGHT-1M y 429 al superar el límite."""
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    now = time.time()
+    if _weight["minute"] != int(now // 60):
+        _weight.update(minute=int(now // 60), used=0)
+    _weight["used"] += REQUEST_WEIGHTS.get(request.url.path, 1)
+    headers = {"X-MBX-USED-WEIGHT-1M": str(_weight["used"])}
+    if _weight["used"] > MOCK_CONFIG["weight_limit"]:
+        headers["Retry-After"] = str(int(60 - now % 60) + 1)
+        return JSONResponse({"code": -1003, "msg": "Too many requests"}, status_code=429, headers=headers)
+    response = await call_next(request)
+    response.headers.update(headers)
+    return response
+
+
+@app.get("/api/v3/ping")
+async def ping():
+    await _latency()
+    return {}
+
+
+@app.get("/api/v3/time")
+async def server_time():
+    await _latency()
+    return {"serverTime": int(time.time() * 1000)}
+
+
+@app.get("/api/v3/exchangeInfo")
+async def exchange_info(symbol: Optional[str] = None, symbols: Optional[str] = None):
+    await _latency()
+    if symbols:
+        names = json.loads(symbols)
+    elif symbol:
+        names = [symbol]
+    else:
+        names = sorted(set(prices) | {"BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT"})
+    return {"timezone": "UTC", "serverTime": int(time.time() * 1000), "symbols": [_symbol_info(s.upper()) for s in names]}
+
+
+@app.get("/api/v3/depth")
+async def depth(symbol: str, limit: int = 100):
+    await _latency()
+    return _depth_feed(symbol.upper()).snapshot(limit)
+
+
+@app.get("/api/v3/ticker/price")
+async def ticker_price(symbol: str):
+    await _latency()
+    return {"symbol": symbol.upper(), "price": _fmt(_price(symbol.upper()))}
+
+
+@app.get("/api/v3/klines")
+async def klines(symbol: str, interval: str, limit: int = 500, startTime: Optional[int] = None, endTime: Optional[int] = None):
+    await _latency()
+    symbol = symbol.upper()
+    rows = candles.get(f"{symbol}:{interval}", [])
+    if startTime is not None:
+        rows = [r for r in rows if r[0] >= startTime]
+    if endTime is not None:
+        rows = [r for r in rows if r[0] <= endTime]
+    if rows:
+        return rows[:limit]
+
+    # Sin historial grabado: velas sintéticas planas hacia atrás desde ahora
+    interval_ms = INTERVAL_MS.get(interval, 60_000)
+    if startTime is not None:
+        start = -(-startTime // interval_ms) * interval_ms  # primera vela que abre en o después de startTime
+    else:
+        start = (int(time.time() * 1000) // interval_ms - limit + 1) * interval_ms
+    price = _price(symbol)
+    result = []
+    for i in range(limit):
+        t = start + i * interval_ms
+        if endTime is not None and t > endTime or t > time.time() * 1000:
+            break
+        p = _fmt(price)
+        result.append([t, p, p, p, p, "1.00000000", t + interval_ms - 1, p, 1, "0.50000000", _fmt(price / 2), "0"])
+    return result
+
+
+@app.get("/api/v3/account")
+async def account(request: Request):
+    await _latency()
+    if "signature" not in request.query_params:
+        return _error(-1102, "Mandatory parameter 'signature' was not sent.")
+    return {
+        "makerCommission": 10, "takerCommission": 10, "canTrade": True,
+        "updateTime": int(time.time() * 1000), "accountType": "SPOT",
+        "balances": [{"asset": a, "free": _fmt(b["free"]), "locked": _fmt(b["locked"])} for a, b in balances.items()],
+    }
+
+
+@app.post("/api/v3/userDataStream")
+async def create_listen_key():
+    await _latency()
+    return {"listenKey": uuid.uuid4().hex}
+
+
+@app.put("/api/v3/userDataStream")
+async def keepalive_listen_key():
+    await _latency()
+    return {}
+
+
+def _fill(symbol: str, side: str, quantity: Decimal, client_order_id: str, limit_price: Optional[Decimal] = None) -> dict:
+    global _order_id
+    base, quote = _symbol_assets(symbol)
+    slip = MOCK_CONFIG["slippage_bps"] / 10_000
+    price = Decimal(str(_price(symbol) * (1 + slip if side == "BUY" else 1 - slip)))
+    mode = MOCK_CONFIG["fill_mode"]
+    executed = quantity if mode == "FILLED" else (quantity / 2 if mode == "PARTIALLY_FILLED" else Decimal("0"))
+    if limit_price is not None and (price > limit_price if side == "BUY" else price < limit_price):
+        executed = Decimal("0")  # IOC fuera de precio: expira sin ejecutar
+    quote_qty = executed * price
+
+    base_bal = balances.setdefault(base, {"free": Decimal("0"), "locked": Decimal("0")})
+    quote_bal = balances.setdefault(quote, {"free": Decimal("0"), "locked": Decimal("0")})
+    if side == "BUY":
+        base_bal["free"] += executed
+        quote_bal["free"] -= quote_qty
+    else:
+        base_bal["free"] -= executed
+        quote_bal["free"] += quote_qty
+
+    _order_id += 1
+    now = int(time.time() * 1000)
+    order = {
+        "symbol": symbol, "orderId": _order_id, "orderListId": -1, "clientOrderId": client_order_id,
+        "transactTime": now, "price": "0.00000000", "origQty": _fmt(quantity), "executedQty": _fmt(executed),
+        "cummulativeQuoteQty": _fmt(quote_qty), "status": "EXPIRED" if executed == 0 else mode,
+        "timeInForce": "IOC" if limit_price is not None else "GTC",
+        "type": "LIMIT" if limit_price is not None else "MARKET", "side": side,
+        "fills": [{"price": _fmt(price), "qty": _fmt(executed), "commission": _fmt(executed * Decimal("0.001")),
+                   "commissionAsset": base, "tradeId": _order_id}] if executed > 0 else [],
+    }
+    orders[client_order_id] = order
+
+    _push_user_event({
+        "e": "executionReport", "E": now, "s": symbol, "c": client_order_id, "S": side, "o": "MARKET",
+        "q": _fmt(quantity), "X": order["status"], "i": _order_id, "z": _fmt(executed),
+        "Z": _fmt(quote_qty), "T": now,
+    })
+    _push_user_event({
+        "e": "outboundAccountPosition", "E": now, "u": now,
+        "B": [{"a": a, "f": _fmt(balances[a]["free"]), "l": _fmt(balances[a]["locked"])} for a in (base, quote)],
+    })
+    return order
+
+
+class MockError(Exception):
+    def __init__(self, code: int, msg: str):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+
+
+def _place_order(params: dict) -> dict:
+    if "signature" not in params:
+        raise MockError(-1102, "Mandatory parameter 'signature' was not sent.")
+    if MOCK_CONFIG["fill_mode"] == "REJECT":
+        raise MockError(-2010, "Account has insufficient balance for requested action.")
+
+    symbol = params["symbol"].upper()
+    side = params["side"].upper()
+    quantity = Decimal(str(params["quantity"]))
+    client_order_id = params.get("newClientOrderId") or uuid.uuid4().hex
+    if client_order_id in orders:
+        raise MockError(-2010, "Duplicate order sent.")
+    base, quote = _symbol_assets(symbol)
+    if side == "SELL" and balances.get(base, {"free": Decimal("0")})["free"] < quantity:
+        raise MockError(-2010, "Account has insufficient balance for requested action.")
+    limit_price = Decimal(str(params["price"])) if params.get("type", "MARKET").upper() == "LIMIT" else None
+    return _fill(symbol, side, quantity, client_order_id, limit_price)
+
+
+def _find_order(params: dict) -> dict:
+    for order in orders.values():
+        if order["clientOrderId"] == params.get("origClientOrderId") or order["orderId"] == params.get("orderId"):
+            return order
+    raise MockError(-2013, "Order does not exist.")
+
+
+@app.post("/api/v3/order")
+async def new_order(request: Request):
+    await _latency()
+    params = dict(request.query_params)
+    if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+        params.update(dict(await request.form()))
+    try:
+        return _place_order(params)
+    except MockError as e:
+        return _error(e.code, e.msg)
+
+
+@app.get("/api/v3/order")
+async def query_order(request: Request):
+    await _latency()
+    params = dict(request.query_params)
+    if "orderId" in params:
+        params["orderId"] = int(params["orderId"])
+    try:
+        return _find_order(params)
+    except MockError as e:
+        return _error(e.code, e.msg)
+
+
+# ------------------------------------------------------------------
+# WebSocket API (order.place / order.status / ping)
+# ------------------------------------------------------------------
+WS_API_METHODS = {
+    "order.place": _place_order,
+    "order.status": _find_order,
+    "ping": lambda params: {},
+    "time": lambda params: {"serverTime": int(time.time() * 1000)},
+}
+
+
+@app.websocket("/ws-api/v3")
+async def ws_api(websocket: WebSocket):
+    await websocket.accept()
+
+    async def handle(request: dict):
+        await _latency()
+        response = {"id": request.get("id")}
+        handler = WS_API_METHODS.get(request.get("method"))
+        try:
+            if handler is None:
+                raise MockError(-1100, f"Unknown method: {request.get('method')}")
+            response.update({"status": 200, "result": handler(request.get("params") or {})})
+        except MockError as e:
+            response.update({"status": 400, "error": {"code": e.code, "msg": e.msg}})
+        await websocket.send_text(json.dumps(response))
+
+    try:
+        while True:
+            # Las peticiones se atienden concurrentemente, como en la WS-API real
+            asyncio.create_task(handle(json.loads(await websocket.receive_text())))
+    except WebSocketDisconnect:
+        pass
+
+
+@app.post("/mock/deposit")
+async def deposit(request: Request):
+    """Depósito (o retiro, con amount < 0): cambia el balance y publica balanceUpdate."""
+    body = await request.json()
+    asset, delta = body["asset"].upper(), Decimal(str(body["amount"]))
+    entry = balances.setdefault(asset, {"free": Decimal("0"), "locked": Decimal("0")})
+    entry["free"] += delta
+    now = int(time.time() * 1000)
+    _push_user_event({"e": "balanceUpdate", "E": now, "a": asset, "d": _fmt(delta), "T": now})
+    return {"asset": asset, "free": _fmt(entry["free"])}
+
+
+@app.post("/mock/config")
+async def update_config(request: Request):
+    """Cambia la configuración en caliente (p.ej. latencia o fill_mode entre escenarios)."""
+    MOCK_CONFIG.update(await request.json())
+    return MOCK_CONFIG
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exchange Binance simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float)
+    parser.add_argument("--jitter-ms", type=float)
+    parser.add_argument("--fill-mode", choices=["FILLED", "PARTIALLY_FILLED", "EXPIRED", "REJECT"])
+    parser.add_argument("--slippage-bps", type=float)
+    parser.add_argument("--speed", type=float, help="ticks de kline por segundo")
+    parser.add_argument("--replay-file", help="JSON con klines REST para reproducir")
+    parser.add_argument("--weight-limit", type=int, help="peso REST por minuto antes de responder 429")
+    args = parser.parse_args()
+
+    for name in ("latency_ms", "jitter_ms", "fill_mode", "slippage_bps", "speed", "replay_file", "weight_limit"):
+        value = getattr(args, name)
+        if value is not None:
+            MOCK_CONFIG[name] = value
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
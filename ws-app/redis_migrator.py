@@ -1,9 +1,12 @@
 import time
 import json
 import os
+import re
 import redis
 from logger import logger
 from database import get_db_connection  # 🔥 Importar función de conexión
+from services.candle_rollups import refresh_rollups
+from services.candle_cache import mark_candles_persisted
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -13,6 +16,18 @@ load_dotenv(dotenv_path=".env")
 REDIS_URL = os.getenv("REDIS_URL")
 redis_client = redis.StrictRedis.from_url(REDIS_URL, decode_responses=True)
 
+# Las velas de 1m viven en un ZSET por símbolo con el nombre del símbolo (BTCUSDT);
+# el resto de claves (caché candles:*, watermarks, *_version, *_results...) no se migran
+CANDLE_KEY_RE = re.compile(r"^[A-Z0-9]+$")
+
+
+def candle_keys():
+    """ZSETs de velas de 1m pendientes de migrar (SCAN, sin bloquear Redis como KEYS)."""
+    for key in redis_client.scan_iter(count=500, _type="zset"):
+        if CANDLE_KEY_RE.match(key):
+            yield key
+
+
 def migrate_redis_to_postgres():
     """ 🔥 Migra datos de Redis a PostgreSQL y elimina los datos migrados después """
     while True:
@@ -23,32 +38,45 @@ def migrate_redis_to_postgres():
             conn = get_db_connection()  # 🔥 Se usa la conexión centralizada de `database.py`
             cursor = conn.cursor()
 
-            for sorted_set_key in redis_client.keys("*"):
-                redis_data = redis_client.zrangebyscore(sorted_set_key, "-inf", time.time() * 1000 - 300000)
-
-                if redis_data:
-                    for data in redis_data:
-                        kline = json.loads(data)
-                        cursor.execute("""
-                        INSERT INTO candlesticks (symbol, open, high, low, close, volume, timestamp, number_of_trades, taker_buy_quote_asset_volume)
-                        VALUES (%s, %s, %s, %s, %s, %s, CAST(%s AS BIGINT), %s, %s)
-                        ON CONFLICT DO NOTHING;
-                        """, (
-                            sorted_set_key,
-                            kline["open"],
-                            kline["high"],
-                            kline["low"],
-                            kline["close"],
-                            kline["volume"],
-                            kline["timestamp"],
-                            kline["number_of_trades"],
-                            kline["taker_buy_quote_asset_volume"]
-                        ))
-
-                    conn.commit()
-                    logger.info(f" Migrados {len(redis_data)} registros de {sorted_set_key} a PostgreSQL")
-
-                    redis_client.zremrangebyscore(sorted_set_key, "-inf", time.time() * 1000 - 300000)
+            for sorted_set_key in candle_keys():
+                # Un símbolo con datos inválidos no detiene la migración de los demás
+                try:
+                    redis_data = redis_client.zrangebyscore(sorted_set_key, "-inf", time.time() * 1000 - 300000)
+
+                    if redis_data:
+                        timestamps = []
+                        for data in redis_data:
+                            kline = json.loads(data)
+                            cursor.execute("""
+                            INSERT INTO candlesticks (symbol, open, high, low, close, volume, timestamp, number_of_trades, taker_buy_quote_asset_volume)
+                            VALUES (%s, %s, %s, %s, %s, %s, CAST(%s AS BIGINT), %s, %s)
+                            ON CONFLICT DO NOTHING;
+                            """, (
+                                sorted_set_key,
+                                kline["open"],
+                                kline["high"],
+                                kline["low"],
+                                kline["close"],
+                                kline["volume"],
+                                kline["timestamp"],
+                                kline["number_of_trades"],
+                                kline["taker_buy_quote_asset_volume"]
+                            ))
+                            if cursor.rowcount == 1:
+                                timestamps.append(int(kline["timestamp"]))
+
+                        # Roll-ups 5m/15m/1h/1d: solo los buckets de las velas nuevas
+                        if timestamps:
+                            refresh_rollups(cursor, sorted_set_key, min(timestamps), max(timestamps))
+                        conn.commit()
+                        if timestamps:
+                            mark_candles_persisted(redis_client, sorted_set_key, min(timestamps), max(timestamps))
+                        logger.info(f" Migrados {len(redis_data)} registros de {sorted_set_key} a PostgreSQL")
+
+                        redis_client.zremrangebyscore(sorted_set_key, "-inf", time.time() * 1000 - 300000)
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f" Error migrando {sorted_set_key}: {e}")
 
             cursor.close()
             conn.close()
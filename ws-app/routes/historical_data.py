@@ -1,104 +1,133 @@
-from fastapi import APIRouter, HTTPException
-from database import get_db_connection
-from utils.redis_utils import sync_recent_candles_redis
-import pandas as pd
-from datetime import timedelta
+import logging
+import time
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from redis.exceptions import RedisError
+from services.candle_cache import cache_key, cache_stats, etag_matches, get_cached, store
+from services.candle_export import EXPORT_FORMATS, export_available, stream_export
+from services.candle_freshness import refresh_symbol, report_gap, staleness_secs, touch_symbol
+from services.candles import CANDLE_STREAM_MIN_BARS, INTERVAL_MS, candles_json, fetch_candles, stream_candles_json
+from utils.redis_utils import async_redis_client
 from utils.redis_utils import redis_client
 import json
 
 router = APIRouter()
+logger = logging.getLogger("binance_ws")
+
+# Segundos de retraso de las velas guardadas respecto a la última vela cerrada
+STALENESS_HEADER = "X-Candles-Stale-Secs"
+
+
+def _cached_response(request: Request, etag: str, body: bytes, headers: dict) -> Response:
+    # no-cache: el navegador siempre revalida con If-None-Match (304 sin cuerpo)
+    headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache_stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _staleness_headers(symbol: str) -> dict:
+    try:
+        stale = await staleness_secs(symbol)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo calcular el retraso de {symbol.upper()}: {e}")
+        return {}
+    return {STALENESS_HEADER: f"{stale:g}"} if stale is not None else {}
 
-VALID_INTERVALS = {
-    "1m": "1min",
-    "5m": "5min",
-    "15m": "15min",
-    "1h": "1H",
-    "1d": "1D"
-}
 
 @router.get("/historical-data/{symbol}/{interval}")
-async def get_historical_data(symbol: str, interval: str, before: int = None, limit: int = 500):
-    if interval not in VALID_INTERVALS:
+async def get_historical_data(request: Request, symbol: str, interval: str, before: int = None, limit: int = 500,
+                              stream: bool = False):
+    if interval not in INTERVAL_MS:
         raise HTTPException(status_code=400, detail="Intervalo no válido. Usa: 1m, 5m, 15m, 1h, 1d.")
-    
-    try:
-        conn = get_db_connection()
 
+    try:
         # Convertir 'before' (UNIX en segundos) a milisegundos para la consulta
-        sql_before = before * 1000 if before else None
-
-        if sql_before:
-            query = """
-                SELECT timestamp, open, high, low, close, volume, number_of_trades
-                FROM public.candlesticks
-                WHERE symbol = %s AND timestamp < %s
-                ORDER BY timestamp DESC
-                LIMIT %s
-            """
-            df = pd.read_sql_query(query, conn, params=(symbol.upper(), sql_before, limit))
-        else:
-            query = """
-                SELECT timestamp, open, high, low, close, volume, number_of_trades
-                FROM public.candlesticks
-                WHERE symbol = %s
-                ORDER BY timestamp DESC
-                LIMIT %s
-            """
-            df = pd.read_sql_query(query, conn, params=(symbol.upper(), limit))
-
-        conn.close()
-
-        if df.empty:
+        sql_before = int(before) * 1000 if before else None
+        headers = await _staleness_headers(symbol)
+
+        # Rangos grandes: JSON por tramos desde un cursor de servidor, memoria constante
+        if stream or limit > CANDLE_STREAM_MIN_BARS:
+            return StreamingResponse(
+                stream_candles_json(symbol, interval, sql_before, limit), media_type="application/json",
+                headers=headers,
+            )
+
+        # Caché (LRU + Redis): los rangos cerrados no cambian nunca
+        key, closed = None, False
+        try:
+            key, closed = await cache_key(async_redis_client, symbol, interval, sql_before, limit)
+            cached = await get_cached(async_redis_client, key)
+            if cached is not None:
+                return _cached_response(request, *cached, headers)
+        except RedisError as e:
+            logger.warning(f"⚠️ Caché de velas no disponible: {e}")
+
+        # Agregación en PostgreSQL (pool asíncrono): `limit` son barras del intervalo pedido
+        rows = await fetch_candles(symbol, interval, sql_before, limit)
+
+        if not rows:
             raise HTTPException(status_code=404, detail="No hay datos disponibles para este símbolo e intervalo.")
 
-        df = df.sort_values(by='timestamp')  # volver a orden ascendente
-        df['ts'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df.set_index('ts', inplace=True)
-
-        # Resampleo con pandas
-        resampled = df.resample(VALID_INTERVALS[interval]).agg({
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum',
-            'number_of_trades': 'sum'
-        }).dropna()
-
-        resampled.reset_index(inplace=True)
-
-        # Ajuste de zona horaria manual: UTC-6
-        offset_seconds = -6 * 3600
-        resampled['ts_adjusted'] = resampled['ts'] + timedelta(seconds=offset_seconds)
-
-        response = [
-            {
-                "time": int(row['ts_adjusted'].timestamp()),
-                "open": float(row['open']),
-                "high": float(row['high']),
-                "low": float(row['low']),
-                "close": float(row['close']),
-                "volume": float(row['volume']),
-                "trades": int(row['number_of_trades'])
-            }
-            for _, row in resampled.iterrows()
-        ]
-
-        return response
+        body = candles_json(rows)
+        if key is not None:
+            try:
+                return _cached_response(request, *await store(async_redis_client, key, body, closed), headers)
+            except RedisError as e:
+                logger.warning(f"⚠️ No se pudo guardar en la caché de velas: {e}")
+        return Response(content=body, media_type="application/json", headers=headers)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener datos: {str(e)}")
 
-from routes.historical_data_binance import sync_recent_candles
-from fastapi import Request
-
 @router.get("/update-then-fetch/{symbol}/{interval}")
 async def update_then_fetch(symbol: str, interval: str, request: Request):
-    # 1. Actualiza desde Binance → PostgreSQL
-    await sync_recent_candles(symbol, interval)
-    sync_recent_candles_redis(symbol)
-    # 2. Luego carga desde la base de datos
-    return await get_historical_data(symbol, interval, before=request.query_params.get("before"))
+    # El servicio de frescura mantiene al día los símbolos activos: la respuesta
+    # sale de la base local sin esperar a Binance, con su retraso en la cabecera
+    touch_symbol(symbol)
+    stale = await staleness_secs(symbol)
+    if stale is None:
+        # Primera apertura sin datos locales: se espera la sincronización inicial
+        await refresh_symbol(symbol)
+    else:
+        report_gap(symbol, stale)
+    return await get_historical_data(request, symbol, interval, before=request.query_params.get("before"))
+
+
+@router.get("/historical-export/{symbol}")
+async def export_historical_data(
+    symbol: str,
+    start_time: int = Query(..., description="Inicio del rango en timestamp (ms, UTC)"),
+    end_time: int = Query(None, description="Fin del rango en timestamp (ms, UTC); por defecto ahora"),
+    interval: str = Query("1m", description="1m, 5m, 15m, 1h o 1d"),
+    format: str = Query("arrow", description="arrow (IPC stream) o parquet"),
+):
+    """
+    📦 Exportación masiva de velas como Arrow IPC o Parquet, en streaming desde
+    un cursor de servidor. En un notebook:
+        pyarrow.ipc.open_stream(resp.content).read_pandas()
+        pyarrow.parquet.read_table(io.BytesIO(resp.content)).to_pandas()
+    """
+    if not export_available():
+        raise HTTPException(status_code=501, detail="Exportación no disponible: falta el paquete pyarrow.")
+    if interval not in INTERVAL_MS:
+        raise HTTPException(status_code=400, detail="Intervalo no válido. Usa: 1m, 5m, 15m, 1h, 1d.")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato no válido. Usa: arrow, parquet.")
+    end_time = end_time if end_time is not None else int(time.time() * 1000)
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start_time debe ser menor que end_time.")
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{symbol.upper()}_{interval}_{start_time}_{end_time}.{extension}"
+    return StreamingResponse(
+        stream_export(symbol, interval, start_time, end_time, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.get("/operation-results/{symbol}")
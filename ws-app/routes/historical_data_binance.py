@@ -1,11 +1,9 @@
-import requests
-from datetime import datetime, timedelta,timezone
+import httpx
 from fastapi import APIRouter, HTTPException, Query
-from database import get_db_connection
+from services.kline_downloader import backfill
 
 router = APIRouter()
 
-BINANCE_API_URL = "https://api.binance.com/api/v3/klines"
 
 @router.get("/update-binance-data/")
 async def update_binance_data(
@@ -20,137 +18,23 @@ async def update_binance_data(
     if start_time >= end_time:
         raise HTTPException(status_code=400, detail="start_time debe ser menor que end_time.")
 
-    params = {
-        "symbol": symbol.upper(),
-        "interval": "1m",  # 🔥 Intervalo fijo de 1 minuto
-        "startTime": start_time,
-        "endTime": end_time,
-        "limit": 1000
-    }
-
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        values = []
-        while start_time < end_time:
-            response = requests.get(BINANCE_API_URL, params=params)
-            response.raise_for_status()
-            result = response.json()
-
-            if not result:
-                break
-
-            for item in result:
-                values.append({
-                    "open": float(item[1]),
-                    "high": float(item[2]),
-                    "low": float(item[3]),
-                    "close": float(item[4]),
-                    "timestamp": int(item[0]),
-                    "volume": float(item[5]),
-                    "number_of_trades": int(item[8]),
-                    "taker_buy_quote_asset_volume": float(item[10])
-                })
-
-            # 🔥 Avanzar al siguiente lote de datos
-            start_time = result[-1][0] + 60000  # Agregar 1 minuto
-            params["startTime"] = start_time
-
-        # 🔥 Insertar en PostgreSQL evitando duplicados
-        for kline in values:
-            cursor.execute("""
-                INSERT INTO candlesticks (symbol, open, high, low, close, volume, timestamp, number_of_trades, taker_buy_quote_asset_volume)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (symbol, timestamp) DO NOTHING;
-            """, (
-                symbol.upper(),
-                kline["open"],
-                kline["high"],
-                kline["low"],
-                kline["close"],
-                kline["volume"],
-                kline["timestamp"],
-                kline["number_of_trades"],
-                kline["taker_buy_quote_asset_volume"]
-            ))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # 🔥 Tramos de 1 minuto descargados en paralelo e insertados en lotes sin duplicados;
+        # repetir la petición reanuda desde los tramos ya confirmados
+        totals = await backfill([symbol], start_time, end_time)
 
         return {
             "symbol": symbol.upper(),
             "interval": "1m",
-            "total_inserted": len(values),
-            "message": "Datos de Binance insertados en la base de datos."
+            "total_downloaded": totals["downloaded"],
+            "total_inserted": totals["inserted"],
+            "skipped_chunks": totals["skipped"],
+            "failed_chunks": totals["failed"],
+            "message": "Datos de Binance insertados en la base de datos." if not totals["failed"]
+            else "Algunos tramos fallaron: repetir la petición para completarlos.",
         }
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener datos de Binance: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en la base de datos: {str(e)}")
-
-
-async def sync_recent_candles(symbol: str, interval: str = "1m"):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Definir rango desde ahora (UTC +6 horas) hacia atrás 24h
-    now_utc = datetime.now(timezone.utc)
-    end_time = int((now_utc + timedelta(hours=6)).timestamp() * 1000)
-    start_time = end_time - 24 * 60 * 60 * 1000  # 24 horas en milisegundos
-
-
-    params = {
-        "symbol": symbol.upper(),
-        "interval": interval,
-        "startTime": start_time,
-        "endTime": end_time,
-        "limit": 1000
-    }
-
-    values = []
-    while start_time < end_time:
-        response = requests.get("https://api.binance.com/api/v3/klines", params=params)
-        response.raise_for_status()
-        result = response.json()
-
-        if not result:
-            break
-
-        for item in result:
-            values.append({
-                "open": float(item[1]),
-                "high": float(item[2]),
-                "low": float(item[3]),
-                "close": float(item[4]),
-                "timestamp": int(item[0]),
-                "volume": float(item[5]),
-                "number_of_trades": int(item[8]),
-                "taker_buy_quote_asset_volume": float(item[10])
-            })
-
-        start_time = result[-1][0] + 60000
-        params["startTime"] = start_time
-
-    for kline in values:
-        cursor.execute("""
-            INSERT INTO candlesticks (symbol, open, high, low, close, volume, timestamp, number_of_trades, taker_buy_quote_asset_volume)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (symbol, timestamp) DO NOTHING;
-        """, (
-            symbol.upper(),
-            kline["open"],
-            kline["high"],
-            kline["low"],
-            kline["close"],
-            kline["volume"],
-            kline["timestamp"],
-            kline["number_of_trades"],
-            kline["taker_buy_quote_asset_volume"]
-        ))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
@@ -0,0 +1,42 @@
+from fastapi import APIRouter
+from utils.metrics import latency_summary, order_path_summary, thread_pool_stats
+from services.scheduler import scheduler
+from services.market_streams import stream_stats
+from services.order_book import estimate_fill, order_books
+from services.candle_cache import cache_summary
+from services.candle_sync import sync_stats
+from services.candle_freshness import freshness_summary
+from database import db_pool_stats
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """ 📊 Saturación del thread pool, latencias por llamada (ms), lag del scheduler, caché y sincronización de velas y pool de PostgreSQL """
+    return {
+        "thread_pool": thread_pool_stats(),
+        "latency": latency_summary(),
+        "scheduler": scheduler.stats(),
+        "candle_cache": cache_summary(),
+        "candle_sync": sync_stats,
+        "candle_freshness": freshness_summary(),
+        "db_pool": db_pool_stats(),
+    }
+
+
+@router.get("/metrics/order-path")
+async def get_order_path_metrics():
+    """ ⏱️ Latencia por etapa del camino de órdenes (ms), desde el tick hasta Telegram """
+    return order_path_summary()
+
+
+@router.get("/metrics/order-book/{symbol}")
+async def get_order_book(symbol: str, side: str = "SELL", quantity: float = 0):
+    """ 📚 Estado del libro L2 local y, con `quantity`, la estimación de ejecución """
+    book = order_books.get(symbol.upper())
+    return {
+        "book": book.summary() if book else None,
+        "estimate": estimate_fill(symbol, side.upper(), quantity) if quantity > 0 else None,
+        "streams": stream_stats(),
+    }
@@ -4,16 +4,18 @@ from decimal import Decimal, InvalidOperation, ROUND_DOWN
 import redis
 import os
 import json
-import asyncio
 from dotenv import load_dotenv
 from utils.auth_utils import verify_jwt_from_cookie
 from fastapi import APIRouter, Request, Depends, HTTPException
 from datetime import datetime
 from utils.auth_utils import verify_jwt_from_cookie
-from services.binance_api import place_market_order
+from services.order_dispatcher import position_intent, submit_buy, submit_sell
 from shared.socket_context import connected_users, sio
-from services.evaluator import evaluate_indicators, evaluation_tasks
+from services.binance_ws import scheduled_evaluation
+from services.positions import position_room, start_position_actor
 from utils.telegram_utils import send_telegram_message
+from utils.config_events import save_operation_config, save_operation_config_async
+from utils.redis_utils import async_redis_client
 
 
 load_dotenv()
@@ -68,9 +70,9 @@ def set_operation_config(config: OperationConfig, request: Request):
             "user_id": user_id,
         }
 
-        # Paso 3: Guarda en Redis
+        # Paso 3: Guarda en Redis y publica el cambio
         try:
-            redis_client.set(key, json.dumps(operation_data))
+            save_operation_config(redis_client, key, operation_data, previous_config or None, "operation-config")
         except redis.exceptions.RedisError as e:
             raise HTTPException(status_code=500, detail=f"Redis error (set): {str(e)}")
 
@@ -105,11 +107,12 @@ def stop_operation(config: StopConfig, request: Request):
             raise HTTPException(status_code=500, detail="Configuración corrupta en Redis")
 
 
+        previous = dict(data)
         data['status'] = False
         data['operate'] = False
 
         try:
-            redis_client.set(key, json.dumps(data))
+            save_operation_config(redis_client, key, data, previous, "stop-operation")
         except redis.exceptions.RedisError as e:
             raise HTTPException(status_code=500, detail=f"No se pudo guardar la configuración: {str(e)}")
 
@@ -118,7 +121,6 @@ def stop_operation(config: StopConfig, request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
 
-from services.binance_api import place_market_order, close_market_order
 
 
 
@@ -140,16 +142,19 @@ async def execute_buy_order(data: SymbolRequest, request: Request):
         # Si esto falla, el flujo se detiene aquí y no se gasta dinero
         key = f"{symbol}_operation_{user_id}"
         try:
-            redis_data = redis_client.get(key)
+            redis_data = await async_redis_client.get(key)
             if not redis_data:
                 raise HTTPException(status_code=404, detail="No hay configuración activa para este símbolo")
             config = json.loads(redis_data)
+            previous_config = dict(config)
         except redis.exceptions.RedisError as e:
             raise HTTPException(status_code=500, detail=f"Error de Redis: {str(e)}")
 
         # 3. EJECUTAR ORDEN EN BINANCE
         # Ahora estamos seguros de que tenemos dónde guardar el resultado
-        result = await place_market_order(symbol)
+        # Intención ligada a la versión de la config: un doble clic no compra dos veces
+        intent = await async_redis_client.get(f"{key}_version") or ""
+        result = await submit_buy(user_id, symbol, intent)
         
         if result.get("status") != "FILLED":
             raise HTTPException(status_code=400, detail="Orden no fue completada.")
@@ -186,8 +191,8 @@ async def execute_buy_order(data: SymbolRequest, request: Request):
         for field in ["entry_point", "take_profit", "stop_loss", "profit_progress"]:
             config[field] = "{:.4f}".format(float(config[field]))
 
-        # Guardar actualización en Redis
-        redis_client.set(key, json.dumps(config))
+        # Guardar actualización en Redis y publicar el cambio
+        await save_operation_config_async(key, config, previous_config, "buy-order")
 
         # 5. HISTÓRICO Y NOTIFICACIONES (Sin cambios en lógica)
         formatted_fills = [
@@ -216,7 +221,7 @@ async def execute_buy_order(data: SymbolRequest, request: Request):
         }
 
         score = int(datetime.utcnow().timestamp())
-        redis_client.zadd(result_key, {json.dumps(entry_result): score})
+        await async_redis_client.zadd(result_key, {json.dumps(entry_result): score})
         
         plain = (
             f"🟢 {symbol} compra manual ejecutada\n"
@@ -229,10 +234,13 @@ async def execute_buy_order(data: SymbolRequest, request: Request):
         send_telegram_message(plain)
 
         # 6. TAREAS ASÍNCRONAS
+        # Un único actor por (user_id, symbol); los sockets del usuario lo observan
         sid = next((s for s, u in connected_users.items() if u == user_id), None)
-        if sid and sid not in evaluation_tasks:
-            task = asyncio.create_task(evaluate_indicators(symbol, entry, sid, sio, user_id))
-            evaluation_tasks[sid] = task
+        if sid:
+            await start_position_actor(
+                user_id, symbol,
+                lambda: scheduled_evaluation(symbol, sio, user_id),
+            )
 
         return {"message": "✅ Orden ejecutada manualmente y configuración actualizada", "details": config}
 
@@ -258,7 +266,7 @@ async def execute_sell_order(data: SymbolRequest, request: Request):
             raise HTTPException(status_code=403, detail="Socket isnt connected to this user")
         
         key = f"{symbol}_operation_{user_id}"
-        config_str = redis_client.get(key)
+        config_str = await async_redis_client.get(key)
         if not config_str:
             raise HTTPException(status_code=404, detail=f"No existe configuración para {symbol}")
 
@@ -271,7 +279,7 @@ async def execute_sell_order(data: SymbolRequest, request: Request):
         config["status"]          = data.active_alerts
         config["operate"]         = data.active_operations
         
-        close_operation = await close_market_order(symbol)
+        close_operation = await submit_sell(user_id, symbol, position_intent(config))
         if close_operation.get('status') != "FILLED":
             raise HTTPException(status_code=400, detail="Order not completed")
         
@@ -279,7 +287,7 @@ async def execute_sell_order(data: SymbolRequest, request: Request):
         executed_qty = float(close_operation.get("executedQty"))
         cummulative_quote = float(close_operation.get("cummulativeQuoteQty"))
         exit_price = round(cummulative_quote / executed_qty, 4)
-        await _close_operation(symbol,exit_price,config, key, sid, sio, "CO", close_operation )
+        await _close_operation(symbol,exit_price,config, key, position_room(user_id, symbol), sio, "CO", close_operation, user_id)
         
     except HTTPException as e:
         raise e
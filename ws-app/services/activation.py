@@ -4,30 +4,58 @@ import json
 import logging
 from datetime import datetime
 from shared.socket_context import connected_users
+from shared.indicator_state import get_latest_indicators, set_latest_indicators
 import redis
-import os
-import asyncio # Aunque no se usa aquí, se mantiene si estaba importado
-from dotenv import load_dotenv
-from utils.telegram_utils import send_telegram_message 
-
-# Cargar configuración y conectar a Redis
-load_dotenv()
-REDIS_URL = os.getenv("REDIS_URL")
-redis_client = redis.StrictRedis.from_url(REDIS_URL, decode_responses=True)
+from utils.redis_utils import async_redis_client
+from utils.telegram_utils import queue_telegram_message
+from utils.metrics import finish_order_trace, mark_stage, start_order_trace, timed
+from utils.config_events import get_operation_config, save_operation_config_async
 
 logger = logging.getLogger("activation")
 
-# 🚨 AJUSTE: Función definida como SÍNCRONA.
-def check_activation(symbol: str, close_price: float, sid: str, sio):
-    user_id = connected_users.get(sid)
-    key = f"{symbol.upper()}_operation_{user_id}"
-    print('lala')
-    # — después de este bloque —
+
+async def load_latest_indicators(symbol: str):
+    """
+    Indicadores de la última vela. Se leen del estado en memoria; solo si el
+    proceso aún no ha cerrado ninguna vela (p.ej. tras reiniciar) se decodifica
+    una vez el último miembro del sorted set y se guarda en memoria.
+    """
+    indicators = get_latest_indicators(symbol)
+    if indicators is not None:
+        return indicators
+
+    raw = await async_redis_client.zrevrange(symbol, 0, 0)
+    if not raw:
+        return None
+    vela = json.loads(raw[0])
+    indicators = {
+        "rsi": vela.get("rsi"),
+        "ema10": vela.get("ema10"),
+        "ema50": vela.get("ema50"),
+        "ema150": vela.get("ema150"),
+        "close": vela.get("close"),
+    }
+    if None not in (indicators["rsi"], indicators["ema10"], indicators["ema50"], indicators["ema150"]):
+        set_latest_indicators(symbol, indicators)
+    return indicators
+
+
+# Corrutina nativa: Redis asíncrono y Telegram encolado, sin asyncio.to_thread
+async def check_activation(symbol: str, close_price: float, sid: str, sio, user_id=None):
+    async with timed("activation.check"):
+        return await _check_activation(symbol, close_price, sid, sio, user_id)
+
+
+async def _check_activation(symbol: str, close_price: float, sid: str, sio, user_id=None):
+    if user_id is None:
+        user_id = connected_users.get(sid)
+    symbol_upper = symbol.upper()
+    key = f"{symbol_upper}_operation_{user_id}"
+
     try:
-        config_json = redis_client.get(key)
-        if not config_json:
+        config = await get_operation_config(key)
+        if not config:
             return False
-        config = json.loads(config_json)
     except redis.exceptions.RedisError as e:
         logger.warning(f"[{sid}] Redis error (get {key}): {e}")
         return False
@@ -35,28 +63,24 @@ def check_activation(symbol: str, close_price: float, sid: str, sio):
     # 🔥 Si ya existe un objeto ‘binance’ en la config, detenemos aquí
     if config.get("binance"):
         logger.info(f"[{sid}] ⚡ Operación en curso: {config['binance']}")
-        print("operacion abierta sell/buy")
         return True
 
     if config.get("operate") is not True:
         return False
 
-    # — Obtener la última vela para leer indicadores
-    raw = redis_client.zrevrange(symbol.upper(), 0, 0)
-    if not raw:
+    # — Indicadores de la última vela (estado en memoria)
+    try:
+        vela = await load_latest_indicators(symbol_upper)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"[{sid}] Redis error (zrevrange {symbol_upper}): {e}")
+        return False
+    if not vela:
         return False
 
-    vela = json.loads(raw[0])
-    rsi = vela.get("rsi")
-    ema10 = vela.get("ema10")
-    ema50 = vela.get("ema50")
-    ema150 = vela.get("ema150")
-
-    if None in (rsi, ema10, ema50, ema150):
+    if None in (vela.get("rsi"), vela.get("ema10"), vela.get("ema50"), vela.get("ema150")):
         return False  # Indicadores aún no calculados
 
     try:
-        vela = json.loads(raw[0])
         rsi = round(float(vela.get("rsi")), 4)
         ema10 = round(float(vela.get("ema10")), 4)
         ema50 = round(float(vela.get("ema50")), 4)
@@ -65,52 +89,57 @@ def check_activation(symbol: str, close_price: float, sid: str, sio):
     except (TypeError, ValueError):
         return False # datos incompletos o mal formateados
 
-    
-    min_rsi_key = f"{symbol.upper()}_min_rsi_{user_id}"
-    print("lalalala")
+    min_rsi_key = f"{symbol_upper}_min_rsi_{user_id}"
     # Notificación si RSI cae a 20 o menos
     if rsi <= 20:
-        prev_min_rsi = redis_client.get(min_rsi_key)
-        if prev_min_rsi is None or rsi < float(prev_min_rsi):
-            redis_client.set(min_rsi_key, round(rsi, 4))
-            oversold_message = (
-                f"📉 🚨 RSI ALERTA: {symbol.upper()} en Sobreventa Extrema.\n"
-                f"   RSI actual: {round(rsi, 2)} (Nuevo mínimo o ≤ 20).\n"
-                f"   Precio de cierre: {close}.\n"
-                f"   ⚠️ ESTO ES UNA SEÑAL DE VENTA INTENSA, NO UNA SEÑAL DE COMPRA GARANTIZADA."
-            )
-            send_telegram_message(oversold_message)
-            logger.info(f"[{sid}] Alerta de RSI <= 20 enviada para {symbol.upper()}.")
+        try:
+            prev_min_rsi = await async_redis_client.get(min_rsi_key)
+            if prev_min_rsi is None or rsi < float(prev_min_rsi):
+                await async_redis_client.set(min_rsi_key, round(rsi, 4))
+                oversold_message = (
+                    f"📉 🚨 RSI ALERTA: {symbol_upper} en Sobreventa Extrema.\n"
+                    f"   RSI actual: {round(rsi, 2)} (Nuevo mínimo o ≤ 20).\n"
+                    f"   Precio de cierre: {close}.\n"
+                    f"   ⚠️ ESTO ES UNA SEÑAL DE VENTA INTENSA, NO UNA SEÑAL DE COMPRA GARANTIZADA."
+                )
+                queue_telegram_message(oversold_message)
+                logger.info(f"[{sid}] Alerta de RSI <= 20 enviada para {symbol_upper}.")
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"[{sid}] Redis error ({min_rsi_key}): {e}")
         return False  # no operamos aún
 
     # Condición base para operar
     if close < ema50:
         if (
             close < ema10 and
-            ema10 < ema50 
+            ema10 < ema50
             and ema10 > ema150
         ):
             # --- Intentar comprar en Binance ---
             buy_message = (
-                f"📈 SEÑAL DE COMPRA para {symbol.upper()}\n"
+                f"📈 SEÑAL DE COMPRA para {symbol_upper}\n"
                 f"✔️ Condición EMA Alcista Cumplida:\n"
                 f"   CLOSE ({close}) > EMA10 ({ema10})\n"
                 f"   EMA10 > EMA50 ({ema50}) > EMA150 ({ema150})\n"
                 f"   RSI Actual: {rsi}"
             )
-            send_telegram_message(buy_message)
-            logger.info(f"[{sid}] Señal de compra generada para {symbol.upper()}")
+            queue_telegram_message(buy_message)
+            logger.info(f"[{sid}] Señal de compra generada para {symbol_upper}")
+            previous_config = dict(config)
+            start_order_trace("buy", symbol_upper)
             try:
                 order_response = {}
                 # place_market_order(symbol)
                 if order_response.get("status") != "FILLED":
-                    logger.warning(f"[{sid}]  Orden no completada en Binance: {order_response}")
+                    finish_order_trace(record=False)
+                    logger.warning(f"[{sid}]  Orden no completada en Binance: {order_response}")
                     return False
 
                 # Calcular precio promedio de compra real desde los fills
                 fills = order_response.get("fills", [])
                 if not fills:
-                    logger.error(f"[{sid}]  Orden sin fills, no se puede continuar.")
+                    finish_order_trace(record=False)
+                    logger.error(f"[{sid}]  Orden sin fills, no se puede continuar.")
                     return False
 
                 executed_qty = float(order_response.get("executedQty"))
@@ -128,6 +157,7 @@ def check_activation(symbol: str, close_price: float, sid: str, sio):
                 }
 
             except Exception as e:
+                finish_order_trace(record=False)
                 logger.error(f"[{sid}] Error al ejecutar orden en Binance: {e}")
                 return False
 
@@ -136,40 +166,45 @@ def check_activation(symbol: str, close_price: float, sid: str, sio):
             config["take_profit"]     = round(entry * 1.005, 4)
             config["stop_loss"]       = round(entry * 0.997, 4)
             config["profit_progress"] = 0
-            config["activated_at"]    = datetime.timezone.utcnow().isoformat()
+            config["activated_at"]    = datetime.utcnow().isoformat()
 
             for field in ["entry_point", "take_profit", "stop_loss", "profit_progress"]:
                 config[field] = "{:.4f}".format(float(config[field]))
 
-            redis_client.set(key, json.dumps(config))
-            redis_client.delete(min_rsi_key)
-
-            result_key = f"{symbol.upper()}_results"
+            result_key = f"{symbol_upper}_results"
             entry_result = {
-                "symbol": symbol.upper(),
+                "symbol": symbol_upper,
                 "entry_point": entry,
                 "operation": "EP",
                 "activated_at": config.get("activated_at"),
                 "buy_order": config.get("binance"),
             }
-            score = int(datetime.timezone.utcnow().timestamp())
-            redis_client.zadd(result_key, {json.dumps(entry_result): score})
+            score = int(datetime.utcnow().timestamp())
+            await save_operation_config_async(key, config, previous_config, "activation")
+            async with async_redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(min_rsi_key)
+                pipe.zadd(result_key, {json.dumps(entry_result): score})
+                await pipe.execute()
+            mark_stage("persisted")
+
             buy_order = config["binance"]
             executed_qty = buy_order.get("executedQty")
             price = entry
             commission = buy_order.get("commission", 0)
 
             message = (
-                f"🚀 {symbol.upper()} operación ejecutada\n"
-                f"🛒 Cantidad comprada: {executed_qty} {symbol.upper()}\n"
+                f"🚀 {symbol_upper} operación ejecutada\n"
+                f"🛒 Cantidad comprada: {executed_qty} {symbol_upper}\n"
                 f"💰 Precio de entrada: {price} USDT\n"
                 f"💸 Comisión: {commission} (BNB)\n"
                 f"📊 TP: {config['take_profit']} / SL: {config['stop_loss']}\n"
                 f"⏱️ Hora: {config['activated_at']}"
             )
-            send_telegram_message(message)
+            queue_telegram_message(message)
+            mark_stage("telegram")
+            finish_order_trace()
             logger.info(
                 f"[{sid}] Activación — CLOSE {close} > EMA150 {ema150}, "
                 f"EMA10 {ema10} > EMA50 {ema50} y EMA10 > EMA150"
             )
-            return True
\ No newline at end of file
+            return True
@@ -5,6 +5,7 @@ import time
 import asyncio
 from shared.socket_context import connected_users
 from utils.telegram_utils import send_telegram_message
+from services.order_flow import flow_summary_text
 
 logger = logging.getLogger("alerts")
 
@@ -65,6 +66,7 @@ async def check_alerts(symbol: str, close_price: float, sid: str, sio, redis_cli
                 f"🚨 Alerta UP de {symbol.upper()}\n"
                 f"Precio actual: {close_price}\n"
                 f"Umbral UP:     {alert_up}\n"
+                f"{flow_summary_text(symbol)}\n"
                 f"Identificador: {prefix}"
             )
             logger.info(f"[{sid}] 🚨 Alert UP enviada ({close_price} ≥ {alert_up})")
@@ -77,6 +79,7 @@ async def check_alerts(symbol: str, close_price: float, sid: str, sio, redis_cli
                 f"🚨 Alerta DOWN de {symbol.upper()}\n"
                 f"Precio actual: {close_price}\n"
                 f"Umbral DOWN:   {alert_down}\n"
+                f"{flow_summary_text(symbol)}\n"
                 f"Identificador: {prefix}"
             )
             await sio.emit("alert_down_triggered", {"price": close_price}, to=sid)
@@ -0,0 +1,157 @@
+# services/balance_book.py
+#
+# Libro de balances en memoria. Se siembra una vez con /api/v3/account y
+# luego se mantiene al día con el user-data stream (listenKey + keepalive):
+#   • outboundAccountPosition → free/locked de los activos que cambiaron
+#   • balanceUpdate           → depósitos/retiros
+#   • executionReport         → última ejecución por símbolo
+# El dimensionado de órdenes lee de aquí; una reconciliación REST lenta
+# corrige cualquier deriva.
+
+import asyncio
+import json
+import logging
+import os
+import time
+from decimal import Decimal
+from typing import Dict
+
+import httpx
+import websockets
+
+from services.binance_auth import signed_request
+from services.binance_http import WS_BASE_URL, binance_request
+
+logger = logging.getLogger("binance_ws")
+
+USER_STREAM_URL = os.getenv("BINANCE_USER_STREAM_URL", f"{WS_BASE_URL}/ws")
+LISTEN_KEY_KEEPALIVE_SECS = 30 * 60
+BALANCE_RECONCILE_SECS = float(os.getenv("BALANCE_RECONCILE_SECS", 300))
+
+# ASSET → {"free": Decimal, "locked": Decimal, "updated": ms}
+balances: Dict[str, dict] = {}
+# SYMBOL → último executionReport recibido
+last_executions: Dict[str, dict] = {}
+_seeded = False
+
+
+def _set_balance(asset: str, free, locked, updated: int):
+    current = balances.get(asset)
+    # Nunca pisar un dato más nuevo (p.ej. evento del stream vs. snapshot REST)
+    if current is not None and current["updated"] > updated:
+        return
+    balances[asset] = {"free": Decimal(str(free)), "locked": Decimal(str(locked)), "updated": updated}
+
+
+def apply_account_snapshot(account: dict):
+    """Respuesta de /api/v3/account → libro."""
+    global _seeded
+    updated = int(account.get("updateTime", 0))
+    for item in account.get("balances", []):
+        _set_balance(item["asset"], item["free"], item["locked"], updated)
+    _seeded = True
+
+
+def apply_user_event(event: dict):
+    """Aplica un evento del user-data stream. Función pura sobre el libro (testeable)."""
+    kind = event.get("e")
+    if kind == "outboundAccountPosition":
+        updated = int(event.get("u", event.get("E", 0)))
+        for b in event.get("B", []):
+            _set_balance(b["a"], b["f"], b["l"], updated)
+    elif kind == "balanceUpdate":
+        asset = event["a"]
+        updated = int(event.get("T", event.get("E", 0)))
+        current = balances.get(asset, {"free": Decimal("0"), "locked": Decimal("0"), "updated": 0})
+        # Delta ya incluido en el snapshot (evento en cola durante la siembra): no sumarlo dos veces
+        if updated <= current["updated"]:
+            return
+        balances[asset] = {
+            "free": current["free"] + Decimal(event["d"]),
+            "locked": current["locked"],
+            "updated": updated,
+        }
+    elif kind == "executionReport":
+        last_executions[event["s"]] = {
+            "orderId": event.get("i"),
+            "clientOrderId": event.get("c"),
+            "side": event.get("S"),
+            "status": event.get("X"),
+            "executedQty": event.get("z"),
+            "cummulativeQuoteQty": event.get("Z"),
+            "transactTime": event.get("T"),
+        }
+
+
+async def seed_balances():
+    """Snapshot REST firmado de la cuenta (siembra y reconciliación)."""
+    response = await signed_request("GET", "/api/v3/account")
+    response.raise_for_status()
+    apply_account_snapshot(response.json())
+
+
+async def get_free_balance(asset: str) -> float:
+    """Balance libre desde memoria; si el libro aún no está sembrado, lo siembra."""
+    if not _seeded:
+        await seed_balances()
+    entry = balances.get(asset)
+    return float(entry["free"]) if entry else 0.0
+
+
+# ------------------------------------------------------------------
+# User-data stream
+# ------------------------------------------------------------------
+async def _create_listen_key() -> str:
+    response = await binance_request("POST", "/api/v3/userDataStream", signed=True)
+    response.raise_for_status()
+    return response.json()["listenKey"]
+
+
+async def _keepalive_listen_key(listen_key: str):
+    while True:
+        await asyncio.sleep(LISTEN_KEY_KEEPALIVE_SECS)
+        try:
+            response = await binance_request("PUT", "/api/v3/userDataStream", params={"listenKey": listen_key}, signed=True)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ Keepalive del listenKey falló: {e}")
+
+
+async def user_data_stream(stream_url: str = None):
+    """Tarea de fondo (lifespan): mantiene el libro al día con el user-data stream."""
+    stream_url = stream_url or USER_STREAM_URL
+    while True:
+        keepalive = None
+        try:
+            listen_key = await _create_listen_key()
+            async with websockets.connect(f"{stream_url}/{listen_key}") as ws:
+                keepalive = asyncio.create_task(_keepalive_listen_key(listen_key))
+                # Sembrar DESPUÉS de suscribirse: ningún cambio queda en el hueco
+                await seed_balances()
+                logger.info(f"✅ Libro de balances sembrado ({len(balances)} activos)")
+                async for raw in ws:
+                    event = json.loads(raw)
+                    if event.get("e") == "listenKeyExpired":
+                        logger.warning("⚠️ listenKey expirado, reconectando")
+                        break
+                    apply_user_event(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error en user-data stream: {e}")
+            await asyncio.sleep(5)
+        finally:
+            if keepalive:
+                keepalive.cancel()
+
+
+async def balance_reconciler():
+    """Reconciliación REST lenta para corregir cualquier deriva del libro."""
+    while True:
+        await asyncio.sleep(BALANCE_RECONCILE_SECS)
+        started = time.monotonic()
+        try:
+            await seed_balances()
+            logger.info(f"🔁 Balances reconciliados en {round((time.monotonic() - started) * 1000)} ms")
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ Reconciliación de balances falló: {e}")
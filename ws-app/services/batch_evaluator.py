@@ -0,0 +1,263 @@
+# services/batch_evaluator.py
+#
+# Evaluación vectorizada de la estrategia para TODOS los usuarios de un símbolo.
+# Replica exactamente las reglas de `check_activation` (services/activation.py)
+# y de `evaluate_indicators` (services/evaluator.py), pero en lugar de leer
+# Redis y evaluar usuario por usuario, mantiene las posiciones en arrays de
+# NumPy y calcula todas las decisiones en una sola pasada.
+
+import json
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger("binance_ws")
+
+# Flags por fila
+FLAG_OPERATE = 1   # config["operate"] is True
+FLAG_OPEN    = 2   # config["binance"] existe → operación abierta (buy/sell)
+
+_INITIAL_CAPACITY = 16
+
+
+class SymbolStrategyBook:
+    """
+    Posiciones abiertas y activaciones pendientes de un símbolo en arrays:
+    entry, TP, SL, TB, min_rsi y flags. Una fila por user_id.
+    """
+
+    def __init__(self, symbol: str, capacity: int = _INITIAL_CAPACITY):
+        self.symbol = symbol.upper()
+        self.size = 0
+        self.user_ids: List = []
+        self.rows: Dict = {}  # user_id → índice de fila
+        self.entry   = np.zeros(capacity, dtype=np.float64)
+        self.tp      = np.zeros(capacity, dtype=np.float64)
+        self.sl      = np.zeros(capacity, dtype=np.float64)
+        self.tb      = np.full(capacity, np.nan, dtype=np.float64)
+        self.min_rsi = np.full(capacity, np.nan, dtype=np.float64)
+        self.flags   = np.zeros(capacity, dtype=np.uint8)
+
+    # ------------------------------------------------------------------
+    # Mantenimiento de filas
+    # ------------------------------------------------------------------
+    def _grow(self):
+        capacity = len(self.entry) * 2
+        for name, fill in (("entry", 0.0), ("tp", 0.0), ("sl", 0.0),
+                           ("tb", np.nan), ("min_rsi", np.nan)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=np.float64)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        flags = np.zeros(capacity, dtype=np.uint8)
+        flags[:self.size] = self.flags[:self.size]
+        self.flags = flags
+
+    def upsert(self, user_id, config: dict, min_rsi=None) -> bool:
+        """
+        Carga (o actualiza) la fila del usuario a partir de su config de Redis.
+        Sin `min_rsi` una fila existente conserva su mínimo de RSI. Una config
+        que el camino escalar rechazaría (p.ej. stop_loss None) se registra en
+        el log y su fila se quita del libro; devuelve False.
+        """
+        # Mismo parseo que evaluate_indicators: ausente → 0, take_benefit ausente → NaN
+        try:
+            entry = float(config.get("entry_point", 0))
+            tp    = float(config.get("take_profit", 0))
+            sl    = float(config.get("stop_loss", 0))
+            tb    = config.get("take_benefit")
+            tb    = np.nan if tb is None else float(tb)
+            min_rsi = None if min_rsi is None else float(min_rsi)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Config inválida de {self.symbol}_operation_{user_id}, fuera del libro: {e}")
+            self.remove(user_id)
+            return False
+
+        row = self.rows.get(user_id)
+        if row is None:
+            if self.size == len(self.entry):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.rows[user_id] = row
+            self.user_ids.append(user_id)
+            self.min_rsi[row] = np.nan  # la fila puede reutilizar un hueco de remove()
+
+        self.entry[row] = entry
+        self.tp[row]    = tp
+        self.sl[row]    = sl
+        self.tb[row]    = tb
+        if min_rsi is not None:
+            self.min_rsi[row] = min_rsi
+
+        flags = 0
+        if config.get("operate") is True:
+            flags |= FLAG_OPERATE
+        if config.get("binance"):
+            flags |= FLAG_OPEN
+            # check_activation borra {SYMBOL}_min_rsi_{user_id} al abrir la operación
+            self.min_rsi[row] = np.nan
+        self.flags[row] = flags
+        return True
+
+    def remove(self, user_id):
+        """Elimina la fila moviendo la última a su hueco (O(1))."""
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved_user = self.user_ids[last]
+            for arr in (self.entry, self.tp, self.sl, self.tb, self.min_rsi, self.flags):
+                arr[row] = arr[last]
+            self.user_ids[row] = moved_user
+            self.rows[moved_user] = row
+        self.user_ids.pop()
+        self.size -= 1
+
+    def __len__(self):
+        return self.size
+
+    # ------------------------------------------------------------------
+    # Salidas (evaluate_indicators)
+    # ------------------------------------------------------------------
+    def evaluate_exits(self, close_price: float) -> List[dict]:
+        """
+        Devuelve solo las filas que requieren acción, en el mismo orden de
+        urgencia que evaluate_indicators: SL → TB → TP final / TP dinámico.
+        Cada acción: {"user_id", "action": SL|TB|TP|TRAIL, ...}. El libro no
+        cambia: el nuevo TP/TB de un TRAIL llega con el evento de cambio de la
+        config que guarda evaluate_indicators.
+        """
+        n = self.size
+        if n == 0:
+            return []
+
+        entry = self.entry[:n]
+        tp    = self.tp[:n]
+        sl    = self.sl[:n]
+        tb    = self.tb[:n]
+
+        with np.errstate(invalid="ignore"):
+            # `if stop_loss and close_price <= stop_loss` (0 y NaN no disparan)
+            hit_sl = (sl != 0) & ~np.isnan(sl) & (close_price <= sl)
+            # `if take_benefit is not None and close_price <= take_benefit`
+            hit_tb = ~hit_sl & ~np.isnan(tb) & (close_price <= tb)
+            # `if entry_point > 0 and close_price >= take_profit`
+            hit_tp = ~hit_sl & ~hit_tb & (entry > 0) & (close_price >= tp)
+
+        actions = []
+        for row in np.flatnonzero(hit_sl):
+            actions.append({"user_id": self.user_ids[row], "action": "SL", "price": close_price})
+        for row in np.flatnonzero(hit_tb):
+            actions.append({"user_id": self.user_ids[row], "action": "TB", "price": close_price})
+
+        # Pocas filas disparan TP; el redondeo final se hace con `round` de Python
+        # para producir exactamente los mismos valores que evaluate_indicators.
+        for row in np.flatnonzero(hit_tp):
+            entry_point = float(entry[row])
+            take_profit = float(tp[row])
+            profit_progress = round((close_price - entry_point) / entry_point, 4)
+            if profit_progress >= 2:
+                actions.append({"user_id": self.user_ids[row], "action": "TP", "price": close_price})
+                continue
+            new_tp = round(take_profit * 1.005, 4)
+            new_tb = round(take_profit * 0.996, 4)
+            actions.append({
+                "user_id": self.user_ids[row],
+                "action": "TRAIL",
+                "price": close_price,
+                "take_profit": new_tp,
+                "take_benefit": new_tb,
+            })
+        return actions
+
+    # ------------------------------------------------------------------
+    # Activación (check_activation)
+    # ------------------------------------------------------------------
+    def evaluate_activation(self, indicators: dict) -> List[dict]:
+        """
+        Indicadores de la última vela (rsi, ema10, ema50, ema150, close), comunes
+        a todos los usuarios del símbolo. Devuelve:
+          • RSI_ALERT para los usuarios con nuevo mínimo de RSI ≤ 20
+          • BUY para los usuarios cuya señal de compra se cumple
+        Las filas con operación abierta o sin `operate` se ignoran.
+        """
+        n = self.size
+        if n == 0:
+            return []
+
+        try:
+            rsi    = round(float(indicators.get("rsi")), 4)
+            ema10  = round(float(indicators.get("ema10")), 4)
+            ema50  = round(float(indicators.get("ema50")), 4)
+            ema150 = round(float(indicators.get("ema150")), 4)
+            close  = round(float(indicators.get("close")), 4)
+        except (TypeError, ValueError):
+            return []  # indicadores aún no calculados
+
+        flags = self.flags[:n]
+        pending = ((flags & FLAG_OPERATE) != 0) & ((flags & FLAG_OPEN) == 0)
+
+        actions = []
+        if rsi <= 20:
+            prev = self.min_rsi[:n]
+            with np.errstate(invalid="ignore"):
+                new_min = pending & (np.isnan(prev) | (rsi < prev))
+            rows = np.flatnonzero(new_min)
+            self.min_rsi[rows] = round(rsi, 4)
+            for row in rows:
+                actions.append({"user_id": self.user_ids[row], "action": "RSI_ALERT", "rsi": rsi, "close": close})
+            return actions  # no operamos aún
+
+        # La condición de compra depende solo de la vela → se evalúa una vez
+        if close < ema50 and close < ema10 and ema10 < ema50 and ema10 > ema150:
+            for row in np.flatnonzero(pending):
+                actions.append({
+                    "user_id": self.user_ids[row],
+                    "action": "BUY",
+                    "close": close,
+                    "rsi": rsi,
+                    "ema10": ema10,
+                    "ema50": ema50,
+                    "ema150": ema150,
+                })
+        return actions
+
+
+# Libro por símbolo: SYMBOL → SymbolStrategyBook
+strategy_books: Dict[str, SymbolStrategyBook] = {}
+
+
+def get_strategy_book(symbol: str) -> SymbolStrategyBook:
+    symbol = symbol.upper()
+    book = strategy_books.get(symbol)
+    if book is None:
+        book = strategy_books[symbol] = SymbolStrategyBook(symbol)
+    return book
+
+
+def load_strategy_book(symbol: str, redis_client) -> SymbolStrategyBook:
+    """
+    Reconstruye el libro del símbolo desde Redis con un SCAN + un MGET para
+    configs y mínimos de RSI (en vez de un GET por usuario y por tick).
+    """
+    symbol = symbol.upper()
+    prefix = f"{symbol}_operation_"
+    keys = [k for k in redis_client.scan_iter(match=f"{prefix}*", count=500)]
+    book = SymbolStrategyBook(symbol, capacity=max(_INITIAL_CAPACITY, len(keys)))
+    if keys:
+        user_ids = [k[len(prefix):] for k in keys]
+        min_rsi_keys = [f"{symbol}_min_rsi_{u}" for u in user_ids]
+        values = redis_client.mget(keys + min_rsi_keys)
+        configs, min_rsis = values[:len(keys)], values[len(keys):]
+        for user_id, raw, min_rsi in zip(user_ids, configs, min_rsis):
+            if not raw:
+                continue
+            try:
+                book.upsert(user_id, json.loads(raw), min_rsi)
+            except json.JSONDecodeError:
+                logger.warning(f"Config corrupta en Redis para {prefix}{user_id}")
+    strategy_books[symbol] = book
+    return book
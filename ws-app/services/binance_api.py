@@ -1,10 +1,18 @@
 import os
-import time
-import hmac
-import hashlib
-import requests
-from dotenv import load_dotenv
+from decimal import Decimal
 import httpx
+from dotenv import load_dotenv
+
+from services.balance_book import get_free_balance
+from services.binance_auth import get_signer
+from services.binance_auth import get_timestamp as _server_timestamp
+from services.binance_http import binance_request
+from services import order_transport
+from services.order_book import apply_slippage_policy
+from services.order_transport import OrderRejected, OrderStatusUnknown
+from services.symbol_rules import check_min_notional, format_decimal, get_symbol_rules, round_quantity
+from utils.redis_utils import async_redis_client
+from utils.metrics import mark_stage
 
 load_dotenv()
 
@@ -13,147 +21,147 @@ BINANCE_SECRET = os.getenv("BINANCE_SECRET")
 IS_DEV = os.getenv("ENV", "development").lower() != "production"
 PERCENTAGE_TO_USE = float(os.getenv("OPERATION_PERCENT", 5))  # Solo para producción
 
-BASE_URL = "https://api.binance.com"
-HEADERS = {
-    "X-MBX-APIKEY": BINANCE_API_KEY
-}
-
-import decimal, math
-
-def adjust_quantity(symbol: str, balance: float) -> float:
+async def adjust_quantity(symbol: str, balance: float) -> Decimal:
+    """Cantidad ajustada al LOT_SIZE con las reglas en caché (sin llamar a exchangeInfo)."""
     try:
-        url = f"{BASE_URL}/api/v3/exchangeInfo"
-        resp = requests.get(url, params={"symbol": symbol})
-        resp.raise_for_status()
-        data = resp.json()
-
-        for f in data["symbols"][0]["filters"]:
-            if f["filterType"] == "LOT_SIZE":
-                step_size = float(f["stepSize"])
-                precision = abs(decimal.Decimal(str(step_size)).as_tuple().exponent)
-                adjusted_qty = round(math.floor(balance / step_size) * step_size, precision)
-                print(f"✅ Cantidad ajustada para {symbol}: {adjusted_qty}")
-                return adjusted_qty
-
-        raise ValueError("No se encontró LOT_SIZE para el símbolo.")
+        rules = await get_symbol_rules(symbol)
+        adjusted_qty = round_quantity(rules, balance)
+        print(f"✅ Cantidad ajustada para {symbol}: {adjusted_qty}")
+        return adjusted_qty
 
     except Exception as e:
         print(f"❌ Error al ajustar quantity: {e}")
-        return 0.0
+        return Decimal("0")
 
 
 def get_timestamp():
-    return int(time.time() * 1000)
+    # Reloj del servidor de Binance (offset sincronizado en services/binance_auth.py)
+    return _server_timestamp()
 
 
 def sign_payload(payload: dict) -> dict:
     try:
-        query_string = "&".join([f"{k}={v}" for k, v in payload.items()])
-        signature = hmac.new(BINANCE_SECRET.encode(), query_string.encode(), hashlib.sha256).hexdigest()
-        payload["signature"] = signature
-        return payload
+        return get_signer().sign(payload)
     except Exception as e:
         print(f"❌ Error al firmar el payload: {e}")
         raise
 
 
-def get_balance(asset: str) -> float:
-    try:
-        url = f"{BASE_URL}/api/v3/account"
-        params = {
-            "timestamp": get_timestamp()
-        }
-        signed_params = sign_payload(params)
-
-        response = requests.get(url, headers=HEADERS, params=signed_params)
-        response.raise_for_status()
-
+def _order_failure(e: Exception, client_order_id=None) -> dict:
+    """
+    ERROR si Binance rechazó la orden; UNKNOWN si no sabemos si llegó a
+    ejecutarse (timeout, error de red o 5xx): entonces hay que consultarla,
+    nunca reenviarla.
+    """
+    unknown = isinstance(e, (httpx.TransportError, OrderStatusUnknown)) or (
+        isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500
+    )
+    result = {"status": "UNKNOWN" if unknown else "ERROR", "message": str(e), "clientOrderId": client_order_id}
+    if isinstance(e, OrderRejected):
+        result["code"] = e.code
+    elif isinstance(e, httpx.HTTPStatusError):
         try:
-            data = response.json()
+            body = e.response.json()
+            result["code"] = body.get("code")
+            result["message"] = body.get("msg", result["message"])
         except ValueError:
-            raise ValueError(f"❌ Error al decodificar respuesta JSON: {response.text}")
+            pass
+    return result
 
-        for item in data.get("balances", []):
-            if item["asset"] == asset:
-                balance = float(item["free"])
-                print(f"📊 Saldo detectado de {asset}: {balance}")
-                return balance
 
-        print(f" No se encontró {asset} en la cuenta.")
-        return 0.0
+def _accept_ioc_fill(data: dict, params: dict) -> dict:
+    """LIMIT IOC parcialmente ejecutada (EXPIRED con executedQty > 0) cuenta como ejecución."""
+    if params.get("timeInForce") == "IOC" and data.get("status") == "EXPIRED" and float(data.get("executedQty") or 0) > 0:
+        print(f"⚠️ IOC parcial: {data.get('executedQty')} de {data.get('origQty')}")
+        data["status"] = "FILLED"
+        data["partial"] = True
+    return data
+
+
+async def query_order(symbol: str, client_order_id: str) -> dict:
+    """Estado de una orden por su newClientOrderId (WS-API o GET /api/v3/order)."""
+    return await order_transport.query_order(symbol, client_order_id)
+
+
+async def get_balance(asset: str) -> float:
+    """Saldo libre desde el libro de balances en memoria (user-data stream)."""
+    try:
+        balance = await get_free_balance(asset)
+        print(f"📊 Saldo detectado de {asset}: {balance}")
+        return balance
 
     except Exception as e:
-        print(f"❌ Error al obtener balance de USDT: {e}")
+        print(f"❌ Error al obtener balance de {asset}: {e}")
         return 0.0
 
 
 
-async def place_market_order(symbol: str):
+async def place_market_order(symbol: str, client_order_id: str = None):
     try:
-        # Usamos un cliente asíncrono
-        async with httpx.AsyncClient() as client:
-            if IS_DEV:
-                quantity = 2 
-            else:
-                usdt_balance = get_balance("USDT") # Asegúrate que get_balance sea async o manéjala
-                print(f"📊 Saldo USDT detectado: {usdt_balance}")
-
-                if usdt_balance <= 1.0: # Mínimo de seguridad
-                    raise ValueError(f"Balance USDT insuficiente ({usdt_balance}).")
-
-                usdt_to_use = (PERCENTAGE_TO_USE / 100) * usdt_balance
-                print(f"➡️ Se usará: {usdt_to_use} USDT para comprar {symbol}")
-
-                # Obtener precio actual (Asíncrono)
-                price_url = f"{BASE_URL}/api/v3/ticker/price"
-                price_resp = await client.get(price_url, params={"symbol": symbol})
-                price_resp.raise_for_status()
-
-                price_data = price_resp.json()
-                current_price = float(price_data.get("price", 0))
-                
-                if current_price <= 0:
-                    raise ValueError("Precio inválido obtenido.")
-
-                raw_qty = usdt_to_use / current_price
-                quantity = adjust_quantity(symbol, raw_qty)
-
-            # Validar que la cantidad no sea 0 antes de enviar a Binance
-            if quantity <= 0:
-                raise ValueError(f"Cantidad calculada es 0. Saldo {usdt_balance} es muy bajo para {symbol}.")
-
-            url = f"{BASE_URL}/api/v3/order"
-            params = {
-                "symbol": symbol,
-                "side": "BUY",
-                "type": "MARKET",
-                "quantity": quantity,
-                "timestamp": get_timestamp()
-            }
-
-            signed_params = sign_payload(params)
+        # Cliente persistente compartido (services/binance_http.py)
+        if IS_DEV:
+            quantity = 2 
+        else:
+            usdt_balance = await get_balance("USDT")
+            print(f"📊 Saldo USDT detectado: {usdt_balance}")
+
+            if usdt_balance <= 1.0: # Mínimo de seguridad
+                raise ValueError(f"Balance USDT insuficiente ({usdt_balance}).")
+
+            usdt_to_use = (PERCENTAGE_TO_USE / 100) * usdt_balance
+            print(f"➡️ Se usará: {usdt_to_use} USDT para comprar {symbol}")
+
+            # Obtener precio actual (Asíncrono)
+            price_resp = await binance_request("GET", "/api/v3/ticker/price", params={"symbol": symbol})
+            price_resp.raise_for_status()
+
+            price_data = price_resp.json()
+            current_price = float(price_data.get("price", 0))
             
-            # Petición POST asíncrona
-            response = await client.post(url, headers=HEADERS, params=signed_params)
-            response.raise_for_status()
+            if current_price <= 0:
+                raise ValueError("Precio inválido obtenido.")
+
+            raw_qty = usdt_to_use / current_price
+            quantity = await adjust_quantity(symbol, raw_qty)
+
+            # Validación local de MIN_NOTIONAL antes de enviar la orden
+            if quantity > 0 and not check_min_notional(await get_symbol_rules(symbol), quantity, current_price):
+                raise ValueError(f"Orden por debajo de MIN_NOTIONAL: {quantity} x {current_price}")
+
+        # Validar que la cantidad no sea 0 antes de enviar a Binance
+        if quantity <= 0:
+            raise ValueError(f"Cantidad calculada es 0. Saldo {usdt_balance} es muy bajo para {symbol}.")
+        mark_stage("quantity")
+
+        params = {
+            "symbol": symbol,
+            "side": "BUY",
+            "type": "MARKET",
+            "quantity": format_decimal(quantity),
+        }
+        if client_order_id:
+            params["newClientOrderId"] = client_order_id
+
+        # Deslizamiento estimado con el libro L2 local (aviso o LIMIT IOC)
+        await apply_slippage_policy(params)
 
-            data = response.json()
+        # Orden firmada por el transporte configurado (WS-API persistente o REST)
+        data = await order_transport.place_order(params)
+        data = _accept_ioc_fill(data, params)
+        mark_stage("response")
 
-            if data.get("status") != "FILLED":
-                # Nota: Las MARKET orders a veces salen como 'EXPIRED' si no hay liquidez
-                raise ValueError(f"❌ Orden no completada: {data}")
+        if data.get("status") != "FILLED":
+            # Nota: Las MARKET orders a veces salen como 'EXPIRED' si no hay liquidez
+            raise ValueError(f"❌ Orden no completada: {data}")
 
-            print("✅ Orden ejecutada:", data)
-            return data
+        print("✅ Orden ejecutada:", data)
+        return data
 
     except Exception as e:
         print(f"❌ Error en place_market_order: {e}")
-        return {
-            "status": "ERROR",
-            "message": str(e)
-        }
+        return _order_failure(e, client_order_id)
 
-async def close_market_order(symbol: str):
+async def close_market_order(symbol: str, client_order_id: str = None):
     try:
         asset = symbol.replace("USDT", "")
         
@@ -161,32 +169,38 @@ async def close_market_order(symbol: str):
         if IS_DEV:
             quantity = 5  
         else:
-            # Si get_balance y adjust_quantity son síncronas, se quedan igual.
-            # Si fueran asíncronas, habría que agregar 'await'.
-            raw_balance = get_balance(asset)
-            quantity = adjust_quantity(symbol, raw_balance)
+            raw_balance = await get_balance(asset)
+            quantity = await adjust_quantity(symbol, raw_balance)
             
             if quantity <= 0:
                 msg = f"⚠️ No hay balance disponible de {asset} para vender."
                 print(msg)
                 return {"status": "ERROR", "message": msg}
 
-        url = f"{BASE_URL}/api/v3/order"
+            # Validación local de MIN_NOTIONAL con el último cierre conocido
+            last_close = await async_redis_client.get(f"{symbol}_last_close")
+            if last_close and not check_min_notional(await get_symbol_rules(symbol), quantity, last_close):
+                msg = f"⚠️ Venta de {quantity} {asset} por debajo de MIN_NOTIONAL."
+                print(msg)
+                return {"status": "ERROR", "message": msg}
+        mark_stage("quantity")
+
         params = {
             "symbol": symbol,
             "side": "SELL",
             "type": "MARKET",
-            "quantity": quantity,
-            "timestamp": get_timestamp()
+            "quantity": format_decimal(quantity),
         }
+        if client_order_id:
+            params["newClientOrderId"] = client_order_id
 
-        signed_params = sign_payload(params)
+        # Deslizamiento estimado con el libro L2 local (aviso o LIMIT IOC)
+        await apply_slippage_policy(params)
 
-        # Usamos httpx.AsyncClient para NO bloquear el flujo de los otros scripts
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=HEADERS, params=signed_params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
+        # Sesión/cliente persistente: sin handshake por orden
+        data = await order_transport.place_order(params)
+        data = _accept_ioc_fill(data, params)
+        mark_stage("response")
 
         # Validación de salida igual a la original
         if "status" not in data or data.get("status") != "FILLED":
@@ -196,8 +210,5 @@ async def close_market_order(symbol: str):
 
     except Exception as e:
         print(f"❌ Error en close_market_order: {e}")
-        # Retorno idéntico al original para no romper la lógica de 'evaluate_indicators'
-        return {
-            "status": "ERROR",
-            "message": str(e)
-        }
\ No newline at end of file
+        # Mismo formato {"status", "message"} que espera 'evaluate_indicators'
+        return _order_failure(e, client_order_id)
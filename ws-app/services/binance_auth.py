@@ -0,0 +1,151 @@
+# services/binance_auth.py
+#
+# Firma de peticiones y reloj sincronizado con Binance.
+#   • El offset contra /api/v3/time se mide al arrancar y periódicamente, y se
+#     aplica al `timestamp` de todas las peticiones firmadas (sin -1021 por deriva).
+#   • RequestSigner precalcula el estado HMAC de la clave: cada firma solo copia
+#     ese estado y procesa la query, codificada en una sola pasada.
+#   • signed_request() firma, envía y, ante un -1021, resincroniza y reintenta
+#     una vez (la orden rechazada por timestamp no se ejecutó).
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from urllib.parse import quote_plus
+
+import httpx
+from dotenv import load_dotenv
+
+from services.binance_http import binance_request
+from utils.metrics import mark_stage, observe_latency
+
+load_dotenv()
+
+logger = logging.getLogger("binance_ws")
+
+BINANCE_SECRET = os.getenv("BINANCE_SECRET")
+RECV_WINDOW_MS = int(os.getenv("BINANCE_RECV_WINDOW", 5000))
+TIME_SYNC_SECS = float(os.getenv("BINANCE_TIME_SYNC_SECS", 300))
+TIMESTAMP_ERROR_CODE = -1021
+
+# serverTime - reloj local (ms)
+_offset_ms = 0
+_signer = None
+
+
+# Caracteres que no necesitan escape en la query (los mismos que deja quote_plus)
+_SAFE_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.~")
+
+
+def encode_params(params: dict) -> str:
+    """Query en una sola pasada; solo escapa los valores que lo necesitan."""
+    parts = []
+    for key, value in params.items():
+        value = str(value)
+        if not _SAFE_CHARS.issuperset(value):
+            value = quote_plus(value)
+        parts.append(f"{key}={value}")
+    return "&".join(parts)
+
+
+class RequestSigner:
+    """
+    HMAC-SHA256 con el estado de la clave precalculado: los SHA-256 interno
+    (clave ^ ipad) y externo (clave ^ opad) ya han procesado el bloque de la
+    clave, así que cada firma solo copia esos estados y procesa la query.
+    """
+    __slots__ = ("_inner", "_outer")
+
+    def __init__(self, secret: str):
+        key = secret.encode()
+        if len(key) > 64:
+            key = hashlib.sha256(key).digest()
+        key = key.ljust(64, b"\0")
+        self._inner = hashlib.sha256(bytes(b ^ 0x36 for b in key))
+        self._outer = hashlib.sha256(bytes(b ^ 0x5C for b in key))
+
+    def signature(self, query: str) -> str:
+        inner = self._inner.copy()
+        inner.update(query.encode())
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.hexdigest()
+
+    def sign(self, params: dict) -> dict:
+        """Añade `signature` a `params` (misma codificación que envía httpx)."""
+        params["signature"] = self.signature(encode_params(params))
+        return params
+
+
+def get_signer() -> RequestSigner:
+    global _signer
+    if _signer is None:
+        if not BINANCE_SECRET:
+            raise ValueError("Falta BINANCE_SECRET en el .env")
+        _signer = RequestSigner(BINANCE_SECRET)
+    return _signer
+
+
+def get_timestamp() -> int:
+    """Milisegundos en el reloj del servidor de Binance (reloj local + offset)."""
+    return int(time.time() * 1000) + _offset_ms
+
+
+async def sync_time() -> int:
+    """Mide el offset contra /api/v3/time tomando el punto medio del round trip."""
+    global _offset_ms
+    sent = time.time()
+    response = await binance_request("GET", "/api/v3/time")
+    received = time.time()
+    response.raise_for_status()
+    server_time = response.json()["serverTime"]
+    _offset_ms = int(server_time - (sent + received) * 500)
+    observe_latency("binance.time_sync.rtt", received - sent)
+    return _offset_ms
+
+
+async def time_sync_loop():
+    """Tarea de fondo (lifespan): resincroniza el offset periódicamente."""
+    while True:
+        try:
+            offset = await sync_time()
+            logger.info(f"🕒 Offset con Binance: {offset} ms")
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ No se pudo sincronizar la hora con Binance: {e}")
+            await asyncio.sleep(30)
+            continue
+        await asyncio.sleep(TIME_SYNC_SECS)
+
+
+def _is_timestamp_error(response: httpx.Response) -> bool:
+    if response.status_code != 400:
+        return False
+    try:
+        return response.json().get("code") == TIMESTAMP_ERROR_CODE
+    except ValueError:
+        return False
+
+
+async def signed_request(method: str, path: str, params=None) -> httpx.Response:
+    """Petición firmada (timestamp + recvWindow + signature); reintenta una vez tras un -1021."""
+    signer = get_signer()
+
+    def signed_params() -> dict:
+        # Timestamp y firma nuevos en cada envío (también en los reintentos de red/5xx)
+        payload = dict(params or {})
+        payload["timestamp"] = get_timestamp()
+        payload.setdefault("recvWindow", RECV_WINDOW_MS)
+        signer.sign(payload)
+        mark_stage("signed")
+        mark_stage("http_sent")
+        return payload
+
+    for attempt in range(2):
+        response = await binance_request(method, path, params=signed_params, signed=True)
+        if attempt == 0 and _is_timestamp_error(response):
+            logger.warning(f"⚠️ Binance rechazó el timestamp ({path}), resincronizando reloj")
+            await sync_time()
+            continue
+        return response
@@ -0,0 +1,156 @@
+# services/binance_http.py
+#
+# Cliente HTTP asíncrono de larga vida para TODA la API REST de Binance
+# (órdenes, balance, exchangeInfo, ticker, klines). Se crea en el lifespan de
+# la app y mantiene las conexiones calientes: sin DNS/TCP/TLS por orden.
+
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("binance_ws")
+
+# URLs base configurables: apuntarlas a mock_exchange.py para pruebas locales
+BASE_URL = os.getenv("BINANCE_REST_URL", "https://api.binance.com").rstrip("/")
+WS_BASE_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443").rstrip("/")
+WS_API_URL = os.getenv("BINANCE_WS_API_URL", "wss://ws-api.binance.com:443/ws-api/v3")
+BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
+KEEPALIVE_SECS = float(os.getenv("BINANCE_KEEPALIVE_SECS", 30))
+
+# HTTP/2 solo si el paquete `h2` está instalado (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Timeout (s) y reintentos por endpoint. Las órdenes NO se reintentan: no son
+# idempotentes y reenviarlas podría duplicar la operación.
+ENDPOINT_POLICIES = {
+    "/api/v3/order":        {"timeout": 5.0,  "retries": 0},
+    "/api/v3/account":      {"timeout": 5.0,  "retries": 2},
+    "/api/v3/ticker/price": {"timeout": 2.0,  "retries": 2},
+    "/api/v3/exchangeInfo": {"timeout": 10.0, "retries": 3},
+    "/api/v3/klines":       {"timeout": 10.0, "retries": 3},
+    "/api/v3/ping":         {"timeout": 2.0,  "retries": 0},
+    "/api/v3/time":         {"timeout": 2.0,  "retries": 1},
+    "/api/v3/depth":        {"timeout": 5.0,  "retries": 2},
+    "/api/v3/userDataStream": {"timeout": 5.0, "retries": 2},
+}
+DEFAULT_POLICY = {"timeout": 10.0, "retries": 1}
+RETRY_STATUS = {500, 502, 503, 504}
+MAX_RETRY_AFTER_SECS = 5
+
+# Peso usado por la IP según Binance (cabecera X-MBX-USED-WEIGHT-1M de la última
+# respuesta, por minuto UTC) y bloqueo vigente tras un 429/418. Lo consultan los
+# procesos masivos (services/kline_downloader) para no agotar el límite.
+rate_state = {"used_weight_1m": 0, "minute": 0, "blocked_until": 0.0}
+# Sin Retry-After: un 418 (IP baneada) bloquea más que un 429
+DEFAULT_BLOCK_SECS = {429: 1, 418: 60}
+
+_client = None
+_keepalive_task = None
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=BASE_URL,
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=120),
+        timeout=DEFAULT_POLICY["timeout"],
+    )
+
+
+def get_binance_client() -> httpx.AsyncClient:
+    """Cliente compartido; se crea bajo demanda si se usa fuera del lifespan (scripts)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client()
+    return _client
+
+
+async def _keepalive_loop():
+    # Un ping barato mantiene viva la conexión entre órdenes
+    while True:
+        await asyncio.sleep(KEEPALIVE_SECS)
+        try:
+            await binance_request("GET", "/api/v3/ping")
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ Keepalive Binance falló: {e}")
+
+
+async def start_binance_client():
+    global _keepalive_task
+    client = get_binance_client()
+    # Abrir la primera conexión ya (handshake fuera del camino crítico)
+    try:
+        await binance_request("GET", "/api/v3/ping")
+    except httpx.HTTPError as e:
+        logger.warning(f"⚠️ No se pudo precalentar la conexión con Binance: {e}")
+    _keepalive_task = asyncio.create_task(_keepalive_loop())
+    logger.info(f"✅ Cliente Binance listo (HTTP/2: {HTTP2_AVAILABLE})")
+    return client
+
+
+async def close_binance_client():
+    global _client, _keepalive_task
+    if _keepalive_task:
+        _keepalive_task.cancel()
+        _keepalive_task = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _observe_rate_limit(response: httpx.Response):
+    used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+    if used is not None:
+        rate_state["used_weight_1m"] = int(used)
+        rate_state["minute"] = int(time.time() // 60)
+    if response.status_code in DEFAULT_BLOCK_SECS:
+        retry_after = int(response.headers.get("Retry-After", DEFAULT_BLOCK_SECS[response.status_code]))
+        rate_state["blocked_until"] = max(rate_state["blocked_until"], time.time() + retry_after)
+        logger.warning(f"⚠️ Binance respondió {response.status_code}: bloqueado {retry_after}s")
+
+
+async def binance_request(method: str, path: str, params=None, signed: bool = False) -> httpx.Response:
+    """
+    Petición REST con la política de su endpoint. Reintenta errores de red y
+    5xx con backoff exponencial (y 429 si Retry-After es corto). Devuelve la
+    respuesta sin lanzar: el llamador decide con raise_for_status().
+
+    `params` puede ser una función que construye los parámetros: se llama en
+    cada intento, así una petición firmada lleva timestamp y firma nuevos y no
+    caduca fuera de recvWindow (-1021) al reintentarla.
+    """
+    policy = ENDPOINT_POLICIES.get(path, DEFAULT_POLICY)
+    headers = {"X-MBX-APIKEY": BINANCE_API_KEY} if signed else None
+    client = get_binance_client()
+
+    attempt = 0
+    while True:
+        try:
+            payload = params() if callable(params) else params
+            response = await client.request(method, path, params=payload, headers=headers, timeout=policy["timeout"])
+        except httpx.TransportError:
+            if attempt >= policy["retries"]:
+                raise
+        else:
+            _observe_rate_limit(response)
+            if response.status_code == 429 and attempt < policy["retries"]:
+                retry_after = int(response.headers.get("Retry-After", 1))
+                if retry_after > MAX_RETRY_AFTER_SECS:
+                    return response
+                await asyncio.sleep(retry_after)
+                attempt += 1
+                continue
+            if response.status_code not in RETRY_STATUS or attempt >= policy["retries"]:
+                return response
+        await asyncio.sleep(0.2 * 2 ** attempt)
+        attempt += 1
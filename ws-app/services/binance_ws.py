@@ -9,9 +9,22 @@ from dotenv import load_dotenv
 
 from services.evaluator import evaluate_indicators
 from services.alerts import check_alerts
-from services.activation import check_activation
+from services.activation import check_activation, load_latest_indicators
 from services.processing import handle_kline_processing
-from utils.redis_utils import redis_client, evaluation_tasks
+from services.batch_evaluator import get_strategy_book, load_strategy_book, strategy_books
+from services.positions import (
+    attach_observer, begin_activation, end_activation, has_position_actor,
+    position_key, position_observers, position_room,
+    start_position_actor, stop_position_actor,
+)
+from services.scheduler import scheduler
+from services.binance_http import WS_BASE_URL
+from shared import socket_context
+from utils.config_events import config_change_handlers, get_operation_config, parse_operation_key
+from utils.metrics import mark_tick
+from services.candle_freshness import on_live_tick
+from services.order_flow import flow_snapshot, release_order_flow, start_order_flow
+from utils.redis_utils import redis_client, async_redis_client
 
 # Logger
 logger = logging.getLogger("binance_ws")
@@ -23,62 +36,222 @@ REDIS_URL = os.getenv("REDIS_URL")
 
 # Almacena las tareas activas por cliente
 client_tasks = {}
+# SYMBOL → tiempo de evento (E, ms) del último tick con pasada de activación
+_activation_passes = {}
 
 
-# Evaluación periódica cada 10 segundos
-async def scheduled_evaluation(symbol: str, sid: str, sio,user_id):
+EVALUATION_PERIOD_SECS = float(os.getenv("EVALUATION_PERIOD_SECS", 10))
 
-    print('kaka')
+
+# Evaluación periódica cada 10 segundos (un único actor por usuario y símbolo).
+# El trabajo periódico lo ejecuta el scheduler central en lotes; el actor solo
+# registra su job y espera a que la posición deje de operar.
+async def scheduled_evaluation(symbol: str, sio, user_id):
+    symbol_upper = symbol.upper()
+    job_id = f"evaluation:{symbol_upper}:{user_id}"
+    finished = asyncio.Event()
+    scheduler.schedule(job_id, "evaluation", EVALUATION_PERIOD_SECS, {
+        "symbol": symbol_upper,
+        "user_id": user_id,
+        "sio": sio,
+        # Los eventos van al room de la posición: todas las pestañas del usuario
+        "sid": position_room(user_id, symbol_upper),
+        "finished": finished,
+    })
     try:
-        while True:
-            
-            key = f"{symbol.upper()}_operation_{user_id}"
-            #print(key)
-            # Leer SIEMPRE de Redis
-            try:
-                config_json = redis_client.get(key)
-                if not config_json:
-                    
-                    await asyncio.sleep(10)
-                    continue
-                config = json.loads(config_json)
-            except redis.exceptions.RedisError as e:
-                logger.warning(f"[{sid}] Redis error (get {key}): {e}")
-                await asyncio.sleep(10)
-                continue
-            if not config.get("operate", False):
-                break   # termina el bucle y la tarea
+        await finished.wait()
+    finally:
+        scheduler.cancel(job_id)
+
+
+async def _evaluate_job(job: dict, config, last_close_str, exit_due: bool):
+    payload = job["payload"]
+    symbol, user_id, sid = payload["symbol"], payload["user_id"], payload["sid"]
+    try:
+        if not config:
+            return  # se reintenta en el siguiente periodo
+        if not config.get("operate", False):
+            payload["finished"].set()   # termina el job y el actor
+            return
+
+        # Solo las posiciones que devolvió la pasada vectorizada de salidas
+        if exit_due and last_close_str is not None:
             try:
-                last_close_str = redis_client.get(f"{symbol.upper()}_last_close")
-            except redis.exceptions.RedisError as e:
-                logger.warning(f"[{sid}] Redis error (get last_close): {e}")
-                last_close_str = None
-            
-            
-            if last_close_str is not None:
-                try:
-                    close_price = float(last_close_str)
-                    await evaluate_indicators(symbol.upper(), close_price, sid, sio,user_id)
-                except Exception as e:
-                    logger.error(f"[{sid}] ❗ Error convirtiendo last_close_str a float: {e}")
-
-            await asyncio.sleep(10)
+                close_price = float(last_close_str)
+                await evaluate_indicators(symbol, close_price, sid, payload["sio"], user_id, config=config)
+            except Exception as e:
+                logger.error(f"[{sid}] ❗ Error convirtiendo last_close_str a float: {e}")
     except Exception as e:
         logger.error(f"❌ Error en scheduled_evaluation [{sid}]: {e}")
+        payload["finished"].set()
+
+
+async def _evaluate_due_positions(jobs):
+    """
+    Lote de posiciones vencidas en el mismo tick: last_close de todos los
+    símbolos con un único pipeline de Redis; las configs salen de la caché
+    alimentada por los eventos de cambio. Las salidas (SL/TB/TP) se calculan
+    en una pasada vectorizada por símbolo y evaluate_indicators solo corre
+    para las posiciones que la requieren.
+    """
+    symbols = sorted({job["payload"]["symbol"] for job in jobs})
+    keys = [f"{job['payload']['symbol']}_operation_{job['payload']['user_id']}" for job in jobs]
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for symbol in symbols:
+                pipe.get(f"{symbol}_last_close")
+            last_closes = dict(zip(symbols, await pipe.execute()))
+        configs = await asyncio.gather(*(get_operation_config(key) for key in keys))
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Redis error (pipeline de evaluación, {len(jobs)} posiciones): {e}")
+        return
+
+    # Las filas de las posiciones vencidas se refrescan con la config ya leída:
+    # el libro no depende de no haber perdido ningún evento de cambio
+    for job, config in zip(jobs, configs):
+        if config:
+            get_strategy_book(job["payload"]["symbol"]).upsert(str(job["payload"]["user_id"]), config)
+
+    exits = set()
+    for symbol in symbols:
+        try:
+            close_price = float(last_closes[symbol])
+        except (TypeError, ValueError):
+            continue
+        exits.update((symbol, action["user_id"]) for action in get_strategy_book(symbol).evaluate_exits(close_price))
+
+    await asyncio.gather(*(
+        _evaluate_job(job, config, last_closes[job["payload"]["symbol"]],
+                      (job["payload"]["symbol"], str(job["payload"]["user_id"])) in exits)
+        for job, config in zip(jobs, configs)
+    ))
+
+
+scheduler.register_group("evaluation", _evaluate_due_positions)
+
+
+async def _activate_position(symbol: str, sio, user_id, close_price: float):
+    """check_activation de una posición observada; si se activa arranca su actor."""
+    if not position_observers.get(position_key(user_id, symbol)) or not begin_activation(user_id, symbol):
+        return
+    try:
+        activated = await check_activation(symbol, close_price, position_room(user_id, symbol), sio, user_id)
+        if activated:
+            await start_position_actor(
+                user_id, symbol,
+                lambda: scheduled_evaluation(symbol, sio, user_id),
+            )
+    finally:
+        end_activation(user_id, symbol)
+
+
+async def run_activation_pass(symbol: str, sio):
+    """
+    Pasada vectorizada de activación del símbolo con los últimos indicadores:
+    check_activation solo corre para los usuarios que devuelve el libro
+    (nuevo mínimo de RSI o señal de compra).
+    """
+    book = strategy_books.get(symbol)
+    if not book:
+        return
+    try:
+        indicators = await load_latest_indicators(symbol)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Redis error (indicadores de {symbol}): {e}")
+        return
+    if not indicators:
+        return
+    actions = book.evaluate_activation(indicators)
+    users = dict.fromkeys(action["user_id"] for action in actions)
+    if users:
+        close_price = actions[0]["close"]
+        await asyncio.gather(*(_activate_position(symbol, sio, user_id, close_price) for user_id in users))
+
+
+async def _activation_tick(symbol: str, event_ms, sio):
+    """Una pasada de activación por tick y símbolo, aunque varios streams reciban el mismo tick."""
+    if event_ms is not None and _activation_passes.get(symbol) == event_ms:
+        return
+    _activation_passes[symbol] = event_ms
+    await run_activation_pass(symbol, sio)
+
+
+async def _on_config_change(key: str, config, event: dict):
+    """Reacciona a los cambios publicados por las rutas / evaluador."""
+    symbol, user_id = parse_operation_key(key)
+
+    # Actualizar el libro vectorizado del símbolo, si existe (conserva el mínimo de RSI)
+    book = strategy_books.get(symbol)
+    if book is not None:
+        if config is None:
+            book.remove(user_id)
+        else:
+            book.upsert(user_id, config)
+
+    if "operate" not in event["changed"] and config is not None:
+        return
+
+    # `operate` pasó a False (o se borró la config) → detener la evaluación ya
+    if not config or not config.get("operate"):
+        if has_position_actor(user_id, symbol):
+            logger.info(f"🛑 operate=False para {key}, deteniendo evaluación")
+            stop_position_actor(user_id, symbol)
+        return
+
+    # `operate` pasó a True con una posición abierta y alguien observándola
+    if config.get("entry_point") and position_observers.get(position_key(user_id, symbol)):
+        await start_position_actor(
+            user_id, symbol,
+            lambda: scheduled_evaluation(symbol, socket_context.sio, user_id),
+        )
+    # Sin posición abierta: comprobar la activación ya, sin esperar a la próxima vela
+    elif not has_position_actor(user_id, symbol):
+        try:
+            indicators = await load_latest_indicators(symbol)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis error (indicadores de {symbol}): {e}")
+            return
+        if indicators and indicators.get("close") is not None:
+            await _activate_position(symbol, socket_context.sio, user_id, float(indicators["close"]))
+
+
+config_change_handlers.append(_on_config_change)
 
 
 # WebSocket principal
 async def binance_stream(symbol: str, interval: str, sio, sid: str, user_id: int):
     
-    binance_url = f"wss://stream.binance.com:9443/ws/{symbol.lower()}@kline_{interval}"
+    binance_url = f"{WS_BASE_URL}/ws/{symbol.lower()}@kline_{interval}"
+    # El socket observa la posición (user_id, symbol) sin ser su dueño
+    await attach_observer(sid, user_id, symbol)
+    # Libro vectorizado del símbolo (un SCAN + MGET) y primera pasada de activación
+    symbol_upper = symbol.upper()
+    try:
+        if symbol_upper not in strategy_books:
+            await asyncio.to_thread(load_strategy_book, symbol_upper, redis_client)
+        await run_activation_pass(symbol_upper, sio)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"[{sid}] Redis error (libro de {symbol_upper}): {e}")
+    # Order flow en vivo (aggTrade) mientras haya algún stream del símbolo
+    start_order_flow(symbol)
+    try:
+        await _binance_stream_loop(symbol, sio, sid, user_id, binance_url)
+    finally:
+        release_order_flow(symbol)
+
+
+async def _binance_stream_loop(symbol: str, sio, sid: str, user_id: int, binance_url: str):
     while True:
         logger.info(f"📡 [{sid}] Conectando a Binance WS: {binance_url}")
         try:
             async with websockets.connect(binance_url) as ws:
                 while True:
                     raw_data = await ws.recv()
-                    data = json.loads(raw_data)
                     symbol_upper = symbol.upper()
+                    mark_tick(symbol_upper)
+                    data = json.loads(raw_data)
+                    # Minuto nuevo en el stream → sincronizar la vela de 1m recién cerrada
+                    on_live_tick(symbol_upper, data.get("E"))
                     backup_key = f"{symbol_upper}_last_failed_kline"
 
                     # 1. Recuperar Backup (Rápido)
@@ -112,35 +285,52 @@ async def binance_stream(symbol: str, interval: str, sio, sid: str, user_id: int
                             
                         key = f"{symbol_upper}_operation_{user_id}"
 
-                        # 3. Leer Configuración (Rápido)
+                        # 3. Leer Configuración desde la caché local, que se mantiene
+                        # al día con los eventos de cambio (sin GET por tick)
                         try:
-                            raw = redis_client.get(key)
+                            config = await get_operation_config(key)
                         except redis.exceptions.RedisError as e:
                             logger.warning(f"[{sid}] Redis error (get {key}): {e}")
                             continue
 
-                        if not raw:
+                        if not config:
                             logger.warning(f"[{sid}] Configuración no encontrada en Redis")
                             continue
 
-                        config = json.loads(raw)
-
                         # 4. Evaluaciones en tiempo real (Rápido)
                         if config.get("status") is True:
                             await check_alerts(symbol_upper, close_price, sid, sio, redis_client, config)
 
-                        # 5. Iniciar Tarea de Evaluación Periódica (si aplica)
-                        if config.get("operate") is True and sid not in evaluation_tasks:
-                            activated = await asyncio.to_thread(check_activation, symbol.upper(), close_price, sid, sio)
-                            if activated:
-                                task = asyncio.create_task(scheduled_evaluation(symbol.upper(), sid, sio, user_id))
-                                evaluation_tasks[sid] = task
+                        # 5. Activación en cada tick, como antes: una pasada vectorizada
+                        # del libro del símbolo para todos sus usuarios; check_activation
+                        # solo corre para las filas que devuelve.
+                        await _activation_tick(symbol_upper, data.get("E"), sio)
+
+                        # Retomar la evaluación periódica de una operación ya abierta
+                        # (p.ej. tras reiniciar). Una sola activación y un solo actor por
+                        # (user_id, symbol), aunque varias pestañas reciban el mismo tick.
+                        if (
+                            config.get("operate") is True
+                            and config.get("binance")
+                            and not has_position_actor(user_id, symbol_upper)
+                            and begin_activation(user_id, symbol_upper)
+                        ):
+                            try:
+                                await start_position_actor(
+                                    user_id, symbol_upper,
+                                    lambda: scheduled_evaluation(symbol_upper, sio, user_id),
+                                )
+                            finally:
+                                end_activation(user_id, symbol_upper)
                         # 6. Delegar Procesamiento Pesado de Vela Cerrada
                         # Si la vela está cerrada ('x': True), iniciamos la tarea separada.
                         if kline['x']: 
                             asyncio.create_task(
                                 handle_kline_processing(symbol, sid, user_id, data, config, sio)
                             )
+                            flow = flow_snapshot(symbol_upper)
+                            if flow:
+                                await sio.emit("order_flow", flow, to=sid)
                             # El bucle del stream regresa INMEDIATAMENTE a 'await ws.recv()'
                             # sin esperar a que terminen los cálculos de RSI/Alertas.
 
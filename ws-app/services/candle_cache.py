@@ -0,0 +1,130 @@
+# services/candle_cache.py
+#
+# Caché de respuestas de /historical-data por (symbol, interval, before, limit):
+# LRU acotado en el proceso + Redis compartido, con ETag para responder 304.
+#
+# Invalidación por símbolo con dos contadores en Redis:
+#   • candles_watermark:{SYMBOL} → fin (ms) de la última vela de 1m persistida.
+#     Un rango cuyo último bar termina antes del watermark está cerrado: no
+#     cambia nunca y su clave no depende del watermark. El rango que contiene
+#     la vela abierta lleva el watermark en la clave, así que queda invalidado
+#     en cuanto se persiste una vela nueva.
+#   • candles_epoch:{SYMBOL} → se incrementa cuando se insertan velas por
+#     detrás del watermark (backfill); invalida también los rangos cerrados.
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from services.candles import INTERVAL_MS
+
+CANDLE_CACHE_SIZE = int(os.getenv("CANDLE_CACHE_SIZE", 512))
+# Rangos abiertos: TTL corto (la clave cambia igualmente con cada vela nueva)
+CANDLE_CACHE_OPEN_TTL_SECS = int(os.getenv("CANDLE_CACHE_OPEN_TTL_SECS", 120))
+# Rangos cerrados: 0 = sin expiración
+CANDLE_CACHE_CLOSED_TTL_SECS = int(os.getenv("CANDLE_CACHE_CLOSED_TTL_SECS", 0))
+
+MINUTE_MS = INTERVAL_MS["1m"]
+
+# clave → (etag, cuerpo JSON)
+_lru: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+cache_stats = {"lru_hits": 0, "redis_hits": 0, "misses": 0, "not_modified": 0}
+
+
+def _watermark_key(symbol: str) -> str:
+    return f"candles_watermark:{symbol.upper()}"
+
+
+def _epoch_key(symbol: str) -> str:
+    return f"candles_epoch:{symbol.upper()}"
+
+
+def mark_candles_persisted(redis_client, symbol: str, first_ts: int, last_ts: int):
+    """
+    Llamar tras confirmar (commit) velas de 1m en [first_ts, last_ts]: avanza
+    el watermark y, si el lote cae detrás de él, invalida los rangos cerrados.
+    """
+    watermark = redis_client.get(_watermark_key(symbol))
+    if watermark is not None and int(first_ts) < int(watermark):
+        redis_client.incr(_epoch_key(symbol))
+    if watermark is None or int(last_ts) + MINUTE_MS > int(watermark):
+        redis_client.set(_watermark_key(symbol), int(last_ts) + MINUTE_MS)
+
+
+async def mark_candles_persisted_async(async_redis, symbol: str, first_ts: int, last_ts: int):
+    """mark_candles_persisted con el cliente asíncrono de Redis."""
+    watermark = await async_redis.get(_watermark_key(symbol))
+    if watermark is not None and int(first_ts) < int(watermark):
+        await async_redis.incr(_epoch_key(symbol))
+    if watermark is None or int(last_ts) + MINUTE_MS > int(watermark):
+        await async_redis.set(_watermark_key(symbol), int(last_ts) + MINUTE_MS)
+
+
+async def last_persisted_ts(async_redis, symbol: str) -> Optional[int]:
+    """Apertura (ms) de la última vela de 1m persistida según el watermark; None si no hay watermark."""
+    watermark = await async_redis.get(_watermark_key(symbol))
+    return int(watermark) - MINUTE_MS if watermark is not None else None
+
+
+async def cache_key(async_redis, symbol: str, interval: str, before_ms: Optional[int], limit: int) -> Tuple[str, bool]:
+    """(clave, cerrado) de la consulta según el watermark/epoch actuales del símbolo."""
+    symbol = symbol.upper()
+    watermark, epoch = await async_redis.mget(_watermark_key(symbol), _epoch_key(symbol))
+    bucket = INTERVAL_MS[interval]
+    closed = False
+    if before_ms is not None and watermark is not None:
+        # Último bar devuelto: el bucket que contiene before_ms - 1
+        last_bar_end = ((before_ms - 1) // bucket + 1) * bucket
+        closed = last_bar_end <= int(watermark)
+    key = f"candles:{symbol}:{interval}:{before_ms}:{limit}:{epoch or 0}"
+    if not closed:
+        key += f":{watermark or 0}"
+    return key, closed
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _remember(key: str, entry: Tuple[str, bytes]):
+    _lru[key] = entry
+    _lru.move_to_end(key)
+    while len(_lru) > CANDLE_CACHE_SIZE:
+        _lru.popitem(last=False)
+
+
+async def get_cached(async_redis, key: str) -> Optional[Tuple[str, bytes]]:
+    entry = _lru.get(key)
+    if entry is not None:
+        _lru.move_to_end(key)
+        cache_stats["lru_hits"] += 1
+        return entry
+    raw = await async_redis.get(key)
+    if raw is None:
+        cache_stats["misses"] += 1
+        return None
+    body = raw.encode() if isinstance(raw, str) else raw
+    entry = (make_etag(body), body)
+    _remember(key, entry)
+    cache_stats["redis_hits"] += 1
+    return entry
+
+
+async def store(async_redis, key: str, body: bytes, closed: bool) -> Tuple[str, bytes]:
+    entry = (make_etag(body), body)
+    _remember(key, entry)
+    ttl = CANDLE_CACHE_CLOSED_TTL_SECS if closed else CANDLE_CACHE_OPEN_TTL_SECS
+    await async_redis.set(key, body, ex=ttl or None)
+    return entry
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cache_summary() -> dict:
+    return {**cache_stats, "lru_entries": len(_lru), "lru_size": CANDLE_CACHE_SIZE}
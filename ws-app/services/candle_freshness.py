@@ -0,0 +1,132 @@
+# services/candle_freshness.py
+#
+# Servicio de frescura de velas: mantiene sincronizadas con Binance (velas de
+# 1m en PostgreSQL + precarga de Redis) las velas de los símbolos activos, fuera
+# del camino de las peticiones de la gráfica. Símbolos activos:
+#   • con una gráfica abierta (observadores de posición del stream en vivo),
+#   • con un actor de posición o en TRADED_SYMBOLS (operados),
+#   • pedidos por /update-then-fetch en los últimos FRESHNESS_IDLE_SECS.
+#
+# La cadencia la marcan el stream en vivo y los huecos, no las peticiones:
+#   • el primer tick de un minuto nuevo en el stream de un símbolo indica que
+#     la vela de 1m anterior cerró → se sincroniza ese símbolo,
+#   • cada FRESHNESS_SWEEP_SECS se revisan todos los símbolos activos (los que
+#     ya están al día no hacen ninguna petición a Binance, ver candle_sync),
+#   • una petición que encuentra un hueco lo encola sin esperarlo.
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Set
+
+from services.candle_sync import MINUTE_MS, last_stored_ts, sync_recent_candles
+from services.positions import position_observers, position_tasks
+from services.symbol_rules import TRADED_SYMBOLS
+from utils.redis_utils import sync_recent_candles_redis
+
+logger = logging.getLogger("binance_ws")
+
+FRESHNESS_SWEEP_SECS = float(os.getenv("FRESHNESS_SWEEP_SECS", 60))
+# Un símbolo pedido por la gráfica sigue activo este tiempo tras la última petición
+FRESHNESS_IDLE_SECS = float(os.getenv("FRESHNESS_IDLE_SECS", 900))
+FRESHNESS_CONCURRENCY = int(os.getenv("FRESHNESS_CONCURRENCY", 4))
+
+# SYMBOL → instante (monotonic) de la última petición de la gráfica
+_requested: Dict[str, float] = {}
+# SYMBOL → minuto (ms // 60000) del último tick del stream en vivo
+_live_minute: Dict[str, int] = {}
+# Símbolos pendientes de sincronizar
+_pending: Set[str] = set()
+_wakeup = asyncio.Event()
+freshness_stats = {"stream_triggers": 0, "gap_triggers": 0, "sweeps": 0, "refreshes": 0, "errors": 0}
+
+
+def active_symbols() -> Set[str]:
+    now = time.monotonic()
+    for symbol, seen in list(_requested.items()):
+        if now - seen > FRESHNESS_IDLE_SECS:
+            del _requested[symbol]
+    return ({symbol for _, symbol in position_observers} | {symbol for _, symbol in position_tasks}
+            | set(TRADED_SYMBOLS) | set(_requested))
+
+
+def request_sync(symbol: str):
+    """Encola `symbol` para la próxima pasada del servicio (sin esperar)."""
+    _pending.add(symbol.upper())
+    _wakeup.set()
+
+
+def on_live_tick(symbol: str, event_ms: Optional[int]):
+    """Stream en vivo: al pasar a un minuto nuevo, la vela de 1m anterior ya está cerrada."""
+    if event_ms is None:
+        return
+    minute = event_ms // MINUTE_MS
+    previous = _live_minute.get(symbol)
+    _live_minute[symbol] = minute
+    if previous is not None and minute > previous:
+        freshness_stats["stream_triggers"] += 1
+        request_sync(symbol)
+
+
+def touch_symbol(symbol: str):
+    """La gráfica pidió `symbol`: queda activo durante FRESHNESS_IDLE_SECS."""
+    _requested[symbol.upper()] = time.monotonic()
+
+
+async def staleness_secs(symbol: str) -> Optional[float]:
+    """
+    Retraso (s) de la última vela de 1m guardada respecto a la última vela
+    cerrada en Binance: 0 si está al día, None si no hay datos locales.
+    """
+    last = await last_stored_ts(symbol)
+    if last is None:
+        return None
+    current_open = (int(time.time() * 1000) // MINUTE_MS) * MINUTE_MS
+    return max(0, current_open - (last + MINUTE_MS)) / 1000
+
+
+def report_gap(symbol: str, stale: Optional[float]):
+    """Petición de la gráfica: si falta alguna vela cerrada, se encola la sincronización."""
+    if stale:
+        freshness_stats["gap_triggers"] += 1
+        request_sync(symbol)
+
+
+async def refresh_symbol(symbol: str):
+    """Velas de 1m en PostgreSQL y precarga de Redis al día (lo que hacía /update-then-fetch)."""
+    await sync_recent_candles(symbol)
+    await sync_recent_candles_redis(symbol)
+
+
+async def freshness_service():
+    """Lifespan: atiende los símbolos encolados y hace un barrido periódico de los activos."""
+    limit = asyncio.Semaphore(FRESHNESS_CONCURRENCY)
+    next_sweep = 0.0
+
+    async def refresh(symbol: str):
+        async with limit:
+            try:
+                await refresh_symbol(symbol)
+                freshness_stats["refreshes"] += 1
+            except Exception as e:
+                freshness_stats["errors"] += 1
+                logger.warning(f"⚠️ No se pudo actualizar {symbol}: {e}")
+
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), max(0.0, next_sweep - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        if time.monotonic() >= next_sweep:
+            _pending.update(active_symbols())
+            freshness_stats["sweeps"] += 1
+            next_sweep = time.monotonic() + FRESHNESS_SWEEP_SECS
+        symbols = list(_pending)
+        _pending.clear()
+        await asyncio.gather(*(refresh(symbol) for symbol in symbols))
+
+
+def freshness_summary() -> dict:
+    return {**freshness_stats, "active_symbols": sorted(active_symbols()), "pending": len(_pending)}
@@ -0,0 +1,130 @@
+# services/candle_ingest.py
+#
+# Ingesta masiva de velas de 1m (importaciones de histórico de Binance): cada
+# lote se copia con COPY a una tabla de staging UNLOGGED (sin WAL) y se pasa a
+# candlesticks con un solo INSERT ... SELECT ... ON CONFLICT DO NOTHING, en vez
+# de un INSERT por fila.
+#
+# La tabla de staging es compartida pero cada transacción solo ve sus propias
+# filas (MVCC) y las borra antes de confirmar, así que varias importaciones
+# pueden correr a la vez. Cada lote es una transacción: refresca los roll-ups
+# de las velas nuevas y, tras el commit, avanza el watermark de la caché.
+
+import logging
+import os
+from typing import AsyncIterable, List
+
+from database import get_db_pool
+from services.candle_cache import mark_candles_persisted_async
+from services.candle_rollups import refresh_rollups_async
+from utils.redis_utils import async_redis_client
+
+logger = logging.getLogger("binance_ws")
+
+# Velas por lote (una transacción y un COPY por lote)
+CANDLE_INGEST_BATCH = int(os.getenv("CANDLE_INGEST_BATCH", 5000))
+
+STAGING_TABLE = "candlesticks_staging"
+
+KLINE_FIELDS = ("open", "high", "low", "close", "volume", "timestamp", "number_of_trades",
+                "taker_buy_quote_asset_volume")
+
+_COLUMNS = "symbol, " + ", ".join(KLINE_FIELDS)
+
+_CREATE_STAGING_SQL = f"""
+    CREATE UNLOGGED TABLE IF NOT EXISTS {STAGING_TABLE} (
+        symbol TEXT NOT NULL,
+        open NUMERIC NOT NULL,
+        high NUMERIC NOT NULL,
+        low NUMERIC NOT NULL,
+        close NUMERIC NOT NULL,
+        volume NUMERIC NOT NULL,
+        timestamp BIGINT NOT NULL,
+        number_of_trades BIGINT NOT NULL,
+        taker_buy_quote_asset_volume NUMERIC
+    )
+"""
+
+_COPY_SQL = f"COPY {STAGING_TABLE} ({_COLUMNS}) FROM STDIN"
+
+_MERGE_SQL = f"""
+    INSERT INTO candlesticks ({_COLUMNS})
+    SELECT {_COLUMNS} FROM {STAGING_TABLE}
+    ON CONFLICT (symbol, timestamp) DO NOTHING
+    RETURNING timestamp
+"""
+
+# DELETE y no TRUNCATE: TRUNCATE bloquearía la tabla para las demás importaciones
+_CLEAR_SQL = f"DELETE FROM {STAGING_TABLE}"
+
+_staging_ready = False
+
+
+def parse_klines(result: list) -> List[dict]:
+    """Respuesta de /api/v3/klines → velas con los campos de candlesticks."""
+    return [{
+        "open": float(item[1]),
+        "high": float(item[2]),
+        "low": float(item[3]),
+        "close": float(item[4]),
+        "timestamp": int(item[0]),
+        "volume": float(item[5]),
+        "number_of_trades": int(item[8]),
+        "taker_buy_quote_asset_volume": float(item[10])
+    } for item in result]
+
+
+async def ensure_staging_table():
+    """Crea (una vez por proceso, en su propia transacción) la tabla de staging."""
+    global _staging_ready
+    if _staging_ready:
+        return
+    async with get_db_pool().connection() as conn:
+        await conn.execute(_CREATE_STAGING_SQL)
+    _staging_ready = True
+
+
+async def store_candles(symbol: str, values: List[dict]) -> List[int]:
+    """
+    Inserta un lote de velas de 1m (sin duplicar) con COPY + INSERT ... SELECT,
+    refresca los roll-ups de las que eran nuevas y avanza el watermark de la
+    caché. Devuelve los timestamps insertados.
+    """
+    if not values:
+        return []
+    await ensure_staging_table()
+    symbol = symbol.upper()
+    async with get_db_pool().connection() as conn:
+        async with conn.cursor() as cursor:
+            async with cursor.copy(_COPY_SQL) as copy:
+                for kline in values:
+                    await copy.write_row((symbol, *[kline[field] for field in KLINE_FIELDS]))
+            await cursor.execute(_MERGE_SQL)
+            inserted = [row[0] for row in await cursor.fetchall()]
+            await cursor.execute(_CLEAR_SQL)
+        if inserted:
+            await refresh_rollups_async(conn, symbol, min(inserted), max(inserted))
+    # La transacción se confirma al devolver la conexión al pool
+    if inserted:
+        await mark_candles_persisted_async(async_redis_client, symbol, min(inserted), max(inserted))
+    return inserted
+
+
+async def ingest_candles(symbol: str, pages: AsyncIterable[List[dict]],
+                         batch_size: int = CANDLE_INGEST_BATCH) -> dict:
+    """
+    Consume páginas de velas a medida que se descargan y las persiste en lotes
+    de `batch_size`: la memoria queda acotada por el lote, no por el rango.
+    """
+    downloaded = inserted = 0
+    batch: List[dict] = []
+    async for page in pages:
+        downloaded += len(page)
+        batch.extend(page)
+        if len(batch) >= batch_size:
+            inserted += len(await store_candles(symbol, batch))
+            batch = []
+    if batch:
+        inserted += len(await store_candles(symbol, batch))
+    logger.info(f"📥 {symbol.upper()}: {downloaded} velas descargadas, {inserted} nuevas")
+    return {"downloaded": downloaded, "inserted": inserted}
@@ -0,0 +1,166 @@
+# services/candle_rollups.py
+#
+# Tablas de roll-up por intervalo (candlesticks_5m, _15m, _1h, _1d) derivadas
+# de las velas de 1m. Cada vez que se persisten velas de 1m (redis_migrator,
+# candle_ingest: backfill y sincronización) se recalculan solo los buckets
+# afectados con un upsert, así que leer cualquier intervalo es un escaneo por
+# rango del índice (symbol, timestamp) de su tabla.
+#
+# Reconstrucción completa:
+#   python -m services.candle_rollups rebuild [--symbol BTCUSDT] [--interval 1h]
+
+import argparse
+import logging
+from typing import Iterable, Optional
+
+from database import get_db_connection, get_db_pool
+from services.candles import INTERVAL_MS, ROLLUP_TABLES
+
+logger = logging.getLogger("binance_ws")
+
+# Rango de 1m que se agrega por sentencia durante la reconstrucción
+REBUILD_CHUNK_MS = 30 * 86_400_000
+
+_CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        symbol TEXT NOT NULL,
+        timestamp BIGINT NOT NULL,
+        open NUMERIC NOT NULL,
+        high NUMERIC NOT NULL,
+        low NUMERIC NOT NULL,
+        close NUMERIC NOT NULL,
+        volume NUMERIC NOT NULL,
+        number_of_trades BIGINT NOT NULL,
+        taker_buy_quote_asset_volume NUMERIC,
+        PRIMARY KEY (symbol, timestamp)
+    )
+"""
+
+_UPSERT_SQL = """
+    INSERT INTO {table} (symbol, timestamp, open, high, low, close, volume,
+                         number_of_trades, taker_buy_quote_asset_volume)
+    SELECT symbol,
+           (timestamp / %(bucket)s::bigint) * %(bucket)s::bigint,
+           (array_agg(open ORDER BY timestamp))[1],
+           max(high),
+           min(low),
+           (array_agg(close ORDER BY timestamp DESC))[1],
+           sum(volume),
+           sum(number_of_trades),
+           sum(taker_buy_quote_asset_volume)
+    FROM candlesticks
+    WHERE symbol = %(symbol)s AND timestamp >= %(lo)s AND timestamp < %(hi)s
+    GROUP BY 1, 2
+    ON CONFLICT (symbol, timestamp) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume,
+        number_of_trades = EXCLUDED.number_of_trades,
+        taker_buy_quote_asset_volume = EXCLUDED.taker_buy_quote_asset_volume
+"""
+
+_tables_ready = False
+
+
+def ensure_rollup_tables():
+    """Crea (una vez por proceso, en su propia transacción) las tablas de roll-up."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for table in ROLLUP_TABLES.values():
+                cursor.execute(_CREATE_SQL.format(table=table))
+        conn.commit()
+    finally:
+        conn.close()
+    _tables_ready = True
+
+
+async def ensure_rollup_tables_async():
+    """Igual que ensure_rollup_tables, con una conexión del pool de la app."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    async with get_db_pool().connection() as conn:
+        for table in ROLLUP_TABLES.values():
+            await conn.execute(_CREATE_SQL.format(table=table))
+    _tables_ready = True
+
+
+def _upserts(symbol: str, first_ts: int, last_ts: int, intervals: Optional[Iterable[str]]):
+    for interval in intervals or ROLLUP_TABLES:
+        bucket = INTERVAL_MS[interval]
+        yield _UPSERT_SQL.format(table=ROLLUP_TABLES[interval]), {
+            "symbol": symbol.upper(),
+            "bucket": bucket,
+            "lo": (int(first_ts) // bucket) * bucket,
+            "hi": (int(last_ts) // bucket + 1) * bucket,
+        }
+
+
+def refresh_rollups(cursor, symbol: str, first_ts: int, last_ts: int, intervals: Optional[Iterable[str]] = None):
+    """
+    Recalcula, dentro de la transacción de `cursor`, los buckets de cada
+    roll-up que contienen velas de 1m en [first_ts, last_ts].
+    """
+    ensure_rollup_tables()
+    for sql, params in _upserts(symbol, first_ts, last_ts, intervals):
+        cursor.execute(sql, params)
+
+
+async def refresh_rollups_async(conn, symbol: str, first_ts: int, last_ts: int,
+                                intervals: Optional[Iterable[str]] = None):
+    """refresh_rollups dentro de la transacción de una conexión asíncrona del pool."""
+    await ensure_rollup_tables_async()
+    for sql, params in _upserts(symbol, first_ts, last_ts, intervals):
+        await conn.execute(sql, params)
+
+
+def rebuild_rollups(symbol: Optional[str] = None, intervals: Optional[Iterable[str]] = None):
+    """Reconstrucción completa desde candlesticks, por símbolo y en tramos de REBUILD_CHUNK_MS."""
+    intervals = list(intervals or ROLLUP_TABLES)
+    ensure_rollup_tables()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            if symbol:
+                cursor.execute("SELECT %s, min(timestamp), max(timestamp) FROM candlesticks WHERE symbol = %s",
+                               (symbol.upper(), symbol.upper()))
+            else:
+                cursor.execute("SELECT symbol, min(timestamp), max(timestamp) FROM candlesticks GROUP BY symbol")
+            ranges = [row for row in cursor.fetchall() if row[1] is not None]
+
+            for sym, first_ts, last_ts in ranges:
+                for interval in intervals:
+                    cursor.execute(f"DELETE FROM {ROLLUP_TABLES[interval]} WHERE symbol = %s", (sym,))
+                # Tramos alineados a 1d: ningún bucket queda partido entre dos tramos
+                start = (first_ts // INTERVAL_MS["1d"]) * INTERVAL_MS["1d"]
+                while start <= last_ts:
+                    end = start + REBUILD_CHUNK_MS
+                    refresh_rollups(cursor, sym, start, end - 1, intervals)
+                    start = end
+                conn.commit()
+                logger.info(f"✅ Roll-ups de {sym} reconstruidos ({', '.join(intervals)})")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll-ups de velas (5m/15m/1h/1d)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="reconstruir los roll-ups desde candlesticks")
+    rebuild.add_argument("--symbol")
+    rebuild.add_argument("--interval", action="append", choices=list(ROLLUP_TABLES))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "rebuild":
+        rebuild_rollups(args.symbol, args.interval)
+
+
+if __name__ == "__main__":
+    main()
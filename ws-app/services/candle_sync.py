@@ -0,0 +1,89 @@
+# services/candle_sync.py
+#
+# Sincronización incremental de velas de 1m con Binance (/update-then-fetch):
+# solo se piden las velas CERRADAS posteriores a la última guardada. La última
+# vela guardada sale del watermark de la caché de velas en Redis (lo avanzan
+# todas las rutas de escritura) y, si no existe, de max(timestamp) en
+# PostgreSQL, que además siembra el watermark. Si la base ya tiene la última
+# vela cerrada no hay ninguna petición a Binance.
+#
+# Single-flight: peticiones simultáneas del mismo símbolo esperan la misma
+# sincronización en curso en vez de lanzar N descargas idénticas.
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+
+from database import get_db_pool
+from services.candle_cache import last_persisted_ts, mark_candles_persisted_async
+from services.kline_downloader import backfill
+from utils.redis_utils import async_redis_client
+
+logger = logging.getLogger("binance_ws")
+
+MINUTE_MS = 60_000
+# Hueco máximo que se rellena en una sincronización (y ventana inicial sin datos);
+# huecos mayores quedan para un backfill explícito (services.kline_downloader)
+CANDLE_SYNC_MAX_GAP_MINUTES = int(os.getenv("CANDLE_SYNC_MAX_GAP_MINUTES", 1440))
+
+# SYMBOL → sincronización en curso
+_syncs: Dict[str, asyncio.Task] = {}
+sync_stats = {"up_to_date": 0, "synced": 0, "joined": 0, "inserted": 0}
+
+
+async def last_stored_ts(symbol: str) -> Optional[int]:
+    """Apertura (ms) de la última vela de 1m guardada de `symbol`, o None si no hay ninguna."""
+    symbol = symbol.upper()
+    try:
+        last = await last_persisted_ts(async_redis_client, symbol)
+        if last is not None:
+            return last
+    except RedisError as e:
+        logger.warning(f"⚠️ Watermark de {symbol} no disponible: {e}")
+
+    async with get_db_pool().connection() as conn:
+        cursor = await conn.execute("SELECT max(timestamp) FROM candlesticks WHERE symbol = %s", (symbol,))
+        (last,) = await cursor.fetchone()
+    if last is not None:
+        try:
+            await mark_candles_persisted_async(async_redis_client, symbol, last, last)
+        except RedisError:
+            pass
+    return last
+
+
+async def _sync(symbol: str) -> int:
+    # Vela en curso (abierta): no se guarda hasta que cierre
+    current_open = (int(time.time() * 1000) // MINUTE_MS) * MINUTE_MS
+    oldest = current_open - CANDLE_SYNC_MAX_GAP_MINUTES * MINUTE_MS
+    last = await last_stored_ts(symbol)
+    start = oldest if last is None else max(last + MINUTE_MS, oldest)
+    if start >= current_open:
+        sync_stats["up_to_date"] += 1
+        return 0
+
+    totals = await backfill([symbol], start, current_open)
+    sync_stats["synced"] += 1
+    sync_stats["inserted"] += totals["inserted"]
+    return totals["inserted"]
+
+
+async def sync_recent_candles(symbol: str) -> int:
+    """
+    Trae de Binance las velas de 1m cerradas que faltan de `symbol`, sin
+    duplicar descargas concurrentes. Devuelve cuántas velas se insertaron.
+    """
+    symbol = symbol.upper()
+    task = _syncs.get(symbol)
+    if task is None:
+        task = asyncio.create_task(_sync(symbol))
+        _syncs[symbol] = task
+        task.add_done_callback(lambda done: _syncs.pop(symbol, None) if _syncs.get(symbol) is done else None)
+    else:
+        sync_stats["joined"] += 1
+    # shield: si un cliente se desconecta, la sincronización sigue para los demás
+    return await asyncio.shield(task)
@@ -0,0 +1,182 @@
+# services/candles.py
+#
+# Velas históricas agregadas en PostgreSQL. Los intervalos > 1m se leen de su
+# tabla de roll-up (services/candle_rollups), mantenida incrementalmente al
+# persistir velas de 1m: cada intervalo es un escaneo por rango del índice
+# (symbol, timestamp). Si el roll-up aún no tiene datos (tabla nueva sin
+# reconstruir), se agrega al vuelo desde las velas de 1m con aritmética entera
+# sobre `timestamp` (ms) y open/close con agregados ordenados, acotando el
+# rango leído a `limit` buckets antes de la última vela.
+#
+# Las consultas ya devuelven cada barra con la forma de la respuesta
+# (time ajustado, float8, bigint), así que las filas del cursor pasan directo a
+# bytes JSON sin conversiones por valor; con `stream_candles_json` se leen con
+# un cursor de servidor y se escriben por tramos (memoria constante).
+# Todas las consultas usan el pool asíncrono (database.get_db_pool).
+
+import os
+from typing import AsyncIterator, List, Optional
+
+from psycopg import errors
+
+from database import get_db_pool
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa la plantilla de texto
+    orjson = None
+
+# intervalo → duración del bucket en ms
+INTERVAL_MS = {
+    "1m": 60_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "1h": 3_600_000,
+    "1d": 86_400_000,
+}
+
+# intervalo → tabla de roll-up
+ROLLUP_TABLES = {
+    "5m": "candlesticks_5m",
+    "15m": "candlesticks_15m",
+    "1h": "candlesticks_1h",
+    "1d": "candlesticks_1d",
+}
+
+# Ajuste de zona horaria de la gráfica: UTC-6
+DISPLAY_OFFSET_SECS = -6 * 3600
+
+# Respuestas de más barras que esto se envían en streaming (sin caché)
+CANDLE_STREAM_MIN_BARS = int(os.getenv("CANDLE_STREAM_MIN_BARS", 20000))
+# Barras por tramo en modo streaming
+CANDLE_STREAM_CHUNK = int(os.getenv("CANDLE_STREAM_CHUNK", 5000))
+
+BAR_FIELDS = ("time", "open", "high", "low", "close", "volume", "trades")
+
+# Columnas de salida de una barra a partir de su bucket (ms) y sus agregados
+_BAR_COLUMNS = """
+            {ts} / 1000 + %(offset)s AS time,
+            {open}::float8 AS open,
+            {high}::float8 AS high,
+            {low}::float8 AS low,
+            {close}::float8 AS close,
+            {volume}::float8 AS volume,
+            {trades}::bigint AS trades"""
+
+_PLAIN_COLUMNS = _BAR_COLUMNS.format(
+    ts="timestamp", open="open", high="high", low="low", close="close", volume="volume", trades="number_of_trades",
+)
+
+# La subconsulta toma las últimas `limit` barras; la externa las deja en orden ascendente
+_RAW_SQL = """
+    SELECT * FROM (
+        SELECT""" + _PLAIN_COLUMNS + """
+        FROM candlesticks
+        WHERE symbol = %(symbol)s
+          AND (%(before)s::bigint IS NULL OR timestamp < %(before)s)
+        ORDER BY timestamp DESC
+        LIMIT %(limit)s
+    ) bars ORDER BY time
+"""
+
+_ROLLUP_SQL = _RAW_SQL.replace("FROM candlesticks", "FROM {table}")
+
+# Los límites van como subconsultas escalares (InitPlan, una sola evaluación
+# usable en la condición del índice): unidos como tabla, con estadísticas
+# viejas tras una carga masiva el planner podía reevaluar max() por cada fila.
+_BUCKET_SQL = """
+    WITH bounds AS (
+        SELECT (max(timestamp) / %(bucket)s::bigint + 1) * %(bucket)s::bigint AS hi
+        FROM candlesticks
+        WHERE symbol = %(symbol)s
+          AND (%(before)s::bigint IS NULL OR timestamp < %(before)s)
+    )
+    SELECT * FROM (
+        SELECT""" + _BAR_COLUMNS.format(
+    ts="(c.timestamp / %(bucket)s::bigint) * %(bucket)s::bigint",
+    open="(array_agg(c.open ORDER BY c.timestamp))[1]",
+    high="max(c.high)",
+    low="min(c.low)",
+    close="(array_agg(c.close ORDER BY c.timestamp DESC))[1]",
+    volume="sum(c.volume)",
+    trades="sum(c.number_of_trades)",
+) + """
+        FROM candlesticks c
+        WHERE c.symbol = %(symbol)s
+          AND c.timestamp >= (SELECT hi FROM bounds) - %(bucket)s::bigint * %(limit)s
+          AND c.timestamp < (SELECT hi FROM bounds)
+          AND (%(before)s::bigint IS NULL OR c.timestamp < %(before)s)
+        GROUP BY c.timestamp / %(bucket)s::bigint
+        ORDER BY 1 DESC
+        LIMIT %(limit)s
+    ) bars ORDER BY time
+"""
+
+_BAR_TEMPLATE = '{"time":%d,"open":%r,"high":%r,"low":%r,"close":%r,"volume":%r,"trades":%d}'
+
+
+def _queries(interval: str) -> List[str]:
+    """Consultas a probar en orden: roll-up y, si está vacío, agregación al vuelo."""
+    if interval not in ROLLUP_TABLES:
+        return [_RAW_SQL]
+    return [_ROLLUP_SQL.format(table=ROLLUP_TABLES[interval]), _BUCKET_SQL]
+
+
+def _params(symbol: str, interval: str, before_ms: Optional[int], limit: int) -> dict:
+    return {"symbol": symbol.upper(), "before": before_ms, "limit": limit,
+            "bucket": INTERVAL_MS[interval], "offset": DISPLAY_OFFSET_SECS}
+
+
+async def fetch_candles(symbol: str, interval: str, before_ms: Optional[int] = None, limit: int = 500) -> List[tuple]:
+    """
+    Últimas `limit` barras de `interval` anteriores a `before_ms` en orden
+    ascendente, como tuplas BAR_FIELDS (tiempo en segundos ajustado a la gráfica).
+    """
+    params = _params(symbol, interval, before_ms, limit)
+    async with get_db_pool().connection() as conn:
+        for sql in _queries(interval):
+            try:
+                cursor = await conn.execute(sql, params)
+            except errors.UndefinedTable:
+                await conn.rollback()
+                continue
+            rows = await cursor.fetchall()
+            if rows:
+                return rows
+        return []
+
+
+def candles_json(rows: List[tuple]) -> bytes:
+    """Tuplas BAR_FIELDS → array JSON de barras en una sola pasada."""
+    if orjson is not None:
+        return orjson.dumps([dict(zip(BAR_FIELDS, row)) for row in rows])
+    return ("[" + ",".join([_BAR_TEMPLATE % row for row in rows]) + "]").encode()
+
+
+async def stream_candles_json(symbol: str, interval: str, before_ms: Optional[int] = None, limit: int = 500,
+                              chunk_rows: int = CANDLE_STREAM_CHUNK) -> AsyncIterator[bytes]:
+    """
+    Mismo JSON que candles_json(await fetch_candles(...)), leído con un cursor
+    de servidor y emitido por tramos de `chunk_rows` barras.
+    """
+    params = _params(symbol, interval, before_ms, limit)
+    async with get_db_pool().connection() as conn:
+        for sql in _queries(interval):
+            async with conn.cursor(name="candles_stream") as cursor:
+                try:
+                    await cursor.execute(sql, params)
+                    rows = await cursor.fetchmany(chunk_rows)
+                except errors.UndefinedTable:
+                    await conn.rollback()
+                    continue
+                if not rows:
+                    continue
+                yield b"["
+                separator = b""
+                while rows:
+                    yield separator + candles_json(rows)[1:-1]
+                    separator = b","
+                    rows = await cursor.fetchmany(chunk_rows)
+                yield b"]"
+                return
+        yield b"[]"
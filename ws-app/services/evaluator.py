@@ -1,27 +1,32 @@
 import json
 import logging
+import redis
 from datetime import datetime
-from services.binance_api import close_market_order
-from utils.telegram_utils import send_telegram_message
+from services.order_dispatcher import position_intent, submit_sell
+from utils.telegram_utils import queue_telegram_message
 from shared.socket_context import connected_users
-from utils.redis_utils import redis_client, evaluation_tasks
+from utils.redis_utils import async_redis_client
+from services.positions import stop_position_actor
+from utils.config_events import save_operation_config_async
+from utils.metrics import finish_order_trace, mark_stage, start_order_trace
 
 logger = logging.getLogger("binance_ws")
 
 
-async def evaluate_indicators(symbol: str, close_price: float, sid: str, sio,user_id):
+async def evaluate_indicators(symbol: str, close_price: float, sid: str, sio,user_id, config=None):
     
     key = f"{symbol.upper()}_operation_{user_id}"
 
-    # 1) Leer SIEMPRE desde Redis
-    try:
-        raw = redis_client.get(key)
-        if not raw:
+    # 1) Leer desde Redis, salvo que el llamador ya la haya leído (lote del scheduler)
+    if config is None:
+        try:
+            raw = await async_redis_client.get(key)
+            if not raw:
+                return
+            config = json.loads(raw)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"[{sid}] Redis error (get {key}): {e}")
             return
-        config = json.loads(raw)
-    except redis_client.exceptions.RedisError as e:
-        logger.warning(f"[{sid}] Redis error (get {key}): {e}")
-        return
 
     entry_point = float(config.get("entry_point", 0))
     take_profit = float(config.get("take_profit",  0))
@@ -33,19 +38,23 @@ async def evaluate_indicators(symbol: str, close_price: float, sid: str, sio,use
     # 2) Cierres definitivos, en orden de urgencia:
     # 2.1 Stop‑loss
     if stop_loss and close_price <= stop_loss:
-        close_result = await close_market_order(symbol)
+        start_order_trace("sell", symbol.upper())
+        close_result = await submit_sell(user_id, symbol, position_intent(config))
         if close_result.get("status") == "FILLED":
             await _close_operation(symbol, close_price, config, key, sid, sio, "SL", close_result)
         else:
+            finish_order_trace(record=False)
             logger.warning(f"[{sid}] Falló SL: {close_result}")
         return
 
     # 2.2 Take‑benefit
     if take_benefit is not None and close_price <= take_benefit:
-        close_result = await close_market_order(symbol)
+        start_order_trace("sell", symbol.upper())
+        close_result = await submit_sell(user_id, symbol, position_intent(config))
         if close_result.get("status") == "FILLED":
             await _close_operation(symbol, close_price, config, key, sid, sio, "TB", close_result)
         else:
+            finish_order_trace(record=False)
             logger.warning(f"[{sid}] Falló TB: {close_result}")
         return
 
@@ -56,17 +65,20 @@ async def evaluate_indicators(symbol: str, close_price: float, sid: str, sio,use
         print("✅ ENTRO EN LA CONDICIÓN DE TP")
         profit_progress = round((close_price - entry_point) / entry_point, 4)
         if profit_progress >= 2:
-            close_result = await close_market_order(symbol)
+            start_order_trace("sell", symbol.upper())
+            close_result = await submit_sell(user_id, symbol, position_intent(config))
             if close_result.get("status") == "FILLED":
                 await _close_operation(symbol, close_price, config, key, sid, sio, "TP", close_result)
             else:
+                finish_order_trace(record=False)
                 logger.warning(f"[{sid}] Falló TP final: {close_result}")
             return
         # 2.4 Ajuste dinámico de TP/TB
         new_tp = round(take_profit * 1.005, 4)
         new_tb = round(take_profit * 0.996, 4)
+        previous = dict(config)
         config.update({"take_profit": new_tp, "take_benefit": new_tb})
-        redis_client.set(key, json.dumps(config))
+        await save_operation_config_async(key, config, previous, "evaluator")
         logger.info(f"[{sid}] TP dinámico: TP={new_tp}, TB={new_tb}")
         await sio.emit("operation_executed", config, to=sid)
         return
@@ -76,7 +88,7 @@ async def evaluate_indicators(symbol: str, close_price: float, sid: str, sio,use
 
 
 
-async def _close_operation(symbol, close_price, config, key, sid, sio, operation_type,close_result):
+async def _close_operation(symbol, close_price, config, key, sid, sio, operation_type,close_result, user_id=None):
     # Asegurarse de usar dict
     if isinstance(config, str):
         config = json.loads(config)
@@ -113,18 +125,18 @@ async def _close_operation(symbol, close_price, config, key, sid, sio, operation
 
     # 3. Guardar resultado + reiniciar config en Redis
     await _store_result(symbol, result_data, key, config, sid)
+    mark_stage("persisted")
 
     # 5. Notificar al frontend
     await sio.emit("operation_executed", config, to=sid)
 
-    # 6. Cancelar tarea de evaluación, si existe
-    # 6. Cancelar tarea de evaluación, si existe
-    if sid in evaluation_tasks:
-        task = evaluation_tasks.pop(sid)
-        task.cancel()
+    # 6. Detener el actor de evaluación de la posición (user_id, symbol), si existe
+    if user_id is None:
+        user_id = key.rsplit("_operation_", 1)[-1]
+    stop_position_actor(user_id, symbol)
 
 
-    # 7. Enviar notificación externa
+    # 7. Enviar notificación externa (encolada: no bloquea el loop)
     plain = (
             f"🔔 {symbol.upper()} operación cerrada ({operation_type})\n"
             f"Side: {result_data['side']}\n"
@@ -134,15 +146,17 @@ async def _close_operation(symbol, close_price, config, key, sid, sio, operation
             f"Comisión: {result_data['commission']} {result_data['commission_asset']}\n"
             f"Hora ejecución: {result_data['executed_at']}"
         )
-    send_telegram_message(plain)
+    queue_telegram_message(plain)
+    mark_stage("telegram")
+    finish_order_trace()
 
 
 async def _store_result(symbol, result_data, key, config, sid, redis_key_suffix="_results"):
     result_key = f"{symbol.upper()}{redis_key_suffix}"
     try:
-        score = int(datetime.timezone.utcnow().timestamp())
+        score = int(datetime.utcnow().timestamp())
         json_result = json.dumps(result_data)
-        redis_client.zadd(result_key, {json_result: score})
+        await async_redis_client.zadd(result_key, {json_result: score})
     except Exception as e:
         logger.error(f"[{sid}] ⚠️ Error ZADD: {e}")
 
@@ -154,7 +168,8 @@ async def _store_result(symbol, result_data, key, config, sid, redis_key_suffix=
             "status": config.get("status"),
             "operate": False
         }
-        redis_client.set(key, json.dumps(new_config))
+        # Reemplazo completo (sin delta): la config recibida ya viene sin los campos de la posición
+        await save_operation_config_async(key, new_config, None, "store-result")
 
         logger.info(f"[{sid}] 🔁 Config reiniciada con alertas activas.")
     except Exception as e:
@@ -0,0 +1,221 @@
+# services/kline_downloader.py
+#
+# Backfill paralelo de velas de 1m desde Binance. El rango [start, end) de cada
+# símbolo se parte en tramos independientes de una página de /api/v3/klines
+# (1000 velas, alineados a múltiplos de CHUNK_MS) que descargan en paralelo
+# KLINE_DOWNLOAD_CONCURRENCY workers. Un único escritor va pasando las velas a
+# la ingesta por COPY (services/candle_ingest) en lotes por símbolo, con la
+# cola entre ambos acotada: la memoria no depende del tamaño del rango.
+#
+# Las descargas se frenan con un limitador de peso por minuto que combina el
+# peso propio con el que reporta Binance (X-MBX-USED-WEIGHT-1M, incluye el
+# resto de la app) y espera a que venza el bloqueo tras un 429/418.
+#
+# Cada tramo completo y cerrado se apunta en Redis (kline_backfill:{SYMBOL})
+# después de confirmar su lote en PostgreSQL; al repetir un job se saltan.
+#
+#   python -m services.kline_downloader --symbols BTCUSDT,ETHUSDT --start 2023-01-01 [--end 2024-01-01]
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+import httpx
+
+from services.binance_http import binance_request, rate_state
+from services.candle_ingest import CANDLE_INGEST_BATCH, parse_klines, store_candles
+from utils.redis_utils import async_redis_client
+
+logger = logging.getLogger("binance_ws")
+
+KLINES_PATH = "/api/v3/klines"
+KLINES_WEIGHT = 2
+MINUTE_MS = 60_000
+# Un tramo = una página completa de /api/v3/klines
+CHUNK_MS = 1000 * MINUTE_MS
+
+KLINE_DOWNLOAD_CONCURRENCY = int(os.getenv("KLINE_DOWNLOAD_CONCURRENCY", 8))
+# Peso por minuto de la IP (Binance: 6000) a partir del cual las descargas
+# esperan al minuto siguiente; el margen queda para órdenes y el resto de la app
+KLINE_DOWNLOAD_MAX_WEIGHT = int(os.getenv("KLINE_DOWNLOAD_MAX_WEIGHT", 4800))
+# Reintentos de un tramo tras 429/418 (los errores de red y 5xx ya los reintenta binance_request)
+KLINE_DOWNLOAD_RETRIES = int(os.getenv("KLINE_DOWNLOAD_RETRIES", 5))
+
+
+class WeightLimiter:
+    """Peso por minuto compartido por los workers de un job (en orden de llegada)."""
+
+    def __init__(self, max_weight: int):
+        self.max_weight = max_weight
+        self.waits = 0
+        self._lock = asyncio.Lock()
+        self._minute = 0
+        self._used = 0
+
+    async def acquire(self, weight: int):
+        async with self._lock:
+            while True:
+                now = time.time()
+                if rate_state["blocked_until"] > now:
+                    self.waits += 1
+                    await asyncio.sleep(rate_state["blocked_until"] - now)
+                    continue
+                minute = int(now // 60)
+                if minute != self._minute:
+                    self._minute, self._used = minute, 0
+                # Lo reportado ya incluye nuestras peticiones respondidas: el mayor de ambos
+                if rate_state["minute"] == minute:
+                    self._used = max(self._used, rate_state["used_weight_1m"])
+                if self._used + weight <= self.max_weight:
+                    self._used += weight
+                    return
+                self.waits += 1
+                await asyncio.sleep(60 - now % 60 + 0.05)
+
+
+def _checkpoint_key(symbol: str) -> str:
+    return f"kline_backfill:{symbol.upper()}"
+
+
+async def _download_chunk(limiter: WeightLimiter, symbol: str, lo: int, hi: int) -> List[dict]:
+    params = {"symbol": symbol, "interval": "1m", "startTime": lo, "endTime": hi - 1, "limit": 1000}
+    for attempt in range(KLINE_DOWNLOAD_RETRIES + 1):
+        await limiter.acquire(KLINES_WEIGHT)
+        response = await binance_request("GET", KLINES_PATH, params=params)
+        if response.status_code in (429, 418) and attempt < KLINE_DOWNLOAD_RETRIES:
+            continue  # el limitador espera a que venza el bloqueo
+        response.raise_for_status()
+        return parse_klines(response.json())
+
+
+async def backfill(symbols: Iterable[str], start_time: int, end_time: int,
+                   concurrency: int = KLINE_DOWNLOAD_CONCURRENCY, batch_size: int = CANDLE_INGEST_BATCH,
+                   resume: bool = True) -> dict:
+    """
+    Descarga e inserta las velas de 1m de `symbols` en [start_time, end_time).
+    Con `resume` se saltan los tramos ya confirmados en un job anterior. Un
+    tramo que falla se cuenta en `failed` y no se apunta: repetir el job lo
+    vuelve a pedir.
+    """
+    limiter = WeightLimiter(KLINE_DOWNLOAD_MAX_WEIGHT)
+    now_ms = int(time.time() * 1000)
+    stats = {"chunks": 0, "skipped": 0, "failed": 0, "downloaded": 0, "inserted": 0}
+    chunks: "asyncio.Queue[Tuple[str, int, int, int]]" = asyncio.Queue()
+
+    for symbol in dict.fromkeys(s.upper() for s in symbols):
+        done = {int(ts) for ts in await async_redis_client.smembers(_checkpoint_key(symbol))} if resume else set()
+        for chunk_start in range((start_time // CHUNK_MS) * CHUNK_MS, end_time, CHUNK_MS):
+            if chunk_start in done:
+                stats["skipped"] += 1
+                continue
+            chunks.put_nowait((symbol, chunk_start, max(chunk_start, start_time), min(chunk_start + CHUNK_MS, end_time)))
+            stats["chunks"] += 1
+
+    # (símbolo, tramo a apuntar o None, velas); acotada para no adelantarse a la base
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    # símbolo → (velas pendientes, tramos que cubren)
+    pending: Dict[str, Tuple[List[dict], List[int]]] = {}
+
+    async def worker():
+        while True:
+            try:
+                symbol, chunk_start, lo, hi = chunks.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                klines = await _download_chunk(limiter, symbol, lo, hi)
+            except (httpx.HTTPError, ValueError) as e:
+                stats["failed"] += 1
+                logger.error(f"❌ Tramo {symbol} {chunk_start} no descargado: {e}")
+                continue
+            # Solo los tramos completos y ya cerrados quedan como hechos
+            complete = lo == chunk_start and hi == chunk_start + CHUNK_MS and hi <= now_ms
+            await results.put((symbol, chunk_start if complete else None, klines))
+
+    async def flush(symbol: str):
+        rows, checkpoints = pending.pop(symbol)
+        stats["inserted"] += len(await store_candles(symbol, rows))
+        if checkpoints:
+            await async_redis_client.sadd(_checkpoint_key(symbol), *checkpoints)
+
+    async def writer():
+        while (item := await results.get()) is not None:
+            symbol, checkpoint, klines = item
+            rows, checkpoints = pending.setdefault(symbol, ([], []))
+            rows.extend(klines)
+            if checkpoint is not None:
+                checkpoints.append(checkpoint)
+            stats["downloaded"] += len(klines)
+            if len(rows) >= batch_size:
+                await flush(symbol)
+        for symbol in list(pending):
+            await flush(symbol)
+
+    started = time.perf_counter()
+    writer_task = asyncio.create_task(writer())
+    downloads = asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    try:
+        await asyncio.wait({writer_task, downloads}, return_when=asyncio.FIRST_COMPLETED)
+        if writer_task.done():
+            # El escritor solo termina antes de tiempo por un error de la base
+            downloads.cancel()
+            await writer_task
+        await downloads
+        await results.put(None)
+        await writer_task
+    finally:
+        if not writer_task.done():
+            writer_task.cancel()
+
+    elapsed = time.perf_counter() - started
+    stats["limiter_waits"] = limiter.waits
+    stats["seconds"] = round(elapsed, 2)
+    logger.info(f"📥 Backfill {stats['downloaded']} velas ({stats['inserted']} nuevas) en {elapsed:.1f}s, "
+                f"{stats['skipped']} tramos ya hechos, {stats['failed']} fallidos")
+    return stats
+
+
+def _parse_time(value: str) -> int:
+    """'2023-01-01', '2023-01-01T12:00' (UTC) o timestamp en ms."""
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+async def _run(args):
+    from database import close_db_pool, open_db_pool
+    from services.binance_http import close_binance_client
+
+    await open_db_pool()
+    try:
+        end_time = _parse_time(args.end) if args.end else int(time.time() * 1000)
+        return await backfill(args.symbols.split(","), _parse_time(args.start), end_time,
+                              concurrency=args.concurrency, batch_size=args.batch, resume=not args.restart)
+    finally:
+        await close_binance_client()
+        await close_db_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill paralelo de velas de 1m desde Binance")
+    parser.add_argument("--symbols", required=True, help="BTCUSDT,ETHUSDT")
+    parser.add_argument("--start", required=True, help="fecha ISO (UTC) o timestamp en ms")
+    parser.add_argument("--end", help="fecha ISO (UTC) o timestamp en ms; por defecto ahora")
+    parser.add_argument("--concurrency", type=int, default=KLINE_DOWNLOAD_CONCURRENCY)
+    parser.add_argument("--batch", type=int, default=CANDLE_INGEST_BATCH)
+    parser.add_argument("--restart", action="store_true", help="ignorar los checkpoints de jobs anteriores")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# services/market_streams.py
+#
+# Streams de mercado compartidos (depth, aggTrade, ...) con conteo de
+# referencias: una sola conexión WebSocket por stream, sin importar cuántos
+# consumidores lo usen. La conexión se abre con el primer suscriptor y se
+# cierra con el último. Los handlers son funciones síncronas y baratas
+# (p.ej. encolar o actualizar un buffer): el bucle de lectura no espera a nadie.
+
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, List, Optional
+
+import websockets
+
+from services.binance_http import WS_BASE_URL
+
+logger = logging.getLogger("binance_ws")
+
+RECONNECT_DELAY_SECS = 5
+
+
+class MarketStream:
+    def __init__(self, name: str):
+        self.name = name
+        self.handlers: List[Callable[[dict], None]] = []
+        self.task: Optional[asyncio.Task] = None
+        self.messages = 0
+
+    async def run(self):
+        url = f"{WS_BASE_URL}/ws/{self.name}"
+        while True:
+            try:
+                async with websockets.connect(url) as ws:
+                    logger.info(f"📡 Stream de mercado conectado: {self.name}")
+                    async for raw in ws:
+                        message = json.loads(raw)
+                        self.messages += 1
+                        for handler in list(self.handlers):
+                            try:
+                                handler(message)
+                            except Exception as e:
+                                logger.error(f"❌ Error en handler de {self.name}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Stream {self.name} caído: {e}")
+            await asyncio.sleep(RECONNECT_DELAY_SECS)
+
+
+# nombre del stream (p.ej. "btcusdt@depth@100ms") → stream
+market_streams: Dict[str, MarketStream] = {}
+
+
+def subscribe_stream(name: str, handler: Callable[[dict], None]):
+    stream = market_streams.get(name)
+    if stream is None:
+        stream = market_streams[name] = MarketStream(name)
+    stream.handlers.append(handler)
+    if stream.task is None or stream.task.done():
+        stream.task = asyncio.create_task(stream.run())
+
+
+def unsubscribe_stream(name: str, handler: Callable[[dict], None]):
+    stream = market_streams.get(name)
+    if stream is None:
+        return
+    if handler in stream.handlers:
+        stream.handlers.remove(handler)
+    if not stream.handlers:
+        if stream.task:
+            stream.task.cancel()
+        del market_streams[name]
+
+
+def stream_stats() -> dict:
+    return {name: {"subscribers": len(s.handlers), "messages": s.messages} for name, s in market_streams.items()}
+
+
+async def close_market_streams():
+    for stream in market_streams.values():
+        if stream.task:
+            stream.task.cancel()
+    market_streams.clear()
@@ -0,0 +1,249 @@
+# services/order_book.py
+#
+# Libro L2 local por símbolo, mantenido con `<symbol>@depth@100ms` + snapshot
+# REST (/api/v3/depth) siguiendo el procedimiento de sincronización de Binance
+# por números de secuencia. Cada lado se guarda en arrays de NumPy ordenados
+# (bids descendente, asks ascendente), así que estimar el precio medio de
+# ejecución de una orden MARKET es O(niveles) y no requiere red.
+
+import asyncio
+import logging
+import os
+import time
+from decimal import Decimal
+from typing import Dict, Optional
+
+import httpx
+import numpy as np
+
+from services.binance_http import binance_request
+from services.market_streams import subscribe_stream, unsubscribe_stream
+from services.symbol_rules import TRADED_SYMBOLS, format_decimal, get_symbol_rules, round_price
+
+logger = logging.getLogger("binance_ws")
+
+ORDER_BOOK_LEVELS = int(os.getenv("ORDER_BOOK_LEVELS", 1000))
+# Aviso si la estimación supera este deslizamiento (bps)
+SLIPPAGE_WARN_BPS = float(os.getenv("SLIPPAGE_WARN_BPS", 20))
+# > 0 → la orden MARKET pasa a LIMIT IOC con ese deslizamiento máximo (bps)
+SLIPPAGE_IOC_BPS = float(os.getenv("SLIPPAGE_IOC_BPS", 0))
+# Libro más viejo que esto no se usa para estimar
+ORDER_BOOK_MAX_AGE_SECS = float(os.getenv("ORDER_BOOK_MAX_AGE_SECS", 5))
+
+_EMPTY = np.empty(0, dtype=np.float64)
+
+
+def _levels(rows) -> tuple:
+    if not rows:
+        return _EMPTY, _EMPTY
+    arr = np.asarray(rows, dtype=np.float64)
+    return arr[:, 0], arr[:, 1]
+
+
+def _merge_side(prices: np.ndarray, qtys: np.ndarray, updates, descending: bool):
+    """Aplica un lote de niveles (precio, cantidad; 0 = borrar) manteniendo el orden."""
+    upd_p, upd_q = _levels(updates)
+    if not len(upd_p):
+        return prices, qtys
+    keep = ~np.isin(prices, upd_p)
+    live = upd_q > 0
+    merged_p = np.concatenate((prices[keep], upd_p[live]))
+    merged_q = np.concatenate((qtys[keep], upd_q[live]))
+    order = np.argsort(-merged_p if descending else merged_p, kind="stable")[:ORDER_BOOK_LEVELS]
+    return merged_p[order], merged_q[order]
+
+
+class L2Book:
+    def __init__(self, symbol: str):
+        self.symbol = symbol.upper()
+        self.bid_px, self.bid_qty = _EMPTY, _EMPTY
+        self.ask_px, self.ask_qty = _EMPTY, _EMPTY
+        self.last_update_id = 0
+        self.ready = False
+        self.updated_at = 0.0
+        self.resyncs = 0
+
+    def load_snapshot(self, snapshot: dict):
+        self.bid_px, self.bid_qty = _levels(snapshot.get("bids"))
+        self.ask_px, self.ask_qty = _levels(snapshot.get("asks"))
+        order = np.argsort(-self.bid_px)
+        self.bid_px, self.bid_qty = self.bid_px[order], self.bid_qty[order]
+        order = np.argsort(self.ask_px)
+        self.ask_px, self.ask_qty = self.ask_px[order], self.ask_qty[order]
+        self.last_update_id = snapshot["lastUpdateId"]
+        self.updated_at = time.monotonic()
+
+    def apply_diff(self, event: dict):
+        self.bid_px, self.bid_qty = _merge_side(self.bid_px, self.bid_qty, event.get("b"), descending=True)
+        self.ask_px, self.ask_qty = _merge_side(self.ask_px, self.ask_qty, event.get("a"), descending=False)
+        self.last_update_id = event["u"]
+        self.updated_at = time.monotonic()
+
+    def best_bid(self) -> Optional[float]:
+        return float(self.bid_px[0]) if len(self.bid_px) else None
+
+    def best_ask(self) -> Optional[float]:
+        return float(self.ask_px[0]) if len(self.ask_px) else None
+
+    def estimate_fill(self, side: str, quantity: float) -> Optional[dict]:
+        """
+        Precio medio, peor precio y deslizamiento (bps respecto al mejor nivel)
+        de una orden MARKET de `quantity`. BUY consume asks; SELL consume bids.
+        """
+        px, qty = (self.ask_px, self.ask_qty) if side == "BUY" else (self.bid_px, self.bid_qty)
+        if not len(px) or quantity <= 0:
+            return None
+        cum = np.cumsum(qty)
+        idx = int(np.searchsorted(cum, quantity))
+        if idx >= len(px):
+            # No hay profundidad suficiente en el libro local
+            filled = float(cum[-1])
+            cost = float(np.dot(px, qty))
+            worst = float(px[-1])
+        else:
+            before = float(cum[idx - 1]) if idx else 0.0
+            cost = float(np.dot(px[:idx], qty[:idx])) + (quantity - before) * float(px[idx])
+            filled = quantity
+            worst = float(px[idx])
+        best = float(px[0])
+        avg = cost / filled
+        slippage = (avg / best - 1) if side == "BUY" else (1 - avg / best)
+        return {
+            "symbol": self.symbol,
+            "side": side,
+            "quantity": quantity,
+            "filled": filled,
+            "complete": filled >= quantity,
+            "best_price": best,
+            "avg_price": avg,
+            "worst_price": worst,
+            "slippage_bps": round(slippage * 10_000, 3),
+            "levels": min(idx + 1, len(px)),
+        }
+
+    def summary(self) -> dict:
+        return {
+            "ready": self.ready,
+            "last_update_id": self.last_update_id,
+            "bids": len(self.bid_px),
+            "asks": len(self.ask_px),
+            "best_bid": self.best_bid(),
+            "best_ask": self.best_ask(),
+            "age_secs": round(time.monotonic() - self.updated_at, 3) if self.updated_at else None,
+            "resyncs": self.resyncs,
+        }
+
+
+# SYMBOL → libro
+order_books: Dict[str, L2Book] = {}
+_book_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def _fetch_snapshot(symbol: str) -> dict:
+    response = await binance_request("GET", "/api/v3/depth", params={"symbol": symbol, "limit": min(ORDER_BOOK_LEVELS, 5000)})
+    response.raise_for_status()
+    return response.json()
+
+
+async def _maintain_book(book: L2Book, queue: asyncio.Queue):
+    """
+    Sincronización de Binance:
+      1. El stream ya está abierto y encolando eventos.
+      2. Snapshot REST → lastUpdateId.
+      3. Descartar eventos con u <= lastUpdateId.
+      4. El primer evento aplicado debe cumplir U <= lastUpdateId + 1 <= u.
+      5. Después, cada U debe ser el u anterior + 1; si no, volver a 2.
+    """
+    while True:
+        book.ready = False
+        try:
+            book.load_snapshot(await _fetch_snapshot(book.symbol))
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Snapshot de profundidad de {book.symbol} falló: {e}")
+            await asyncio.sleep(5)
+            continue
+
+        while True:
+            event = await queue.get()
+            if event["u"] <= book.last_update_id:
+                continue
+            expected = book.last_update_id + 1
+            if not book.ready:
+                if event["U"] > expected:
+                    break  # snapshot más viejo que el stream: pedir otro
+                book.ready = True
+            elif event["U"] != expected:
+                break  # hueco en la secuencia (p.ej. reconexión del stream)
+            book.apply_diff(event)
+
+        book.resyncs += 1
+        logger.warning(f"⚠️ Libro {book.symbol} desincronizado, re-sincronizando")
+
+
+def ensure_order_book(symbol: str) -> L2Book:
+    """Arranca (una vez) el libro local del símbolo y lo devuelve."""
+    symbol = symbol.upper()
+    book = order_books.get(symbol)
+    if book is not None:
+        return book
+    book = order_books[symbol] = L2Book(symbol)
+    queue: asyncio.Queue = asyncio.Queue()
+    stream = f"{symbol.lower()}@depth@100ms"
+    subscribe_stream(stream, queue.put_nowait)
+    task = asyncio.create_task(_maintain_book(book, queue))
+    task.add_done_callback(lambda _: unsubscribe_stream(stream, queue.put_nowait))
+    _book_tasks[symbol] = task
+    return book
+
+
+def stop_order_book(symbol: str):
+    symbol = symbol.upper()
+    task = _book_tasks.pop(symbol, None)
+    if task:
+        task.cancel()
+    order_books.pop(symbol, None)
+
+
+async def start_order_books():
+    """Lifespan: libros de los símbolos operados (TRADED_SYMBOLS)."""
+    for symbol in TRADED_SYMBOLS:
+        ensure_order_book(symbol)
+
+
+async def close_order_books():
+    for symbol in list(_book_tasks):
+        stop_order_book(symbol)
+
+
+def estimate_fill(symbol: str, side: str, quantity: float) -> Optional[dict]:
+    """Estimación con el libro local; None si no hay libro sincronizado y reciente."""
+    book = order_books.get(symbol.upper())
+    if book is None or not book.ready or time.monotonic() - book.updated_at > ORDER_BOOK_MAX_AGE_SECS:
+        return None
+    return book.estimate_fill(side, float(quantity))
+
+
+async def apply_slippage_policy(params: dict) -> Optional[dict]:
+    """
+    Antes de enviar una orden MARKET: estima el deslizamiento con el libro
+    local, avisa si supera SLIPPAGE_WARN_BPS y, con SLIPPAGE_IOC_BPS > 0, la
+    convierte en LIMIT IOC con precio tope para no barrer el libro.
+    """
+    symbol, side = params["symbol"], params["side"]
+    ensure_order_book(symbol)
+    estimate = estimate_fill(symbol, side, float(params["quantity"]))
+    if estimate is None:
+        return None
+
+    slippage = estimate["slippage_bps"]
+    if slippage > SLIPPAGE_WARN_BPS or not estimate["complete"]:
+        logger.warning(
+            f"⚠️ Deslizamiento estimado {side} {symbol}: {slippage} bps "
+            f"(medio {estimate['avg_price']}, mejor {estimate['best_price']}, niveles {estimate['levels']})"
+        )
+    if SLIPPAGE_IOC_BPS > 0 and (slippage > SLIPPAGE_IOC_BPS or not estimate["complete"]):
+        factor = 1 + SLIPPAGE_IOC_BPS / 10_000 if side == "BUY" else 1 - SLIPPAGE_IOC_BPS / 10_000
+        limit = round_price(await get_symbol_rules(symbol), Decimal(str(estimate["best_price"])) * Decimal(str(factor)))
+        params.update({"type": "LIMIT", "timeInForce": "IOC", "price": format_decimal(limit)})
+        logger.warning(f"🛡️ {side} {symbol} pasa a LIMIT IOC @ {params['price']}")
+    return estimate
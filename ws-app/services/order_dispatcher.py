@@ -0,0 +1,209 @@
+# services/order_dispatcher.py
+#
+# Despachador de órdenes por posición (user_id, symbol):
+#   • Serializa las órdenes de una misma posición con un lock; posiciones
+#     distintas siguen siendo totalmente concurrentes.
+#   • Intenciones duplicadas (misma posición y lado) que llegan mientras hay
+#     una orden en vuelo esperan y reciben ese mismo resultado, sin reenviar.
+#   • Cada intención lleva un newClientOrderId determinista: reintentarla no
+#     duplica la orden y, si el estado queda desconocido (timeout/5xx), se
+#     consulta la orden por ese id en lugar de volver a enviarla.
+#   • El id se reserva en Redis (SET NX) antes de enviar y el resultado final
+#     queda guardado ORDER_COMPLETED_TTL_SECS: Binance solo rechaza un
+#     newClientOrderId repetido mientras la orden sigue abierta, así que una
+#     MARKET ya ejecutada no se reenvía desde otro worker ni tras reiniciar.
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+from redis.exceptions import RedisError
+
+from services.binance_api import close_market_order, place_market_order, query_order
+from services.order_transport import OrderRejected, OrderStatusUnknown
+from utils.metrics import observe_latency
+from utils.redis_utils import async_redis_client
+
+logger = logging.getLogger("binance_ws")
+
+RECONCILE_ATTEMPTS = 5
+RECONCILE_DELAY_SECS = 0.5
+COMPLETED_CACHE_SIZE = 1000
+DUPLICATE_ORDER_CODE = -2010
+# Reserva del id mientras la orden está en vuelo (expira si el proceso muere)
+ORDER_CLAIM_TTL_SECS = int(os.getenv("ORDER_CLAIM_TTL_SECS", 60))
+# Resultado final (o estado desconocido) de un id ya enviado
+ORDER_COMPLETED_TTL_SECS = int(os.getenv("ORDER_COMPLETED_TTL_SECS", 7 * 24 * 3600))
+
+# Valores de order_intent:{clientOrderId} mientras no hay resultado final
+_CLAIM_PENDING = "PENDING"    # en vuelo en algún proceso
+_CLAIM_UNKNOWN = "UNKNOWN"    # enviada sin confirmar: se consulta, nunca se reenvía
+
+# (user_id, SYMBOL) → lock que serializa las órdenes de la posición
+_position_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+# (user_id, SYMBOL, side) → resultado de la orden en vuelo
+_inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+# clientOrderId → resultado final (intenciones repetidas tras completar)
+_completed: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def client_order_id(user_id, symbol: str, side: str, intent: str) -> str:
+    """Id determinista (≤ 36 caracteres [A-Za-z0-9_-]) de una intención de orden."""
+    digest = hashlib.sha1(f"{user_id}:{symbol.upper()}:{side}:{intent}".encode()).hexdigest()
+    return f"cx{side[0]}_{digest[:32]}"
+
+
+def position_intent(config: dict) -> str:
+    """
+    Intención de cierre: la compra que abrió la posición (mismo id para todos
+    los llamadores). Vacía si la config no la identifica: dispatch_order no la envía.
+    """
+    binance = config.get("binance") or {}
+    return str(binance.get("orderId") or config.get("activated_at") or config.get("entry_point") or "")
+
+
+def _intent_key(cid: str) -> str:
+    return f"order_intent:{cid}"
+
+
+def _remember(cid: str, result: dict):
+    _completed[cid] = result
+    _completed.move_to_end(cid)
+    while len(_completed) > COMPLETED_CACHE_SIZE:
+        _completed.popitem(last=False)
+
+
+async def _claim(cid: str) -> Tuple[bool, Optional[str]]:
+    """(True, None) si este proceso reserva el id; si no, (False, valor guardado)."""
+    key = _intent_key(cid)
+    if await async_redis_client.set(key, _CLAIM_PENDING, nx=True, ex=ORDER_CLAIM_TTL_SECS):
+        return True, None
+    return False, await async_redis_client.get(key)
+
+
+async def _record(cid: str, result: dict, was_unknown: bool):
+    """Guarda el desenlace del id: resultado final, desconocido o liberado para reintentar."""
+    key = _intent_key(cid)
+    status = result.get("status")
+    try:
+        if status == "UNKNOWN":
+            await async_redis_client.set(key, _CLAIM_UNKNOWN, ex=ORDER_COMPLETED_TTL_SECS)
+        elif status == "ERROR":
+            # Rechazada o no recibida por Binance: un reintento puede volver a enviarla
+            await async_redis_client.delete(key)
+        else:
+            await async_redis_client.set(key, json.dumps(result), ex=ORDER_COMPLETED_TTL_SECS)
+    except RedisError as e:
+        logger.error(f"❌ No se pudo guardar el desenlace de la orden {cid}: {e}")
+    if status not in ("ERROR", "UNKNOWN"):
+        _remember(cid, result)
+    elif was_unknown and status == "ERROR":
+        logger.info(f"🔎 Orden {cid} no encontrada en Binance: se libera para reintentar")
+
+
+async def _reconcile(symbol: str, cid: str, result: dict) -> dict:
+    """Estado desconocido → consultar la orden por su clientOrderId (nunca reenviar)."""
+    for attempt in range(RECONCILE_ATTEMPTS):
+        await asyncio.sleep(RECONCILE_DELAY_SECS * (attempt + 1))
+        try:
+            order = await query_order(symbol, cid)
+        except (httpx.HTTPError, ValueError, OrderStatusUnknown, OrderRejected) as e:
+            # WS-API sin respuesta o rechazo de la consulta: se reintenta en la siguiente vuelta
+            logger.warning(f"⚠️ Consulta de la orden {cid} falló: {e}")
+            continue
+        if order.get("status") == "NOT_FOUND":
+            # Binance no la recibió: es seguro informar el fallo (el llamador decide reintentar)
+            return {"status": "ERROR", "message": "Orden no recibida por Binance", "clientOrderId": cid}
+        logger.info(f"🔎 Orden {cid} reconciliada: {order.get('status')}")
+        return order
+    return result
+
+
+async def _send(user_id: str, symbol: str, side: str, cid: str, send: Callable[[str], Awaitable[dict]]) -> dict:
+    cached = _completed.get(cid)
+    if cached is not None:
+        logger.info(f"♻️ Intención repetida {cid}: se devuelve el resultado anterior")
+        return cached
+
+    try:
+        claimed, stored = await _claim(cid)
+    except RedisError as e:
+        # Sin la reserva no se puede garantizar que no se envió ya: no se envía
+        logger.error(f"❌ Redis no disponible para reservar la orden {cid}: {e}")
+        return {"status": "ERROR", "message": f"No se pudo reservar la orden: {e}", "clientOrderId": cid}
+
+    if not claimed:
+        if stored not in (None, _CLAIM_PENDING, _CLAIM_UNKNOWN):
+            logger.info(f"♻️ Intención {cid} ya completada: se devuelve el resultado guardado")
+            result = json.loads(stored)
+            _remember(cid, result)
+            return result
+        # En vuelo en otro proceso o enviada sin confirmar: se consulta, nunca se reenvía
+        pending = {"status": "UNKNOWN", "message": "Orden en curso o sin confirmar", "clientOrderId": cid}
+        result = await _reconcile(symbol, cid, pending)
+        if stored == _CLAIM_UNKNOWN or result.get("status") != "ERROR":
+            await _record(cid, result, was_unknown=True)
+        else:
+            # NOT_FOUND con la reserva de otro proceso aún vigente: puede estar enviándola
+            result = {"status": "ERROR", "message": "Orden en curso en otro proceso", "clientOrderId": cid}
+        return result
+
+    result = await send(cid)
+    duplicate = result.get("code") == DUPLICATE_ORDER_CODE and "Duplicate" in result.get("message", "")
+    was_unknown = result.get("status") == "UNKNOWN" or duplicate
+    if was_unknown:
+        result = await _reconcile(symbol, cid, result)
+    await _record(cid, result, was_unknown)
+    return result
+
+
+async def dispatch_order(user_id, symbol: str, side: str, intent: str, send: Callable[[str], Awaitable[dict]]) -> dict:
+    """
+    Envía la orden `send(client_order_id)` de la posición (user_id, symbol)
+    serializada, colapsando duplicados en vuelo del mismo lado.
+    """
+    user_id, symbol = str(user_id), symbol.upper()
+    if not intent:
+        # Sin intención todas las órdenes compartirían el mismo clientOrderId
+        logger.error(f"❌ {side} {symbol} ({user_id}) sin intención identificable: no se envía")
+        return {"status": "ERROR", "message": "Orden sin intención identificable (orderId/activated_at/entry_point)"}
+    inflight_key = (user_id, symbol, side)
+
+    inflight = _inflight.get(inflight_key)
+    if inflight is not None:
+        logger.info(f"🔁 {side} {symbol} ({user_id}) ya en vuelo: se espera su resultado")
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[inflight_key] = future
+    cid = client_order_id(user_id, symbol, side, intent)
+    started = asyncio.get_running_loop().time()
+    try:
+        lock = _position_locks.setdefault((user_id, symbol), asyncio.Lock())
+        async with lock:
+            result = await _send(user_id, symbol, side, cid, send)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # evita el aviso si nadie más la esperaba
+        raise
+    finally:
+        _inflight.pop(inflight_key, None)
+        observe_latency(f"order_dispatch.{side.lower()}", asyncio.get_running_loop().time() - started)
+
+
+async def submit_buy(user_id, symbol: str, intent: str) -> dict:
+    return await dispatch_order(user_id, symbol, "BUY", intent, lambda cid: place_market_order(symbol, cid))
+
+
+async def submit_sell(user_id, symbol: str, intent: str) -> dict:
+    return await dispatch_order(user_id, symbol, "SELL", intent, lambda cid: close_market_order(symbol, cid))
@@ -0,0 +1,194 @@
+# services/order_flow.py
+#
+# Flujo de órdenes en vivo desde `<symbol>@aggTrade`: CVD acumulado, volumen
+# comprador/vendedor (agresor) y número de trades por símbolo, agregados en
+# buffers circulares por temporalidad (1m, 15m, 1h). Cada bucket ocupa memoria
+# fija, así que alertas, el feed de Socket.IO y el agente leen el order flow
+# localmente en lugar de reconstruirlo con klines REST
+# (2 * taker_buy_vol - total_vol).
+
+import logging
+import time
+from typing import Dict, List, Optional
+
+from services.market_streams import subscribe_stream, unsubscribe_stream
+
+logger = logging.getLogger("binance_ws")
+
+# temporalidad → (duración del bucket en ms, buckets guardados)
+TIMEFRAMES = {
+    "1m": (60_000, 180),       # 3 h
+    "15m": (900_000, 96),      # 24 h
+    "1h": (3_600_000, 168),    # 7 días
+}
+
+
+class FlowRing:
+    """
+    Buffer circular de buckets. Se usan listas de Python (no NumPy) porque cada
+    trade actualiza escalares sueltos; el índice es bucket % size.
+    """
+    __slots__ = ("bucket_ms", "size", "start", "buy", "sell", "trades", "cvd")
+
+    def __init__(self, bucket_ms: int, size: int):
+        self.bucket_ms = bucket_ms
+        self.size = size
+        self.start = [-1] * size    # número de bucket guardado en cada posición
+        self.buy = [0.0] * size     # volumen comprador agresor (base)
+        self.sell = [0.0] * size    # volumen vendedor agresor (base)
+        self.trades = [0] * size
+        self.cvd = [0.0] * size     # CVD al cierre del bucket
+
+    def add(self, ts_ms: int, buy_qty: float, sell_qty: float, cvd: float):
+        bucket = ts_ms // self.bucket_ms
+        i = bucket % self.size
+        if self.start[i] != bucket:
+            self.start[i] = bucket
+            self.buy[i] = self.sell[i] = 0.0
+            self.trades[i] = 0
+        self.buy[i] += buy_qty
+        self.sell[i] += sell_qty
+        self.trades[i] += 1
+        self.cvd[i] = cvd
+
+    def buckets(self, count: int, now_ms: int) -> List[dict]:
+        """Últimos `count` buckets hasta el actual (los vacíos arrastran el CVD anterior)."""
+        current = now_ms // self.bucket_ms
+        count = min(count, self.size)
+        result = []
+        last_cvd = None
+        for bucket in range(current - count + 1, current + 1):
+            i = bucket % self.size
+            if self.start[i] == bucket:
+                last_cvd = self.cvd[i]
+                result.append({
+                    "t": bucket * self.bucket_ms,
+                    "buy": round(self.buy[i], 8),
+                    "sell": round(self.sell[i], 8),
+                    "delta": round(self.buy[i] - self.sell[i], 8),
+                    "cvd": round(self.cvd[i], 8),
+                    "trades": self.trades[i],
+                })
+            else:
+                result.append({"t": bucket * self.bucket_ms, "buy": 0.0, "sell": 0.0, "delta": 0.0,
+                               "cvd": None if last_cvd is None else round(last_cvd, 8), "trades": 0})
+        return result
+
+
+class SymbolFlow:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.cvd = 0.0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.trades = 0
+        self.started_at = int(time.time() * 1000)
+        self.last_trade_at = 0
+        self.last_agg_id = -1
+        self.rings = {tf: FlowRing(ms, size) for tf, (ms, size) in TIMEFRAMES.items()}
+
+    def on_trade(self, msg: dict):
+        agg_id = msg.get("a", 0)
+        if agg_id <= self.last_agg_id:
+            return  # repetido tras reconexión
+        self.last_agg_id = agg_id
+        qty = float(msg["q"])
+        # m = True → el comprador es maker → el agresor vende
+        if msg.get("m"):
+            buy, sell = 0.0, qty
+        else:
+            buy, sell = qty, 0.0
+        self.cvd += buy - sell
+        self.buy_volume += buy
+        self.sell_volume += sell
+        self.trades += 1
+        ts = msg.get("T") or msg.get("E") or int(time.time() * 1000)
+        self.last_trade_at = ts
+        for ring in self.rings.values():
+            ring.add(ts, buy, sell, self.cvd)
+
+    def window(self, timeframe: str, count: int) -> Optional[dict]:
+        """
+        Agregado de los últimos `count` buckets; None si el ingestor aún no
+        cubre toda la ventana (arrancó después de su inicio).
+        """
+        bucket_ms, _ = TIMEFRAMES[timeframe]
+        now = int(time.time() * 1000)
+        window_start = (now // bucket_ms - count + 1) * bucket_ms
+        if self.started_at > window_start:
+            return None
+        buckets = self.rings[timeframe].buckets(count, now)
+        buy = sum(b["buy"] for b in buckets)
+        sell = sum(b["sell"] for b in buckets)
+        return {
+            "timeframe": timeframe,
+            "buckets": count,
+            "buy": round(buy, 8),
+            "sell": round(sell, 8),
+            "cvd_delta": round(buy - sell, 8),
+            "trades": sum(b["trades"] for b in buckets),
+        }
+
+    def snapshot(self, count: int = 1) -> dict:
+        now = int(time.time() * 1000)
+        return {
+            "symbol": self.symbol,
+            "cvd": round(self.cvd, 8),
+            "buy_volume": round(self.buy_volume, 8),
+            "sell_volume": round(self.sell_volume, 8),
+            "trades": self.trades,
+            "since": self.started_at,
+            "last_trade_at": self.last_trade_at,
+            **{tf: ring.buckets(count, now) for tf, ring in self.rings.items()},
+        }
+
+
+# SYMBOL → flujo; SYMBOL → número de consumidores
+order_flows: Dict[str, SymbolFlow] = {}
+_refcounts: Dict[str, int] = {}
+
+
+def start_order_flow(symbol: str) -> SymbolFlow:
+    """Suscribe (con conteo de referencias) el ingestor aggTrade del símbolo."""
+    symbol = symbol.upper()
+    _refcounts[symbol] = _refcounts.get(symbol, 0) + 1
+    flow = order_flows.get(symbol)
+    if flow is None:
+        flow = order_flows[symbol] = SymbolFlow(symbol)
+        subscribe_stream(f"{symbol.lower()}@aggTrade", flow.on_trade)
+    return flow
+
+
+def release_order_flow(symbol: str):
+    symbol = symbol.upper()
+    count = _refcounts.get(symbol, 0) - 1
+    if count > 0:
+        _refcounts[symbol] = count
+        return
+    _refcounts.pop(symbol, None)
+    flow = order_flows.pop(symbol, None)
+    if flow is not None:
+        unsubscribe_stream(f"{symbol.lower()}@aggTrade", flow.on_trade)
+
+
+def get_order_flow(symbol: str) -> Optional[SymbolFlow]:
+    return order_flows.get(symbol.upper())
+
+
+def flow_snapshot(symbol: str, count: int = 1) -> Optional[dict]:
+    flow = get_order_flow(symbol)
+    return flow.snapshot(count) if flow else None
+
+
+def flow_window(symbol: str, timeframe: str, count: int) -> Optional[dict]:
+    flow = get_order_flow(symbol)
+    return flow.window(timeframe, count) if flow else None
+
+
+def flow_summary_text(symbol: str) -> str:
+    """Línea corta para mensajes de alerta; vacía si no hay datos locales."""
+    flow = get_order_flow(symbol)
+    if flow is None or not flow.trades:
+        return ""
+    last_15m = flow.rings["15m"].buckets(1, int(time.time() * 1000))[0]
+    return f"Delta 15m: {last_15m['delta']} | CVD: {round(flow.cvd, 4)}"
@@ -0,0 +1,214 @@
+# services/order_transport.py
+#
+# Transporte de órdenes. Con ORDER_TRANSPORT=ws las órdenes viajan por una
+# sesión persistente de la WebSocket API de Binance (`order.place` con id de
+# petición) en lugar de un POST REST por orden; si la sesión no está
+# conectada, se usa REST. place_market_order / close_market_order no cambian:
+# solo llaman a place_order() / query_order().
+#
+# Errores:
+#   • OrderRejected      → Binance rechazó la orden (no se ejecutó)
+#   • OrderStatusUnknown → enviada sin respuesta (timeout/desconexión/5xx):
+#                          hay que consultarla, nunca reenviarla
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+import websockets
+
+from services.binance_auth import (
+    RECV_WINDOW_MS, TIMESTAMP_ERROR_CODE, encode_params, get_signer, get_timestamp, signed_request, sync_time,
+)
+from services.binance_http import BINANCE_API_KEY, WS_API_URL
+from utils.metrics import mark_stage, observe_latency
+
+logger = logging.getLogger("binance_ws")
+
+ORDER_TRANSPORT = os.getenv("ORDER_TRANSPORT", "rest").lower()  # rest | ws
+WS_API_TIMEOUT_SECS = float(os.getenv("WS_API_TIMEOUT_SECS", 5))
+WS_API_PING_SECS = float(os.getenv("WS_API_PING_SECS", 20))
+ORDER_NOT_FOUND_CODE = -2013
+
+
+class OrderRejected(Exception):
+    def __init__(self, code, msg: str):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+
+
+class OrderStatusUnknown(Exception):
+    pass
+
+
+class WsApiUnavailable(Exception):
+    """La petición no llegó a enviarse: es seguro usar REST."""
+
+
+class WsApiSession:
+    """Sesión WS-API persistente con correlación por id, heartbeats y reconexión."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._ws = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._next_id = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._ws is not None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+
+    def _fail_pending(self, error: Exception):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                # ping_interval/ping_timeout: heartbeat del cliente; cierra conexiones muertas
+                async with websockets.connect(self.url, ping_interval=WS_API_PING_SECS, ping_timeout=WS_API_PING_SECS) as ws:
+                    self._ws = ws
+                    delay = 1
+                    logger.info(f"✅ Sesión WS-API de órdenes conectada: {self.url}")
+                    async for raw in ws:
+                        message = json.loads(raw)
+                        future = self._pending.pop(str(message.get("id")), None)
+                        if future is not None and not future.done():
+                            future.set_result(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Sesión WS-API caída: {e}")
+            finally:
+                self._ws = None
+                self._fail_pending(OrderStatusUnknown("Conexión WS-API cerrada con la petición en vuelo"))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def request(self, method: str, params: dict, timeout: float = WS_API_TIMEOUT_SECS) -> dict:
+        ws = self._ws
+        if ws is None:
+            raise WsApiUnavailable("Sesión WS-API no conectada")
+        self._next_id += 1
+        request_id = str(self._next_id)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await ws.send(json.dumps({"id": request_id, "method": method, "params": params}))
+        except websockets.ConnectionClosed as e:
+            self._pending.pop(request_id, None)
+            raise WsApiUnavailable(str(e))
+        # Frame escrito: desde aquí la etapa siguiente (response) es la espera a Binance
+        mark_stage("http_sent")
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(request_id, None)
+            raise OrderStatusUnknown(f"Sin respuesta de {method} en {timeout}s")
+
+
+_session: Optional[WsApiSession] = None
+
+
+def get_ws_session() -> WsApiSession:
+    global _session
+    if _session is None:
+        _session = WsApiSession(WS_API_URL)
+    return _session
+
+
+async def start_order_transport():
+    if ORDER_TRANSPORT == "ws":
+        get_ws_session().start()
+
+
+async def close_order_transport():
+    if _session is not None:
+        await _session.close()
+
+
+def _signed_ws_params(params: dict) -> dict:
+    """La WS-API firma los parámetros ordenados alfabéticamente, con apiKey incluido."""
+    payload = dict(params)
+    payload["apiKey"] = BINANCE_API_KEY
+    payload["timestamp"] = get_timestamp()
+    payload.setdefault("recvWindow", RECV_WINDOW_MS)
+    payload = dict(sorted(payload.items()))
+    payload["signature"] = get_signer().signature(encode_params(payload))
+    return payload
+
+
+async def _ws_call(method: str, params: dict) -> dict:
+    session = get_ws_session()
+    for attempt in range(2):
+        payload = _signed_ws_params(params)
+        mark_stage("signed")
+        started = asyncio.get_running_loop().time()
+        message = await session.request(method, payload)
+        observe_latency(f"ws_api.{method}", asyncio.get_running_loop().time() - started)
+        status = message.get("status")
+        if status == 200:
+            return message["result"]
+        error = message.get("error") or {}
+        if attempt == 0 and error.get("code") == TIMESTAMP_ERROR_CODE:
+            logger.warning(f"⚠️ WS-API rechazó el timestamp ({method}), resincronizando reloj")
+            await sync_time()
+            continue
+        if status is None or status >= 500:
+            raise OrderStatusUnknown(error.get("msg", f"status {status}"))
+        raise OrderRejected(error.get("code"), error.get("msg", ""))
+
+
+async def _rest_place(params: dict) -> dict:
+    response = await signed_request("POST", "/api/v3/order", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+async def place_order(params: dict) -> dict:
+    """Envía la orden por el transporte configurado (WS-API con respaldo REST)."""
+    if ORDER_TRANSPORT == "ws":
+        try:
+            return await _ws_call("order.place", params)
+        except WsApiUnavailable as e:
+            logger.warning(f"⚠️ WS-API no disponible ({e}), orden por REST")
+    return await _rest_place(params)
+
+
+async def query_order(symbol: str, client_order_id: str) -> dict:
+    """Estado de una orden por su clientOrderId; {"status": "NOT_FOUND"} si no existe."""
+    params = {"symbol": symbol, "origClientOrderId": client_order_id}
+    if ORDER_TRANSPORT == "ws":
+        try:
+            return await _ws_call("order.status", params)
+        except (WsApiUnavailable, OrderStatusUnknown) as e:
+            # Consultar es idempotente: sin respuesta por WS-API se pregunta por REST
+            logger.warning(f"⚠️ order.status sin respuesta por WS-API ({e}), consulta por REST")
+        except OrderRejected as e:
+            if e.code == ORDER_NOT_FOUND_CODE:
+                return {"status": "NOT_FOUND", "clientOrderId": client_order_id}
+            raise
+    response = await signed_request("GET", "/api/v3/order", params=params)
+    if response.status_code == 400 and response.json().get("code") == ORDER_NOT_FOUND_CODE:
+        return {"status": "NOT_FOUND", "clientOrderId": client_order_id}
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,211 @@
+# services/positions.py
+#
+# Propiedad de las posiciones por (user_id, symbol), no por sid.
+#   • Un único actor de evaluación por posición, aunque el usuario tenga varias
+#     pestañas abiertas. Los sockets solo se adjuntan como observadores (room
+#     de Socket.IO) y reciben los eventos de la posición.
+#   • Entre varios procesos worker, el único dueño se garantiza con un lease
+#     en Redis (SET NX PX + renovación periódica).
+#   • Los observadores de todos los workers se apuntan en un set de Redis: el
+#     actor se detiene cuando ya no queda ninguno en ningún proceso (se revisa
+#     al soltar el último socket local y en cada renovación del lease).
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Dict, Set, Tuple
+
+import redis
+
+from shared.socket_context import sio
+from utils.redis_utils import async_redis_client
+
+logger = logging.getLogger("binance_ws")
+
+LEASE_TTL_MS = int(os.getenv("POSITION_LEASE_TTL_MS", 30000))
+LEASE_RENEW_SECS = LEASE_TTL_MS / 1000 / 3
+# Los sets de observadores caducan si ningún socket se adjunta en este tiempo
+# (limpia los sids de un worker que murió sin soltarlos)
+OBSERVERS_TTL_SECS = int(os.getenv("POSITION_OBSERVERS_TTL_SECS", 24 * 3600))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# (user_id, SYMBOL) → tarea del actor
+position_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+# (user_id, SYMBOL) → sids observando la posición
+position_observers: Dict[Tuple[str, str], Set[str]] = {}
+# Activaciones en curso, para no evaluar dos veces la misma posición a la vez
+_activation_inflight: Set[Tuple[str, str]] = set()
+
+# Renovar / liberar solo si el lease sigue siendo nuestro
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def position_key(user_id, symbol: str) -> Tuple[str, str]:
+    return (str(user_id), symbol.upper())
+
+
+def position_room(user_id, symbol: str) -> str:
+    """Room de Socket.IO de la posición; sirve como destino `to=` en sio.emit."""
+    return f"position:{symbol.upper()}:{user_id}"
+
+
+def _lease_key(user_id, symbol: str) -> str:
+    return f"{symbol.upper()}_position_lease_{user_id}"
+
+
+def _observers_key(user_id, symbol: str) -> str:
+    return f"{symbol.upper()}_position_observers_{user_id}"
+
+
+def _observer_member(sid: str) -> str:
+    return f"{WORKER_ID}:{sid}"
+
+
+# ------------------------------------------------------------------
+# Observadores (sockets)
+# ------------------------------------------------------------------
+async def attach_observer(sid: str, user_id, symbol: str):
+    key = position_key(user_id, symbol)
+    position_observers.setdefault(key, set()).add(sid)
+    await sio.enter_room(sid, position_room(user_id, symbol))
+    try:
+        observers = _observers_key(user_id, symbol)
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.sadd(observers, _observer_member(sid))
+            pipe.expire(observers, OBSERVERS_TTL_SECS)
+            await pipe.execute()
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Redis error registrando observador de {key}: {e}")
+
+
+async def _global_observers(user_id, symbol: str) -> int:
+    """Observadores de la posición en todos los workers."""
+    return await async_redis_client.scard(_observers_key(user_id, symbol))
+
+
+async def detach_observer(sid: str):
+    """
+    Quita el sid de todas las posiciones que observaba. Si una posición se
+    queda sin observadores en ningún worker se detiene su actor, igual que
+    antes se cancelaba la evaluación al desconectarse el cliente.
+    """
+    for key in [k for k, sids in position_observers.items() if sid in sids]:
+        sids = position_observers[key]
+        sids.discard(sid)
+        if not sids:
+            del position_observers[key]
+        remaining = len(sids)
+        try:
+            await async_redis_client.srem(_observers_key(*key), _observer_member(sid))
+            remaining = await _global_observers(*key)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis error quitando observador de {key}: {e}")
+        if not remaining and key in position_tasks:
+            logger.info(f"🛑 Sin observadores, deteniendo actor de {key}")
+            stop_position_actor(*key)
+
+
+# ------------------------------------------------------------------
+# Activación (una a la vez por posición)
+# ------------------------------------------------------------------
+def has_position_actor(user_id, symbol: str) -> bool:
+    task = position_tasks.get(position_key(user_id, symbol))
+    return task is not None and not task.done()
+
+
+def begin_activation(user_id, symbol: str) -> bool:
+    """False si ya hay un actor o una activación en curso para la posición."""
+    key = position_key(user_id, symbol)
+    if key in _activation_inflight or has_position_actor(user_id, symbol):
+        return False
+    _activation_inflight.add(key)
+    return True
+
+
+def end_activation(user_id, symbol: str):
+    _activation_inflight.discard(position_key(user_id, symbol))
+
+
+# ------------------------------------------------------------------
+# Actor + lease
+# ------------------------------------------------------------------
+async def _acquire_lease(user_id, symbol: str) -> bool:
+    lease = _lease_key(user_id, symbol)
+    if await async_redis_client.set(lease, WORKER_ID, nx=True, px=LEASE_TTL_MS):
+        return True
+    # Ya es nuestro (p.ej. un actor anterior de este proceso terminó sin liberar)
+    return await async_redis_client.get(lease) == WORKER_ID
+
+
+async def _run_actor(key: Tuple[str, str], coro):
+    user_id, symbol = key
+    lease = _lease_key(user_id, symbol)
+    work = asyncio.ensure_future(coro)
+    try:
+        while not work.done():
+            done, _ = await asyncio.wait({work}, timeout=LEASE_RENEW_SECS)
+            if done:
+                break
+            try:
+                renewed = await async_redis_client.eval(_RENEW_LUA, 1, lease, WORKER_ID, LEASE_TTL_MS)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Redis error renovando lease {lease}: {e}")
+                continue  # reintentamos en el siguiente ciclo mientras no expire
+            if not renewed:
+                logger.warning(f"⚠️ Lease perdido para {key}, otro worker es el dueño")
+                break
+            # El último observador pudo soltarse en otro worker
+            try:
+                if not await _global_observers(user_id, symbol):
+                    logger.info(f"🛑 Sin observadores en ningún worker, deteniendo actor de {key}")
+                    break
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Redis error contando observadores de {key}: {e}")
+    finally:
+        if not work.done():
+            work.cancel()
+        try:
+            await async_redis_client.eval(_RELEASE_LUA, 1, lease, WORKER_ID)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis error liberando lease {lease}: {e}")
+        if position_tasks.get(key) is asyncio.current_task():
+            del position_tasks[key]
+
+
+async def start_position_actor(user_id, symbol: str, coro_factory) -> bool:
+    """
+    Arranca el actor de la posición si no existe y este proceso consigue el
+    lease. `coro_factory()` crea la corrutina de evaluación (solo se llama si
+    arrancamos). Devuelve True si la posición queda con actor en este proceso.
+    """
+    key = position_key(user_id, symbol)
+    if has_position_actor(user_id, symbol):
+        return True
+    try:
+        if not await _acquire_lease(user_id, symbol):
+            logger.info(f"🔒 Posición {key} pertenece a otro worker")
+            return False
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Redis error adquiriendo lease de {key}: {e}")
+        return False
+    position_tasks[key] = asyncio.create_task(_run_actor(key, coro_factory()))
+    return True
+
+
+def stop_position_actor(user_id, symbol: str):
+    task = position_tasks.pop(position_key(user_id, symbol), None)
+    if task:
+        task.cancel()
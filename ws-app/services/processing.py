@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 
 import logging
 from utils.redis_utils import calcular_y_guardar_rsi, detectar_y_enviar_alertas
+from shared.indicator_state import set_latest_indicators
 
 load_dotenv()
 REDIS_URL = os.getenv("REDIS_URL")
@@ -51,6 +52,7 @@ async def handle_kline_processing(symbol, sid, user_id, kline_data, config, sio)
             indicators = await asyncio.to_thread(calcular_y_guardar_rsi, symbol, redis_client, sid)
             
             if indicators:
+                set_latest_indicators(symbol_upper, indicators)
                 await detectar_y_enviar_alertas(symbol, indicators, redis_client, sid)
                 
             await sio.emit("operation_executed", config, to=sid)
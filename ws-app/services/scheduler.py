@@ -0,0 +1,169 @@
+# services/scheduler.py
+#
+# Planificador central para trabajo periódico por posición.
+# En lugar de un `while True: ...; await asyncio.sleep(10)` por posición, un
+# único loop mantiene un heap de vencimientos cuantizados a ticks de
+# `resolution` segundos. En cada tick se sacan TODOS los jobs vencidos, se
+# agrupan por grupo y cada grupo se procesa en un solo lote (p.ej. para
+# leer de Redis con un único pipeline).
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Dict, List, Set
+
+from utils.metrics import observe_latency
+
+logger = logging.getLogger("binance_ws")
+
+
+class PeriodicScheduler:
+    def __init__(self, resolution: float = 0.5):
+        self.resolution = resolution
+        self._heap = []                 # (due_tick, seq, job_id, generation)
+        self._seq = itertools.count()
+        self.jobs: Dict[str, dict] = {}
+        self.group_handlers: Dict[str, Callable[[List[dict]], Awaitable[None]]] = {}
+        self._wakeup = asyncio.Event()
+        # Lotes en curso: referencia fuerte para que no los recolecte el GC
+        self._batches: Set[asyncio.Task] = set()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def register_group(self, group: str, handler: Callable[[List[dict]], Awaitable[None]]):
+        """`handler(jobs)` recibe la lista de jobs del grupo vencidos en el mismo tick."""
+        self.group_handlers[group] = handler
+
+    def schedule(self, job_id: str, group: str, period: float, payload: dict = None, first_delay: float = None):
+        """Crea (o reemplaza) un job periódico. Por defecto corre en el siguiente tick."""
+        job = {
+            "id": job_id,
+            "group": group,
+            "period": period,
+            "payload": payload or {},
+            "generation": 0,
+            "due_tick": 0,
+            "running": False,
+            "runs": 0,
+            "last_lag": 0.0,
+            "max_lag": 0.0,
+        }
+        old = self.jobs.get(job_id)
+        if old:
+            job["generation"] = old["generation"] + 1
+        self.jobs[job_id] = job
+        self._push(job, time.monotonic() + (first_delay or 0))
+
+    def set_period(self, job_id: str, period: float):
+        """Cambia el periodo en caliente; el próximo vencimiento se recalcula ya."""
+        job = self.jobs.get(job_id)
+        if not job:
+            return
+        job["period"] = period
+        job["generation"] += 1
+        self._push(job, time.monotonic() + period)
+
+    def cancel(self, job_id: str):
+        # La entrada del heap queda huérfana y se descarta al salir
+        self.jobs.pop(job_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self.jobs),
+            "lag": {
+                job_id: {
+                    "period": job["period"],
+                    "runs": job["runs"],
+                    "last_lag_ms": round(job["last_lag"] * 1000, 3),
+                    "max_lag_ms": round(job["max_lag"] * 1000, 3),
+                }
+                for job_id, job in self.jobs.items()
+            },
+        }
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+    def _push(self, job: dict, due: float):
+        # Vencimientos cuantizados: jobs con el mismo periodo caen en el mismo tick
+        job["due_tick"] = math.ceil(due / self.resolution)
+        heapq.heappush(self._heap, (job["due_tick"], next(self._seq), job["id"], job["generation"]))
+        self._wakeup.set()
+
+    def _pop_due(self, now: float) -> Dict[str, List[dict]]:
+        batches: Dict[str, List[dict]] = {}
+        now_tick = math.floor(now / self.resolution)
+        while self._heap and self._heap[0][0] <= now_tick:
+            due_tick, _, job_id, generation = heapq.heappop(self._heap)
+            job = self.jobs.get(job_id)
+            if job is None or job["generation"] != generation:
+                continue  # cancelado o reprogramado
+
+            due = due_tick * self.resolution
+            lag = max(now - due, 0.0)
+            job["last_lag"] = lag
+            job["max_lag"] = max(job["max_lag"], lag)
+            observe_latency(f"scheduler.lag.{job['group']}", lag)
+
+            # Siguiente vencimiento anclado al anterior (sin deriva); si vamos
+            # atrasados más de un periodo, saltamos al siguiente tick futuro.
+            next_due = due + job["period"]
+            if next_due <= now:
+                next_due = now + job["period"]
+            self._push(job, next_due)
+
+            if job["running"]:
+                continue  # la ejecución anterior aún no termina
+            batches.setdefault(job["group"], []).append(job)
+        return batches
+
+    async def _run_batch(self, group: str, jobs: List[dict]):
+        handler = self.group_handlers.get(group)
+        if handler is None:
+            logger.warning(f"Scheduler: grupo sin handler '{group}'")
+            return
+        for job in jobs:
+            job["running"] = True
+            job["runs"] += 1
+        start = time.perf_counter()
+        try:
+            await handler(jobs)
+        except Exception as e:
+            logger.error(f"❌ Scheduler: error en lote '{group}': {e}")
+        finally:
+            for job in jobs:
+                job["running"] = False
+            observe_latency(f"scheduler.batch.{group}", time.perf_counter() - start)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._batches.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"❌ Scheduler: lote terminado con error: {task.exception()!r}")
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] * self.resolution - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for group, jobs in self._pop_due(time.monotonic()).items():
+                task = asyncio.create_task(self._run_batch(group, jobs))
+                self._batches.add(task)
+                task.add_done_callback(self._batch_done)
+
+
+# Instancia única del proceso; se arranca en el lifespan de la app
+scheduler = PeriodicScheduler()
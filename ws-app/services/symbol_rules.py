@@ -0,0 +1,142 @@
+# services/symbol_rules.py
+#
+# Caché en memoria de los filtros de exchangeInfo por símbolo (LOT_SIZE,
+# PRICE_FILTER, MIN_NOTIONAL/NOTIONAL y precisión). Se carga al arrancar y se
+# refresca en segundo plano cada SYMBOL_RULES_TTL_SECS, así que ajustar la
+# cantidad o el precio de una orden es una función pura en memoria (Decimal),
+# sin un round trip extra a /api/v3/exchangeInfo delante de cada orden.
+
+import asyncio
+import json
+import logging
+import os
+import time
+from decimal import Decimal, ROUND_DOWN
+from typing import Dict, Optional
+
+import httpx
+
+from services.binance_http import binance_request
+
+logger = logging.getLogger("binance_ws")
+
+SYMBOL_RULES_TTL_SECS = float(os.getenv("SYMBOL_RULES_TTL_SECS", 3600))
+# Lista opcional "BTCUSDT,ETHUSDT"; vacía → todos los símbolos del exchange
+TRADED_SYMBOLS = [s.strip().upper() for s in os.getenv("TRADED_SYMBOLS", "").split(",") if s.strip()]
+
+# SYMBOL → reglas
+symbol_rules: Dict[str, dict] = {}
+_last_refresh = 0.0
+
+
+def _parse_symbol(info: dict) -> dict:
+    rules = {
+        "symbol": info["symbol"],
+        "status": info.get("status"),
+        "base_asset": info.get("baseAsset"),
+        "quote_asset": info.get("quoteAsset"),
+        "base_precision": info.get("baseAssetPrecision"),
+        "quote_precision": info.get("quoteAssetPrecision", info.get("quotePrecision")),
+        "step_size": None,
+        "min_qty": Decimal("0"),
+        "max_qty": None,
+        "tick_size": None,
+        "min_price": Decimal("0"),
+        "max_price": None,
+        "min_notional": Decimal("0"),
+        "notional_applies_to_market": True,
+    }
+    for f in info.get("filters", []):
+        kind = f.get("filterType")
+        if kind == "LOT_SIZE":
+            rules["step_size"] = Decimal(f["stepSize"])
+            rules["min_qty"] = Decimal(f["minQty"])
+            rules["max_qty"] = Decimal(f["maxQty"])
+        elif kind == "PRICE_FILTER":
+            rules["tick_size"] = Decimal(f["tickSize"])
+            rules["min_price"] = Decimal(f["minPrice"])
+            rules["max_price"] = Decimal(f["maxPrice"])
+        elif kind == "MIN_NOTIONAL":
+            rules["min_notional"] = Decimal(f["minNotional"])
+            rules["notional_applies_to_market"] = f.get("applyToMarket", True)
+        elif kind == "NOTIONAL":
+            # Filtro nuevo de Binance que reemplaza a MIN_NOTIONAL
+            rules["min_notional"] = Decimal(f["minNotional"])
+            rules["notional_applies_to_market"] = f.get("applyMinToMarket", True)
+    return rules
+
+
+async def load_symbol_rules(symbols=None) -> int:
+    """Descarga exchangeInfo (todos o los `symbols` indicados) y actualiza la caché."""
+    global _last_refresh
+    symbols = symbols if symbols is not None else TRADED_SYMBOLS
+    params = {"symbols": json.dumps(symbols, separators=(",", ":"))} if symbols else None
+    resp = await binance_request("GET", "/api/v3/exchangeInfo", params=params)
+    resp.raise_for_status()
+    data = resp.json()
+    for info in data.get("symbols", []):
+        symbol_rules[info["symbol"]] = _parse_symbol(info)
+    _last_refresh = time.monotonic()
+    return len(data.get("symbols", []))
+
+
+async def symbol_rules_refresher():
+    """Tarea de fondo (lifespan): carga inicial + refresco periódico."""
+    while True:
+        try:
+            count = await load_symbol_rules()
+            logger.info(f"✅ Reglas de {count} símbolos cargadas desde exchangeInfo")
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ No se pudieron refrescar las reglas de símbolos: {e}")
+            await asyncio.sleep(30)
+            continue
+        await asyncio.sleep(SYMBOL_RULES_TTL_SECS)
+
+
+async def get_symbol_rules(symbol: str) -> dict:
+    """Reglas desde la caché; si el símbolo aún no está, se carga solo ese símbolo."""
+    symbol = symbol.upper()
+    rules = symbol_rules.get(symbol)
+    if rules is None:
+        await load_symbol_rules([symbol])
+        rules = symbol_rules.get(symbol)
+        if rules is None:
+            raise ValueError(f"Símbolo desconocido en exchangeInfo: {symbol}")
+    return rules
+
+
+# ------------------------------------------------------------------
+# Redondeos puros (Decimal)
+# ------------------------------------------------------------------
+def _floor_to_step(value, step: Optional[Decimal]) -> Decimal:
+    value = Decimal(str(value))
+    if not step:
+        return value
+    return ((value / step).to_integral_value(rounding=ROUND_DOWN) * step).quantize(step.normalize())
+
+
+def round_quantity(rules: dict, quantity) -> Decimal:
+    """Cantidad truncada al stepSize de LOT_SIZE; 0 si queda por debajo de minQty."""
+    qty = _floor_to_step(quantity, rules["step_size"])
+    if rules["max_qty"] and qty > rules["max_qty"]:
+        qty = _floor_to_step(rules["max_qty"], rules["step_size"])
+    if qty < rules["min_qty"]:
+        return Decimal("0")
+    return qty
+
+
+def round_price(rules: dict, price) -> Decimal:
+    """Precio truncado al tickSize de PRICE_FILTER."""
+    return _floor_to_step(price, rules["tick_size"])
+
+
+def check_min_notional(rules: dict, quantity, price, market: bool = True) -> bool:
+    """True si quantity * price cumple MIN_NOTIONAL/NOTIONAL."""
+    if market and not rules["notional_applies_to_market"]:
+        return True
+    return Decimal(str(quantity)) * Decimal(str(price)) >= rules["min_notional"]
+
+
+def format_decimal(value) -> str:
+    """Decimal/int → texto sin notación científica para los parámetros de la orden."""
+    return format(Decimal(str(value)), "f")
@@ -0,0 +1,17 @@
+# shared/indicator_state.py
+#
+# Últimos indicadores calculados por símbolo, en memoria del proceso.
+# Los escribe handle_kline_processing al cerrar cada vela; la activación los
+# lee de aquí en lugar de re-decodificar el último miembro del sorted set.
+from typing import Dict, Optional
+
+# SYMBOL → {"rsi", "ema10", "ema50", "ema150", "bb_upper", "bb_lower", "bb_basis", "close"}
+latest_indicators: Dict[str, dict] = {}
+
+
+def set_latest_indicators(symbol: str, indicators: dict):
+    latest_indicators[symbol.upper()] = indicators
+
+
+def get_latest_indicators(symbol: str) -> Optional[dict]:
+    return latest_indicators.get(symbol.upper())
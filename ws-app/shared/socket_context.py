@@ -1,8 +1,16 @@
 # shared/socket_context.py
+import os
 import socketio
 from typing import Dict
+
+# Rooms y emits compartidos entre procesos worker a través de Redis Pub/Sub:
+# los observadores de una posición pueden estar conectados a otro worker
+REDIS_URL = os.getenv("REDIS_URL")
+client_manager = socketio.AsyncRedisManager(REDIS_URL) if REDIS_URL else None
+
 # Creamos la única instancia de AsyncServer para todo el proyecto
 sio = socketio.AsyncServer(
+    client_manager=client_manager,
     async_mode='asgi',
     cors_allowed_origins=["https://localhost:5173"],
     cors_credentials=True,
@@ -0,0 +1,10 @@
+# tests/conftest.py
+#
+# Los módulos de la app se importan como en producción (desde ws-app/) y crean
+# sus clientes de Redis al importarse: basta con una URL, no hace falta servidor.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
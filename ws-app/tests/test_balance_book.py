@@ -0,0 +1,79 @@
+# tests/test_balance_book.py
+#
+# Libro de balances contra el exchange simulado (mock_exchange.py): listenKey,
+# user-data stream y snapshot REST reales, sin la API de Binance.
+
+import asyncio
+import socket
+from decimal import Decimal
+
+import httpx
+import pytest
+import uvicorn
+
+import mock_exchange
+from services import balance_book, binance_auth, binance_http
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def exchange(monkeypatch):
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    monkeypatch.setattr(binance_http, "BASE_URL", url)
+    monkeypatch.setattr(binance_http, "BINANCE_API_KEY", "test-key")
+    monkeypatch.setattr(binance_http, "_client", None)
+    monkeypatch.setattr(binance_auth, "BINANCE_SECRET", "test-secret")
+    monkeypatch.setattr(binance_auth, "_signer", None)
+    monkeypatch.setattr(balance_book, "balances", {})
+    monkeypatch.setattr(balance_book, "_seeded", False)
+    monkeypatch.setitem(mock_exchange.balances, "USDT", {"free": Decimal("1000"), "locked": Decimal("0")})
+    monkeypatch.setitem(mock_exchange.MOCK_CONFIG, "latency_ms", 0)
+    return port, url
+
+
+async def _wait_for(condition, timeout: float = 5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timeout esperando al stream"
+        await asyncio.sleep(0.01)
+
+
+def test_deposit_buffered_during_seeding_is_not_counted_twice(exchange):
+    port, url = exchange
+
+    async def run():
+        server = uvicorn.Server(uvicorn.Config(mock_exchange.app, host="127.0.0.1", port=port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        await _wait_for(lambda: server.started)
+        stream = asyncio.create_task(balance_book.user_data_stream(f"ws://127.0.0.1:{port}/ws"))
+        try:
+            async with httpx.AsyncClient(base_url=url) as client:
+                # Snapshot lento: el depósito llega al stream mientras la siembra está en vuelo
+                await _wait_for(lambda: any(mock_exchange.user_streams.values()))
+                mock_exchange.MOCK_CONFIG["latency_ms"] = 200
+                await asyncio.sleep(0.05)
+                await client.post("/mock/deposit", json={"asset": "USDT", "amount": "50"})
+                await _wait_for(lambda: balance_book._seeded)
+                mock_exchange.MOCK_CONFIG["latency_ms"] = 0
+
+                # El evento en cola ya estaba en el snapshot
+                await asyncio.sleep(0.1)
+                assert await balance_book.get_free_balance("USDT") == 1050.0
+
+                # Un depósito posterior al snapshot sí se suma
+                await asyncio.sleep(0.01)
+                await client.post("/mock/deposit", json={"asset": "USDT", "amount": "25"})
+                await _wait_for(lambda: balance_book.balances["USDT"]["free"] == Decimal("1075"))
+        finally:
+            stream.cancel()
+            await binance_http.close_binance_client()
+            server.should_exit = True
+            await server_task
+
+    asyncio.run(run())
@@ -0,0 +1,187 @@
+# tests/test_order_dispatcher.py
+#
+# Camino de órdenes de services/order_dispatcher: colapso de duplicados en
+# vuelo, reserva del clientOrderId en Redis y reconciliación por consulta.
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from services import order_dispatcher
+from services.order_transport import OrderRejected, OrderStatusUnknown
+
+
+class MemoryRedis:
+    """Lo mínimo de redis.asyncio que usa el despachador (SET NX/EX, GET, DELETE)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+
+FILLED = {"status": "FILLED", "orderId": 1, "executedQty": "5", "cummulativeQuoteQty": "10"}
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = MemoryRedis()
+    monkeypatch.setattr(order_dispatcher, "async_redis_client", client)
+    monkeypatch.setattr(order_dispatcher, "RECONCILE_DELAY_SECS", 0)
+    monkeypatch.setattr(order_dispatcher, "_completed", order_dispatcher.OrderedDict())
+    return client
+
+
+def _query(monkeypatch, *answers):
+    """query_order devuelve (o lanza) `answers` en orden; registra las consultas."""
+    calls = []
+
+    async def query_order(symbol, cid):
+        answer = answers[min(len(calls), len(answers) - 1)]
+        calls.append(cid)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(order_dispatcher, "query_order", query_order)
+    return calls
+
+
+def _cid(intent="42", side="SELL"):
+    return order_dispatcher.client_order_id("7", "BTCUSDT", side, intent)
+
+
+def test_inflight_duplicates_share_one_order(redis):
+    sent = []
+
+    async def send(cid):
+        sent.append(cid)
+        await asyncio.sleep(0.01)
+        return dict(FILLED)
+
+    async def run():
+        return await asyncio.gather(*(
+            order_dispatcher.dispatch_order(7, "btcusdt", "SELL", "42", send) for _ in range(5)
+        ))
+
+    results = asyncio.run(run())
+    assert sent == [_cid()]
+    assert all(result["status"] == "FILLED" for result in results)
+    assert json.loads(redis.data[f"order_intent:{_cid()}"])["orderId"] == 1
+
+
+def test_completed_intent_is_not_resent_after_restart(redis):
+    redis.data[f"order_intent:{_cid()}"] = json.dumps(FILLED)
+
+    async def send(cid):
+        raise AssertionError("la orden ya estaba ejecutada")
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", "42", send))
+    assert result["status"] == "FILLED"
+
+
+def test_empty_intent_is_refused(redis):
+    async def send(cid):
+        raise AssertionError("sin intención no se envía")
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", order_dispatcher.position_intent({}), send))
+    assert result["status"] == "ERROR"
+    assert redis.data == {}
+
+
+def test_unknown_status_is_reconciled_not_resent(redis, monkeypatch):
+    calls = _query(monkeypatch, httpx.ConnectError("timeout"), dict(FILLED))
+    sent = []
+
+    async def send(cid):
+        sent.append(cid)
+        return {"status": "UNKNOWN", "message": "timeout", "clientOrderId": cid}
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", "42", send))
+    assert result["status"] == "FILLED"
+    assert len(sent) == 1 and calls == [_cid(), _cid()]
+    assert json.loads(redis.data[f"order_intent:{_cid()}"])["status"] == "FILLED"
+
+
+def test_unconfirmed_order_stays_claimed(redis, monkeypatch):
+    _query(monkeypatch, httpx.ConnectError("timeout"))
+
+    async def send(cid):
+        return {"status": "UNKNOWN", "message": "timeout", "clientOrderId": cid}
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", "42", send))
+    assert result["status"] == "UNKNOWN"
+    assert redis.data[f"order_intent:{_cid()}"] == order_dispatcher._CLAIM_UNKNOWN
+
+    # El siguiente intento consulta la orden en lugar de reenviarla
+    _query(monkeypatch, dict(FILLED))
+
+    async def resend(cid):
+        raise AssertionError("una orden sin confirmar no se reenvía")
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", "42", resend))
+    assert result["status"] == "FILLED"
+
+
+def test_not_found_releases_the_intent(redis, monkeypatch):
+    _query(monkeypatch, {"status": "NOT_FOUND", "clientOrderId": _cid()})
+
+    async def send(cid):
+        return {"status": "UNKNOWN", "message": "timeout", "clientOrderId": cid}
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", "42", send))
+    assert result["status"] == "ERROR"
+    assert f"order_intent:{_cid()}" not in redis.data
+
+
+def test_order_in_flight_elsewhere_is_not_sent(redis, monkeypatch):
+    redis.data[f"order_intent:{_cid()}"] = order_dispatcher._CLAIM_PENDING
+    _query(monkeypatch, {"status": "NOT_FOUND", "clientOrderId": _cid()})
+
+    async def send(cid):
+        raise AssertionError("otro proceso tiene la reserva")
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", "42", send))
+    assert result["status"] == "ERROR"
+    assert redis.data[f"order_intent:{_cid()}"] == order_dispatcher._CLAIM_PENDING
+
+
+def test_ws_query_errors_are_retried(redis, monkeypatch):
+    calls = _query(monkeypatch, OrderStatusUnknown("sin respuesta"), OrderRejected(-1003, "too many requests"),
+                   dict(FILLED))
+
+    async def send(cid):
+        return {"status": "UNKNOWN", "message": "timeout", "clientOrderId": cid}
+
+    result = asyncio.run(order_dispatcher.dispatch_order(7, "BTCUSDT", "SELL", "42", send))
+    assert result["status"] == "FILLED"
+    assert len(calls) == 3
+
+
+def test_query_order_falls_back_to_rest_without_ws_answer(monkeypatch):
+    from services import order_transport
+
+    async def ws_call(method, params):
+        raise OrderStatusUnknown("sin respuesta")
+
+    async def signed_request(method, path, params=None):
+        return httpx.Response(200, json={"status": "FILLED", "clientOrderId": params["origClientOrderId"]},
+                              request=httpx.Request(method, f"https://api.binance.com{path}"))
+
+    monkeypatch.setattr(order_transport, "ORDER_TRANSPORT", "ws")
+    monkeypatch.setattr(order_transport, "_ws_call", ws_call)
+    monkeypatch.setattr(order_transport, "signed_request", signed_request)
+    order = asyncio.run(order_transport.query_order("BTCUSDT", _cid()))
+    assert order == {"status": "FILLED", "clientOrderId": _cid()}
@@ -0,0 +1,165 @@
+# utils/config_events.py
+#
+# Canal de eventos de cambio de configuración de operación.
+# Toda escritura de `{SYMBOL}_operation_{user_id}` publica un delta pequeño y
+# versionado en Redis Pub/Sub. Cada proceso mantiene `config_cache` al día con
+# esos deltas y reacciona al instante (arrancar/detener evaluación, invalidar
+# cachés) en lugar de hacer GET en cada tick para ver si cambió `operate`.
+
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import redis
+
+from shared.socket_context import config_cache
+from utils.redis_utils import async_redis_client
+
+logger = logging.getLogger("binance_ws")
+
+CONFIG_EVENTS_CHANNEL = "operation_config_events"
+
+# key → versión de la config guardada en config_cache
+config_versions: Dict[str, int] = {}
+# Handlers async(key, config | None, event) llamados tras aplicar cada evento
+config_change_handlers: List[Callable[[str, Optional[dict], dict], Awaitable[None]]] = []
+# Solo se confía en la caché mientras el listener está suscrito
+_listening = False
+
+
+def parse_operation_key(key: str):
+    """`BTCUSDT_operation_42` → ("BTCUSDT", "42")"""
+    symbol, _, user_id = key.partition("_operation_")
+    return symbol, user_id
+
+
+def _build_event(key: str, version: int, config: dict, previous: Optional[dict], source: str) -> dict:
+    symbol, user_id = parse_operation_key(key)
+    event = {"v": version, "key": key, "symbol": symbol, "user_id": user_id, "source": source}
+    if previous is None:
+        event["full"] = True
+        event["changed"] = config
+        event["removed"] = []
+    else:
+        event["changed"] = {k: v for k, v in config.items() if previous.get(k, object()) != v}
+        event["removed"] = [k for k in previous if k not in config]
+    return event
+
+
+def save_operation_config(redis_client, key: str, config: dict, previous: Optional[dict] = None, source: str = "") -> int:
+    """
+    SET de la config + versión (atómico con MULTI) y publicación del delta.
+    `previous` es la config anterior si el llamador la tiene; sin ella se
+    publica la config completa.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.incr(f"{key}_version")
+    pipe.set(key, json.dumps(config))
+    version, _ = pipe.execute()
+    try:
+        redis_client.publish(CONFIG_EVENTS_CHANNEL, json.dumps(_build_event(key, version, config, previous, source)))
+    except redis.exceptions.RedisError as e:
+        # La config ya está guardada; los consumidores la recargan al detectar el hueco de versión
+        logger.warning(f"Redis error publicando cambio de {key}: {e}")
+    return version
+
+
+async def save_operation_config_async(key: str, config: dict, previous: Optional[dict] = None, source: str = "") -> int:
+    async with async_redis_client.pipeline(transaction=True) as pipe:
+        pipe.incr(f"{key}_version")
+        pipe.set(key, json.dumps(config))
+        version, _ = await pipe.execute()
+    try:
+        await async_redis_client.publish(CONFIG_EVENTS_CHANNEL, json.dumps(_build_event(key, version, config, previous, source)))
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Redis error publicando cambio de {key}: {e}")
+    return version
+
+
+# ------------------------------------------------------------------
+# Consumidor
+# ------------------------------------------------------------------
+async def _load_config(key: str) -> Optional[dict]:
+    async with async_redis_client.pipeline(transaction=True) as pipe:
+        pipe.get(key)
+        pipe.get(f"{key}_version")
+        raw, version = await pipe.execute()
+    if not raw:
+        config_cache.pop(key, None)
+        config_versions.pop(key, None)
+        return None
+    config = json.loads(raw)
+    if _listening:
+        config_cache[key] = config
+        config_versions[key] = int(version or 0)
+    return config
+
+
+async def get_operation_config(key: str) -> Optional[dict]:
+    """Config desde la caché local; solo va a Redis la primera vez (o sin listener)."""
+    if _listening:
+        config = config_cache.get(key)
+        if config is not None:
+            return dict(config)  # copia: los llamadores mutan la config
+    config = await _load_config(key)
+    return dict(config) if config is not None else None
+
+
+async def _apply_event(event: dict):
+    key = event["key"]
+    version = event["v"]
+    cached_version = config_versions.get(key)
+    config = config_cache.get(key)
+
+    if config is not None and cached_version is not None and version <= cached_version:
+        return  # ya incluido en la caché
+    if config is not None and cached_version == version - 1 and not event.get("full"):
+        config.update(event["changed"])
+        for field in event["removed"]:
+            config.pop(field, None)
+        config_versions[key] = version
+    elif event.get("full"):
+        config = dict(event["changed"])
+        config_cache[key] = config
+        config_versions[key] = version
+    else:
+        # Hueco de versiones o key no cacheada → recarga completa
+        config = await _load_config(key)
+
+    for handler in config_change_handlers:
+        try:
+            await handler(key, config, event)
+        except Exception as e:
+            logger.error(f"❌ Error en handler de cambio de config ({key}): {e}")
+
+
+async def config_event_listener():
+    """Tarea de fondo (lifespan): aplica los deltas publicados a config_cache."""
+    global _listening
+    while True:
+        pubsub = async_redis_client.pubsub()
+        try:
+            await pubsub.subscribe(CONFIG_EVENTS_CHANNEL)
+            # Pudimos perder eventos mientras no estábamos suscritos
+            config_cache.clear()
+            config_versions.clear()
+            _listening = True
+            logger.info("📡 Escuchando cambios de configuración")
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                await _apply_event(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Listener de configuración caído: {e}")
+            await asyncio.sleep(1)
+        finally:
+            _listening = False
+            config_cache.clear()
+            config_versions.clear()
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
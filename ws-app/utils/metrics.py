@@ -0,0 +1,220 @@
+# utils/metrics.py
+#
+# Métricas en proceso, de bajo coste para dejarlas activas en producción:
+#   • Histogramas de latencia con buckets logarítmicos fijos (registro O(1)).
+#   • Estado del ThreadPoolExecutor por defecto del loop (asyncio.to_thread).
+#   • Trazas por etapa del camino de órdenes (tick → orden → Redis → Telegram).
+
+import asyncio
+import bisect
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("binance_ws")
+
+# Buckets en segundos: 10µs … ~100s, 4 por década
+_BUCKET_BOUNDS: List[float] = [10 ** (e / 4) for e in range(-20, 9)]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Cota superior del bucket que contiene el percentil `q` (0–100)."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(_BUCKET_BOUNDS[i], self.max) if i < len(_BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        # Valores en milisegundos
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p95_ms": round(self.percentile(95) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+# Registro global: nombre → histograma
+latency_histograms: Dict[str, LatencyHistogram] = {}
+
+
+def observe_latency(name: str, seconds: float):
+    hist = latency_histograms.get(name)
+    if hist is None:
+        hist = latency_histograms[name] = LatencyHistogram()
+    hist.observe(seconds)
+
+
+@asynccontextmanager
+async def timed(name: str):
+    """Mide la duración del bloque (reloj monotónico) y la registra en `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_latency(name, time.perf_counter() - start)
+
+
+def latency_summary() -> dict:
+    return {name: hist.summary() for name, hist in sorted(latency_histograms.items())}
+
+
+# ------------------------------------------------------------------
+# Saturación del thread pool por defecto (asyncio.to_thread)
+# ------------------------------------------------------------------
+_thread_pool_peak = {"queued": 0, "busy": 0}
+
+
+def thread_pool_stats() -> dict:
+    loop = asyncio.get_running_loop()
+    executor = getattr(loop, "_default_executor", None)
+    if executor is None:
+        # Aún no se ha usado to_thread/run_in_executor en este loop
+        return {"max_workers": 0, "threads": 0, "busy": 0, "queued": 0, **{f"peak_{k}": v for k, v in _thread_pool_peak.items()}}
+
+    threads = len(executor._threads)
+    idle = executor._idle_semaphore._value
+    busy = max(threads - idle, 0)
+    queued = executor._work_queue.qsize()
+    _thread_pool_peak["queued"] = max(_thread_pool_peak["queued"], queued)
+    _thread_pool_peak["busy"] = max(_thread_pool_peak["busy"], busy)
+    return {
+        "max_workers": executor._max_workers,
+        "threads": threads,
+        "busy": busy,
+        "queued": queued,
+        "peak_busy": _thread_pool_peak["busy"],
+        "peak_queued": _thread_pool_peak["queued"],
+    }
+
+
+async def thread_pool_sampler(interval: float = 1.0):
+    """Muestrea el pool periódicamente para capturar los picos entre consultas."""
+    while True:
+        thread_pool_stats()
+        await asyncio.sleep(interval)
+
+
+# ------------------------------------------------------------------
+# Latencia por etapa del camino de órdenes
+# ------------------------------------------------------------------
+# Cada etapa registra el tiempo transcurrido desde la etapa anterior en
+# `order.<side>.<etapa>`, y el total desde el tick en `order.<side>.total`.
+ORDER_STAGES = (
+    "decision",   # tick recibido → decisión (SL/TB/TP/compra)
+    "quantity",   # cantidad calculada (balance + reglas del símbolo)
+    "signed",     # petición firmada
+    "http_sent",  # petición enviada (REST: justo antes de enviarla; WS-API: frame escrito)
+    "response",   # respuesta recibida y parseada
+    "persisted",  # resultado/config guardados en Redis
+    "telegram",   # notificación encolada
+)
+ORDER_LATENCY_LOG_SECS = float(os.getenv("ORDER_LATENCY_LOG_SECS", 60))
+
+# SYMBOL → perf_counter() del último tick recibido del stream
+last_tick_at: Dict[str, float] = {}
+
+
+class OrderTrace:
+    __slots__ = ("side", "start", "last")
+
+    def __init__(self, side: str, start: float):
+        self.side = side
+        self.start = start
+        self.last = start
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        observe_latency(f"order.{self.side}.{stage}", now - self.last)
+        self.last = now
+
+    def finish(self):
+        observe_latency(f"order.{self.side}.total", time.perf_counter() - self.start)
+
+
+# Traza activa en la tarea actual (se propaga por los await de la misma tarea)
+_current_trace: ContextVar[Optional[OrderTrace]] = ContextVar("order_trace", default=None)
+
+
+def mark_tick(symbol: str):
+    last_tick_at[symbol] = time.perf_counter()
+
+
+def start_order_trace(side: str, symbol: str) -> OrderTrace:
+    """Abre la traza desde el último tick del símbolo y marca la decisión."""
+    trace = OrderTrace(side, last_tick_at.get(symbol, time.perf_counter()))
+    _current_trace.set(trace)
+    trace.mark("decision")
+    return trace
+
+
+def mark_stage(stage: str):
+    """Marca una etapa si hay traza activa; sin traza (p.ej. rutas HTTP) no hace nada."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.mark(stage)
+
+
+def finish_order_trace(record: bool = True):
+    """Cierra la traza activa; con record=False (orden fallida) no registra el total."""
+    trace = _current_trace.get()
+    if trace is not None:
+        if record:
+            trace.finish()
+        _current_trace.set(None)
+
+
+def order_path_summary() -> dict:
+    """{side: {etapa: resumen}} en el orden del camino de la orden."""
+    result = {}
+    for side in ("buy", "sell"):
+        stages = {}
+        for stage in ORDER_STAGES + ("total",):
+            hist = latency_histograms.get(f"order.{side}.{stage}")
+            if hist is not None:
+                stages[stage] = hist.summary()
+        if stages:
+            result[side] = stages
+    return result
+
+
+async def order_latency_logger(interval: float = ORDER_LATENCY_LOG_SECS):
+    """Registra en el log los percentiles por etapa cuando hubo órdenes nuevas."""
+    logged_counts: Dict[str, int] = {}
+    while True:
+        await asyncio.sleep(interval)
+        for side, stages in order_path_summary().items():
+            total = stages.get("total")
+            if not total or total["count"] == logged_counts.get(side):
+                continue
+            logged_counts[side] = total["count"]
+            parts = ", ".join(
+                f"{stage} p50={s['p50_ms']} p95={s['p95_ms']} p99={s['p99_ms']}"
+                for stage, s in stages.items()
+            )
+            logger.info(f"⏱️ Latencia órdenes {side} (ms, n={total['count']}): {parts}")
@@ -4,14 +4,16 @@ from logger import logger
 import pandas as pd
 import os
 import redis
+import redis.asyncio as aioredis
 from dotenv import load_dotenv
-from database import get_db_connection
+from database import get_db_pool
 from shared.socket_context import connected_users, config_cache
 
 load_dotenv()
 REDIS_URL = os.getenv("REDIS_URL")
 redis_client = redis.StrictRedis.from_url(REDIS_URL, decode_responses=True)
-evaluation_tasks = {}
+# Cliente asíncrono para el camino caliente (ticks del stream), sin to_thread
+async_redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
 
 # Guarda resultado en ZADD
 def save_result_to_redis(redis_client, symbol: str, result_data: dict):
@@ -215,40 +217,36 @@ async def detectar_y_enviar_alertas(symbol, indicators, redis_client, sid):
 
 
 
-def sync_recent_candles_redis(symbol: str, limit: int = 200) -> None:
+async def sync_recent_candles_redis(symbol: str, limit: int = 200) -> None:
     """
     Si Redis no tiene al menos `limit` velas para `symbol`,
-    consulta PostgreSQL y precarga las últimas `limit` en Redis.
+    consulta PostgreSQL (pool asíncrono) y precarga las últimas `limit` en Redis.
     """
     key = symbol.upper()
-    if redis_client.zcard(key) >= limit:
+    if await async_redis_client.zcard(key) >= limit:
         return  # Ya hay suficientes datos
 
     # --- 1. Leer de PostgreSQL ---
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT timestamp, open, high, low, close, volume,
-               number_of_trades, taker_buy_quote_asset_volume
-        FROM candlesticks
-        WHERE symbol = %s
-        ORDER BY timestamp DESC
-        LIMIT %s
-        """,
-        (key, limit),
-    )
-    rows = cursor.fetchall()
-    print(rows)
-    cursor.close()
-    conn.close()
+    async with get_db_pool().connection() as conn:
+        cursor = await conn.execute(
+            """
+            SELECT timestamp, open, high, low, close, volume,
+                   number_of_trades, taker_buy_quote_asset_volume
+            FROM candlesticks
+            WHERE symbol = %s
+            ORDER BY timestamp DESC
+            LIMIT %s
+            """,
+            (key, limit),
+        )
+        rows = await cursor.fetchall()
 
     if not rows:
         logger.warning(f"⚠️ No hay datos en PostgreSQL para {key}")
         return
 
     # --- 2. Cargar en Redis en orden cronológico ---
-    pipe = redis_client.pipeline()
+    pipe = async_redis_client.pipeline()
     for row in reversed(rows):
         vela = {
             "timestamp": row[0],
@@ -261,5 +259,5 @@ def sync_recent_candles_redis(symbol: str, limit: int = 200) -> None:
             "taker_buy_quote_asset_volume": str(row[7]),
         }
         pipe.zadd(key, {json.dumps(vela): row[0]})
-    pipe.execute()
+    await pipe.execute()
     logger.info(f"✅ Redis precargado con {len(rows)} velas para {key}")
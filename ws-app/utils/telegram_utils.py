@@ -1,5 +1,7 @@
 import os
+import asyncio
 import logging
+import httpx
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -68,3 +70,63 @@ def send_telegram_message(text: str):
                 logger.error(f"❌ Telegram API devolvió error: {data}")
         except ValueError:
             logger.warning("⚠️ No se pudo parsear la respuesta de Telegram")
+
+
+
+# ------------------------------------------------------------------
+# Envío asíncrono: cola en memoria + worker con httpx (sin bloquear el loop)
+# ------------------------------------------------------------------
+_telegram_queue = None
+
+
+def _get_queue() -> asyncio.Queue:
+    global _telegram_queue
+    if _telegram_queue is None:
+        _telegram_queue = asyncio.Queue(maxsize=1000)
+    return _telegram_queue
+
+
+def queue_telegram_message(text: str):
+    """
+    Encola el mensaje y retorna inmediatamente. Lo envía `telegram_sender`,
+    que corre como tarea de fondo en el lifespan de la app.
+    """
+    if not BOT_TOKEN or not CHAT_ID:
+        return
+    try:
+        _get_queue().put_nowait(text)
+    except asyncio.QueueFull:
+        logger.error("❌ Cola de Telegram llena, mensaje descartado")
+
+
+async def telegram_sender():
+    queue = _get_queue()
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        while True:
+            text = await queue.get()
+            payload = {
+                "chat_id": CHAT_ID,
+                "text": text,
+                "disable_notification": False
+            }
+            # Mismos reintentos que la sesión síncrona
+            for attempt in range(3):
+                try:
+                    resp = await client.post(API_URL, json=payload)
+                    if resp.status_code in (429, 500, 502, 503, 504):
+                        await asyncio.sleep(0.5 * 2 ** attempt)
+                        continue
+                    resp.raise_for_status()
+                    if not resp.json().get("ok"):
+                        logger.error(f"❌ Telegram API devolvió error: {resp.text}")
+                    break
+                except httpx.HTTPStatusError as e:
+                    logger.error(f"❌ HTTP {e.response.status_code} error al enviar Telegram: {e.response.text}")
+                    break
+                except httpx.HTTPError as e:
+                    logger.error(f"❌ Error al enviar Telegram (intento {attempt + 1}/3): {e}")
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                except ValueError:
+                    logger.warning("⚠️ No se pudo parsear la respuesta de Telegram")
+                    break
+            queue.task_done()